@@ -0,0 +1,76 @@
+"""Compare DataCleaner.clean on JSON-encoded raw data against the literal_eval baseline.
+
+Usage: python benchmarks/bench_cleaning.py [rows]
+"""
+import os
+import sys
+import time
+import tempfile
+from ast import literal_eval
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import pandas as pd
+from models.cleaning import DataCleaner
+from synthetic import write_raw_csv
+
+
+class LiteralEvalCleaner(DataCleaner):
+    """The previous implementation: literal_eval per cell, credits parsed twice."""
+
+    def safe_parse(self, x):
+        if isinstance(x, (list, dict)):
+            return x
+        if x is None or (isinstance(x, str) and x == ''):
+            return []
+        try:
+            if pd.isna(x):
+                return []
+        except (ValueError, TypeError):
+            pass
+        try:
+            return literal_eval(str(x))
+        except (ValueError, SyntaxError, TypeError):
+            return []
+
+    def process_credits(self, df):
+        cast_data = df['credits'].apply(self.parse_credits_cast)
+        df['cast'] = cast_data.apply(lambda x: "|".join(x[0]))
+        df['cast_size'] = cast_data.apply(lambda x: x[1])
+        crew_data = df['credits'].apply(self.parse_credits_director)
+        df['director'] = crew_data.apply(lambda x: x[0])
+        df['crew_size'] = crew_data.apply(lambda x: x[1])
+        return df
+
+
+def time_clean(cleaner, path):
+    df = cleaner.load_data(path)
+    start = time.perf_counter()
+    cleaned = cleaner.clean(df)
+    return cleaned, time.perf_counter() - start
+
+
+def main():
+    rows = int(sys.argv[1]) if len(sys.argv) > 1 else 100000
+    with tempfile.TemporaryDirectory() as tmp:
+        legacy_path = write_raw_csv(os.path.join(tmp, 'legacy.csv'), rows, legacy=True)
+        json_path = write_raw_csv(os.path.join(tmp, 'json.csv'), rows)
+
+        baseline, t_base = time_clean(LiteralEvalCleaner(), legacy_path)
+        legacy, t_legacy = time_clean(DataCleaner(), legacy_path)
+        fast, t_fast = time_clean(DataCleaner(), json_path)
+
+    # belongs_to_collection is passed through raw, so only its encoding differs
+    passthrough = ['belongs_to_collection']
+    pd.testing.assert_frame_equal(baseline.drop(columns=passthrough), fast.drop(columns=passthrough))
+    pd.testing.assert_frame_equal(baseline, legacy)
+    print(f"rows={rows}")
+    print(f"{'variant':<34}{'seconds':>10}{'speedup':>10}")
+    for name, t in [('literal_eval baseline (repr file)', t_base),
+                    ('single parse (repr file)', t_legacy),
+                    ('single parse + json (json file)', t_fast)]:
+        print(f"{name:<34}{t:>10.2f}{t_base / t:>9.1f}x")
+
+
+if __name__ == '__main__':
+    main()
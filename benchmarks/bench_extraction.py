@@ -0,0 +1,36 @@
+"""Compare extraction throughput of the process-pool and pooled-session thread modes.
+
+Usage: python benchmarks/bench_extraction.py [n_ids] [workers]
+"""
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from models.extraction import MovieExtractor
+from stub_server import StubTMDBServer
+
+
+def bench(mode, movie_ids, workers, base_url):
+    extractor = MovieExtractor('stub-key', base_url=base_url)
+    start = time.perf_counter()
+    data = extractor.fetch_all_movies(movie_ids, max_workers=workers, mode=mode)
+    elapsed = time.perf_counter() - start
+    return len(data), elapsed
+
+
+def main():
+    n_ids = int(sys.argv[1]) if len(sys.argv) > 1 else 2000
+    workers = int(sys.argv[2]) if len(sys.argv) > 2 else 10
+    movie_ids = list(range(1, n_ids + 1))
+
+    with StubTMDBServer(latency=0.002) as server:
+        print(f"{'mode':<10}{'fetched':>10}{'seconds':>10}{'req/s':>10}")
+        for mode in ('process', 'thread'):
+            fetched, elapsed = bench(mode, movie_ids, workers, server.base_url)
+            print(f"{mode:<10}{fetched:>10}{elapsed:>10.2f}{fetched / elapsed:>10.0f}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,58 @@
+"""Fold a small batch into saved KPI aggregates vs. recomputing the report from scratch.
+
+The batch is saved as a cleaned CSV and folded the way `main.py analyze
+--incremental --batch PATH` does. Exits non-zero if already folded movies are
+folded again; tests/test_aggregates.py checks the state against a full recompute.
+
+Usage: python benchmarks/bench_incremental.py [movies] [batch]
+"""
+import os
+import sys
+import time
+import tempfile
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from models.aggregates import KPIAggregates
+from models.analysis import MovieAnalyzer
+from models.storage import CLEANED_SCHEMA, load_frame, save_frame
+from synthetic import generate_cleaned_movies
+
+
+def main():
+    n = int(sys.argv[1]) if len(sys.argv) > 1 else 1000000
+    batch = int(sys.argv[2]) if len(sys.argv) > 2 else 50
+    df = generate_cleaned_movies(n)
+    base, new = df.iloc[:n - batch], df.iloc[n - batch:]
+
+    with tempfile.TemporaryDirectory() as tmp:
+        state_path = os.path.join(tmp, 'kpi_state.json')
+        start = time.perf_counter()
+        state = KPIAggregates()
+        state.fold(base)
+        state.save(state_path)
+        print(f"initial fold of {len(base)} movies: {time.perf_counter() - start:.2f}s")
+
+        batch_path = os.path.join(tmp, 'batch.csv')
+        save_frame(new, batch_path)
+        start = time.perf_counter()
+        state = KPIAggregates.load(state_path)
+        state.fold(load_frame(batch_path, columns=MovieAnalyzer.COLUMNS, schema=CLEANED_SCHEMA))
+        state.save(state_path)
+        state.report()
+        incremental = time.perf_counter() - start
+        # A batch that repeats folded movies adds nothing
+        state = KPIAggregates.load(state_path)
+        if state.fold(df.iloc[n - 2 * batch:]):
+            print("INCONSISTENT: already folded movies were folded again")
+            sys.exit(1)
+
+    start = time.perf_counter()
+    MovieAnalyzer(df.copy()).generate_report(verbose=False)
+    full = time.perf_counter() - start
+    print(f"{batch} new movies: incremental {incremental:.3f}s (load batch + state, fold, save, report), "
+          f"full recompute {full:.2f}s")
+
+
+if __name__ == '__main__':
+    main()
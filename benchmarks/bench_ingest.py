@@ -0,0 +1,119 @@
+"""Sharded ingestion of a gzipped TMDB ID export against the stub API, then merge.
+
+Writes a local export (movie_ids_MM_DD_YYYY.json.gz format) of --ids IDs
+with repeated IDs, malformed lines and IDs already in an existing raw file.
+Each of --shards shards is fetched on its own (as separate machines would),
+then the shard outputs are merged into the raw file and cleared. Checks
+that the shards are disjoint and fetched exactly the new IDs, that the
+merged file holds every ID exactly once, and that a rerun fetches nothing;
+exits non-zero otherwise. Prints the throughput and the bitmap's size next
+to a Python set of the same IDs.
+
+Usage: python benchmarks/bench_ingest.py [--ids 20000] [--shards 4] [--workers 10] [--workdir benchmarks/.data]
+"""
+import os
+import sys
+import gzip
+import json
+import time
+import random
+import shutil
+import argparse
+import logging
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import pandas as pd
+
+from models.extraction import MovieExtractor
+from models.ingest import IdBitmap, clear_shards, ingest_shard, iter_export_ids, merge_shards
+from models.storage import load_frame, save_frame
+from stub_server import StubTMDBServer, make_movie_payload
+
+BENCH_DIR = os.path.dirname(os.path.abspath(__file__))
+
+
+def write_export(path, movie_ids, seed=0):
+    """A gzipped ID export of movie_ids, with some repeated IDs and malformed lines mixed in."""
+    rng = random.Random(seed)
+    with gzip.open(path, 'wt', encoding='utf-8') as f:
+        for movie_id in movie_ids:
+            f.write(json.dumps({'adult': False, 'id': movie_id, 'original_title': f"Movie {movie_id}",
+                                'popularity': rng.random() * 100, 'video': False}) + '\n')
+            if rng.random() < 0.01:
+                f.write(json.dumps({'adult': False, 'id': rng.choice(movie_ids)}) + '\n')
+            if rng.random() < 0.001:
+                f.write(rng.choice(['{"adult": false, "id": ', '{"id": null}', '\n', 'not json\n']) + '\n')
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--ids', type=int, default=20000, help="distinct IDs in the export")
+    parser.add_argument('--known', type=float, default=0.1, help="fraction of the IDs already in the raw file")
+    parser.add_argument('--shards', type=int, default=4)
+    parser.add_argument('--workers', type=int, default=10)
+    parser.add_argument('--workdir', default=os.path.join(BENCH_DIR, '.data'))
+    args = parser.parse_args()
+    logging.basicConfig(level=logging.WARNING)
+
+    directory = os.path.join(args.workdir, f"ingest_{args.ids}x{args.shards}")
+    shutil.rmtree(directory, ignore_errors=True)
+    os.makedirs(directory)
+    export = os.path.join(directory, 'movie_ids_01_01_2024.json.gz')
+    raw = os.path.join(directory, 'movies_data.csv')
+
+    rng = random.Random(0)
+    movie_ids = rng.sample(range(1, 1600000), args.ids)
+    known = movie_ids[:int(args.ids * args.known)]
+    write_export(export, movie_ids)
+    save_frame(pd.DataFrame([make_movie_payload(movie_id) for movie_id in known]).drop(columns=['genres', 'credits']),
+               raw)
+
+    start = time.perf_counter()
+    exported = sum(1 for _ in iter_export_ids(export))
+    bitmap = IdBitmap(movie_ids)
+    print(f"export: {os.path.getsize(export) / 2 ** 20:.1f} MB gzipped, {exported} IDs streamed in "
+          f"{time.perf_counter() - start:.2f}s; bitmap {len(bitmap._bits) / 2 ** 10:.0f} KB vs set "
+          f"{(sys.getsizeof(set(movie_ids)) + 28 * len(movie_ids)) / 2 ** 20:.1f} MB")
+
+    with StubTMDBServer(latency=0.002) as server:
+        extractor = MovieExtractor('stub-key', base_url=server.base_url)
+        fetched = {}
+        for shard in range(args.shards):
+            start = time.perf_counter()
+            output = ingest_shard(extractor, export, raw, shard, args.shards, known_paths=[raw],
+                                  max_workers=args.workers)
+            elapsed = time.perf_counter() - start
+            fetched[shard] = set(load_frame(output)['id'])
+            print(f"shard {shard}/{args.shards}: {len(fetched[shard])} movies in {elapsed:.1f}s "
+                  f"({len(fetched[shard]) / elapsed:.0f} movies/s)")
+
+        start = time.perf_counter()
+        rows = merge_shards(raw, args.shards, extra_paths=[raw])
+        clear_shards(raw, args.shards)
+        print(f"merge: {rows} rows in {time.perf_counter() - start:.2f}s")
+
+        fetched_requests = extractor.latency.stats()['count']
+        start = time.perf_counter()
+        for shard in range(args.shards):
+            ingest_shard(extractor, export, raw, shard, args.shards, known_paths=[raw], max_workers=args.workers)
+        rerun = time.perf_counter() - start
+        rerun_requests = extractor.latency.stats()['count'] - fetched_requests
+
+    merged = load_frame(raw)['id']
+    shard_sets = list(fetched.values())
+    print(f"rerun: {rerun:.2f}s, {rerun_requests} API requests")
+    checks = {
+        'shards disjoint': sum(map(len, shard_sets)) == len(set().union(*shard_sets)),
+        'shards fetched exactly the new IDs': set().union(*shard_sets) == set(movie_ids) - set(known),
+        'merged IDs unique and complete': merged.is_unique and set(merged) == set(movie_ids),
+        'rerun fetched nothing': rerun_requests == 0,
+    }
+    for name, ok in checks.items():
+        print(f"{name}: {'ok' if ok else 'FAILED'}")
+    if not all(checks.values()):
+        sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,39 @@
+"""Scaling of DataCleaner.clean_parallel at 1/2/4/8 workers versus the serial clean().
+
+Usage: python benchmarks/bench_parallel_cleaning.py [rows]
+"""
+import os
+import sys
+import time
+import tempfile
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import pandas as pd
+from models.cleaning import DataCleaner
+from synthetic import write_raw_csv
+
+
+def main():
+    rows = int(sys.argv[1]) if len(sys.argv) > 1 else 100000
+    cleaner = DataCleaner()
+    with tempfile.TemporaryDirectory() as tmp:
+        raw = cleaner.load_data(write_raw_csv(os.path.join(tmp, 'raw.csv'), rows))
+
+    start = time.perf_counter()
+    serial = cleaner.clean(raw.copy())
+    t_serial = time.perf_counter() - start
+
+    print(f"rows={rows} cpus={os.cpu_count()}")
+    print(f"{'workers':<10}{'seconds':>10}{'speedup':>10}")
+    print(f"{'serial':<10}{t_serial:>10.2f}{1.0:>9.1f}x")
+    for workers in (1, 2, 4, 8):
+        start = time.perf_counter()
+        parallel = cleaner.clean_parallel(raw.copy(), workers=workers)
+        elapsed = time.perf_counter() - start
+        pd.testing.assert_frame_equal(serial, parallel)
+        print(f"{workers:<10}{elapsed:>10.2f}{t_serial / elapsed:>9.1f}x")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,51 @@
+"""Scatter plot render time vs. dataset size for the full, sampled and density modes.
+
+Usage: python benchmarks/bench_plots.py [sizes...]   (default: 10000 100000 1000000)
+"""
+import os
+import sys
+import time
+import tempfile
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from models.visualization import DataVisualizer, render_plot
+from synthetic import generate_cleaned_movies
+
+SCATTERS = ['revenue_vs_budget', 'popularity_vs_rating']
+# Drawing every point is only timed up to this size; beyond it takes minutes
+FULL_LIMIT = 100000
+
+
+def time_plots(visualizer):
+    """(prepare seconds, render seconds) per scatter plot."""
+    seconds = {}
+    for name in SCATTERS:
+        start = time.perf_counter()
+        task = visualizer._task(name)
+        prepare = time.perf_counter() - start
+        _, render = render_plot(*task)
+        seconds[name] = (prepare, render)
+    return seconds
+
+
+def main():
+    sizes = [int(arg) for arg in sys.argv[1:]] or [10000, 100000, 1000000]
+    with tempfile.TemporaryDirectory() as tmp:
+        for n in sizes:
+            df = generate_cleaned_movies(n)
+            modes = {
+                'full': dict(scatter_threshold=float('inf')),
+                'sample': dict(scatter_threshold=10000, scatter_mode='sample'),
+                'density': dict(scatter_threshold=10000, scatter_mode='density'),
+            }
+            for mode, options in modes.items():
+                if mode == 'full' and n > FULL_LIMIT:
+                    continue
+                seconds = time_plots(DataVisualizer(df, tmp, dpi=100, **options))
+                timings = ', '.join(f"{name} prepare {p:.2f}s render {r:.2f}s" for name, (p, r) in seconds.items())
+                print(f"{n:>9} movies  {mode:<8} {timings}")
+
+
+if __name__ == '__main__':
+    main()
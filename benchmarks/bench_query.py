@@ -0,0 +1,117 @@
+"""Queries/sec of MovieAnalyzer.query against boolean-mask scans over the whole frame.
+
+First checks that a movie matches a search once even when an actor has two
+roles in it or two people in it share a name; exits non-zero otherwise.
+
+Usage: python benchmarks/bench_query.py [movies] [queries]
+"""
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import numpy as np
+import pandas as pd
+from models.analysis import MovieAnalyzer
+from models.relations import RELATION_SCHEMAS
+from models.storage import apply_schema
+from synthetic import generate_cleaned_movies, GENRES
+
+
+def random_queries(rng, n):
+    genres = [name for _, name in GENRES]
+    queries = []
+    for i in range(n):
+        kind = i % 4
+        if kind == 0:
+            q = {'actor': f"Actor {rng.integers(0, 200000)}", 'genres': list(rng.choice(genres, 2, replace=False))}
+        elif kind == 1:
+            q = {'director': f"Director {rng.integers(0, 20000)}", 'ranges': {'budget_musd': (10, None)}}
+        elif kind == 2:
+            start = int(rng.integers(1970, 2020))
+            q = {'genres': str(rng.choice(genres)), 'year': (start, start + 2), 'ranges': {'vote_count': (1000, None)}}
+        else:
+            q = {'ranges': {'roi': (5, None), 'vote_average': (8, None)}}
+        q.update(sort_by='vote_average', top_n=10)
+        queries.append(q)
+    return queries
+
+
+def scan(df, actor=None, director=None, genres=None, year=None, ranges=None, sort_by=None, top_n=None):
+    """The pre-index approach: rebuild boolean masks over every row per query."""
+    mask = np.ones(len(df), dtype=bool)
+    if actor:
+        mask &= df['cast'].str.contains(actor, regex=False, na=False).to_numpy()
+    if director:
+        mask &= (df['director'] == director).to_numpy()
+    if genres:
+        genre_mask = np.zeros(len(df), dtype=bool)
+        for g in [genres] if isinstance(genres, str) else genres:
+            genre_mask |= df['genres'].str.contains(g, regex=False, na=False).to_numpy()
+        mask &= genre_mask
+    if year:
+        years = df['release_date'].dt.year
+        mask &= ((years >= year[0]) & (years <= year[1])).to_numpy()
+    for col, (low, high) in (ranges or {}).items():
+        if low is not None:
+            mask &= (df[col] >= low).to_numpy()
+        if high is not None:
+            mask &= (df[col] <= high).to_numpy()
+    return df[mask].nlargest(top_n, sort_by)
+
+
+def check_repeated_names():
+    """query() must return each movie once when its cast lists a person twice or two people share a name."""
+    rows = {
+        'movie_cast': [(1, 10, 0, 'Role A'), (1, 10, 1, 'Role B'), (1, 11, 2, 'Role C'), (1, 12, 3, 'Role D'),
+                       (2, 10, 0, 'Role E')],
+        'movie_genre': [(1, 28), (2, 28)],
+        'person': [(10, 'Actor A'), (11, 'Actor B'), (12, 'Actor B')],
+        'genre': [(28, 'Action')],
+    }
+    relations = {table: apply_schema(pd.DataFrame(values, columns=list(RELATION_SCHEMAS[table])),
+                                     RELATION_SCHEMAS[table]) for table, values in rows.items()}
+    df = generate_cleaned_movies(2)
+    analyzer = MovieAnalyzer(df, relations)
+    problems = [f"{name}: {ids}" for name, expected in [('Actor A', [1, 2]), ('Actor B', [1])]
+                if (ids := analyzer.query(actor=name)['id'].tolist()) != expected]
+    print("repeated cast names: each movie once" if not problems else "DUPLICATE ROWS:\n" + "\n".join(problems))
+    if problems:
+        sys.exit(1)
+
+
+def main():
+    n = int(sys.argv[1]) if len(sys.argv) > 1 else 1000000
+    n_queries = int(sys.argv[2]) if len(sys.argv) > 2 else 2000
+    rng = np.random.default_rng(1)
+    check_repeated_names()
+
+    start = time.perf_counter()
+    df = generate_cleaned_movies(n)
+    print(f"generated {n} movies in {time.perf_counter() - start:.1f}s")
+
+    analyzer = MovieAnalyzer(df)
+    queries = random_queries(rng, n_queries)
+
+    start = time.perf_counter()
+    for q in queries[:4]:
+        analyzer.query(**q)
+    print(f"first queries (index build) {time.perf_counter() - start:.2f}s")
+
+    start = time.perf_counter()
+    for q in queries:
+        analyzer.query(**q)
+    elapsed = time.perf_counter() - start
+    print(f"indexed: {n_queries / elapsed:,.0f} queries/sec")
+
+    sample = queries[:20]
+    start = time.perf_counter()
+    for q in sample:
+        scan(df, **q)
+    elapsed = time.perf_counter() - start
+    print(f"full scan: {len(sample) / elapsed:,.1f} queries/sec")
+
+
+if __name__ == '__main__':
+    main()
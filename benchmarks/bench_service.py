@@ -0,0 +1,158 @@
+"""Load test of the KPI service: p50/p99 latency and requests/sec.
+
+Starts KPIService (models/service.py) on a cleaned dataset in a separate
+process, or targets a running one with --url. --concurrency client threads
+then send --requests requests over keep-alive connections. The requests mix
+the report endpoints with --distinct parameterized searches, so fewer
+distinct searches mean more cache hits. Latency is measured per request on
+the client. Without --data, synthetic cleaned movies are generated once
+into --workdir.
+
+Usage: python benchmarks/bench_service.py [--data cleaned.csv|movies.sqlite] [--movies 100000]
+                                          [--concurrency 8] [--requests 5000] [--distinct 500]
+                                          [--cache-size 1024] [--url http://127.0.0.1:8000]
+"""
+import os
+import sys
+import json
+import time
+import random
+import argparse
+import threading
+import http.client
+import multiprocessing
+import logging
+from urllib.parse import urlencode, urlsplit
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import numpy as np
+
+BENCH_DIR = os.path.dirname(os.path.abspath(__file__))
+REPORT_PATHS = ['/kpis', '/franchise', '/directors?n=10', '/searches']
+
+
+def search_paths(n, seed=0):
+    """n distinct /search requests shaped like benchmarks/bench_query.py's queries."""
+    from synthetic import GENRES
+    rng = random.Random(seed)
+    genres = [name for _, name in GENRES]
+    paths = set()
+    i = 0
+    while len(paths) < n:
+        kind, i = i % 4, i + 1
+        if kind == 0:
+            params = [('actor', f"Actor {rng.randrange(200000)}")] + [('genre', g) for g in rng.sample(genres, 2)]
+        elif kind == 1:
+            params = [('director', f"Director {rng.randrange(20000)}"), ('min_budget_musd', 10)]
+        elif kind == 2:
+            start = rng.randrange(1970, 2020)
+            params = [('genre', rng.choice(genres)), ('year', f"{start}-{start + 2}"),
+                      ('min_vote_count', rng.choice([500, 1000, 2000]))]
+        else:
+            params = [('min_roi', rng.randrange(2, 10)), ('min_vote_average', rng.choice([7, 8, 9]))]
+        params += [('sort_by', 'vote_average'), ('top_n', 10), ('columns', 'id,title,vote_average')]
+        paths.add(f"/search?{urlencode(params)}")
+    return sorted(paths)
+
+
+def _serve(data, cache_size, port_queue):
+    from models.service import KPIService, make_server
+    logging.basicConfig(level=logging.WARNING)
+    service = KPIService(data, store=data.endswith('.sqlite'), cache_size=cache_size)
+    server = make_server(service, port=0)
+    port_queue.put(server.server_address[1])
+    server.serve_forever()
+
+
+def get(conn, path):
+    conn.request('GET', path)
+    response = conn.getresponse()
+    body = response.read()
+    if response.status != 200:
+        raise RuntimeError(f"{path}: HTTP {response.status} {body[:200]!r}")
+    return body
+
+
+def load_test(host, port, paths, weights, concurrency, n_requests, seed=0):
+    """Send n_requests over `concurrency` keep-alive connections; returns (latencies in s, elapsed s)."""
+    latencies = []
+    lock = threading.Lock()
+    per_thread = [n_requests // concurrency + (i < n_requests % concurrency) for i in range(concurrency)]
+
+    def client(i):
+        rng = random.Random(seed + i)
+        conn = http.client.HTTPConnection(host, port, timeout=60)
+        chosen = rng.choices(paths, weights, k=per_thread[i])
+        timings = []
+        for path in chosen:
+            start = time.perf_counter()
+            get(conn, path)
+            timings.append(time.perf_counter() - start)
+        conn.close()
+        with lock:
+            latencies.extend(timings)
+
+    threads = [threading.Thread(target=client, args=(i,)) for i in range(concurrency)]
+    start = time.perf_counter()
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    return np.array(latencies), time.perf_counter() - start
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--data', help="cleaned CSV/Parquet file or SQLite store to serve")
+    parser.add_argument('--movies', type=int, default=100000, help="synthetic movies when --data is not given")
+    parser.add_argument('--url', help="load-test a running service instead of starting one")
+    parser.add_argument('--concurrency', type=int, default=8)
+    parser.add_argument('--requests', type=int, default=5000)
+    parser.add_argument('--distinct', type=int, default=500, help="distinct search requests in the mix")
+    parser.add_argument('--search-share', type=float, default=0.8, help="fraction of requests that are searches")
+    parser.add_argument('--cache-size', type=int, default=1024, help="LRU cache size of the started service")
+    parser.add_argument('--workdir', default=os.path.join(BENCH_DIR, '.data'))
+    args = parser.parse_args()
+
+    server = None
+    if args.url:
+        url = urlsplit(args.url)
+        host, port = url.hostname, url.port or 80
+    else:
+        data = args.data
+        if data is None:
+            from synthetic import generate_cleaned_movies
+            from models.storage import save_frame
+            data = os.path.join(args.workdir, f"service_cleaned_{args.movies}.csv")
+            if not os.path.exists(data):
+                save_frame(generate_cleaned_movies(args.movies), data)
+        port_queue = multiprocessing.Queue()
+        server = multiprocessing.Process(target=_serve, args=(data, args.cache_size, port_queue), daemon=True)
+        start = time.perf_counter()
+        server.start()
+        host, port = '127.0.0.1', port_queue.get(timeout=600)
+        print(f"Service loaded {data} in {time.perf_counter() - start:.1f}s (cache size {args.cache_size})")
+
+    try:
+        searches = search_paths(args.distinct)
+        paths = REPORT_PATHS + searches
+        weights = ([(1 - args.search_share) / len(REPORT_PATHS)] * len(REPORT_PATHS)
+                   + [args.search_share / len(searches)] * len(searches))
+        latencies, elapsed = load_test(host, port, paths, weights, args.concurrency, args.requests)
+        ms = latencies * 1000
+        print(f"{len(latencies)} requests, {args.concurrency} clients: {len(latencies) / elapsed:.0f} requests/sec")
+        print(f"latency p50 {np.percentile(ms, 50):.2f}ms  p90 {np.percentile(ms, 90):.2f}ms  "
+              f"p99 {np.percentile(ms, 99):.2f}ms  max {ms.max():.2f}ms")
+        conn = http.client.HTTPConnection(host, port, timeout=60)
+        health = json.loads(get(conn, '/health'))
+        cache = health['cache']
+        print(f"server cache: {cache['hits']} hits, {cache['misses']} misses, {cache['size']} entries")
+    finally:
+        if server is not None:
+            server.terminate()
+            server.join()
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,69 @@
+"""Import time of each main.py subcommand, against importing every stage eagerly.
+
+Each command runs in a fresh interpreter that imports main.py and then the
+modules its stages import when they run (mirrored from main.py below). The
+median of --repeat runs is reported with the heavy packages that got loaded.
+
+Usage: python benchmarks/bench_startup.py [--repeat 5]
+"""
+import os
+import sys
+import json
+import argparse
+import statistics
+import subprocess
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# What each stage function in main.py imports when it runs
+STAGE_IMPORTS = {
+    'extract': ['dotenv', 'models.extraction', 'models.cache'],
+    'clean': ['models.cleaning'],
+    'analyze': ['models.analysis', 'models.visualization', 'models.aggregates'],
+    'plot': ['models.visualization', 'models.drawing'],
+}
+COMMANDS = {command: imports for command, imports in STAGE_IMPORTS.items()}
+COMMANDS['all'] = [module for imports in STAGE_IMPORTS.values() for module in imports]
+HEAVY = ['pandas', 'pyarrow', 'requests', 'matplotlib', 'seaborn']
+
+SCRIPT = """
+import sys, time, json, importlib
+start = time.perf_counter()
+{setup}
+for module in {imports!r}:
+    importlib.import_module(module)
+print(json.dumps({{'seconds': time.perf_counter() - start,
+                  'loaded': [m for m in {heavy!r} if m in sys.modules]}}))
+"""
+
+
+def measure(setup, imports, repeat):
+    runs = []
+    for _ in range(repeat):
+        code = SCRIPT.format(setup=setup, imports=imports, heavy=HEAVY)
+        output = subprocess.run([sys.executable, '-c', code], cwd=ROOT, check=True,
+                                capture_output=True, text=True).stdout
+        runs.append(json.loads(output))
+    return statistics.median(run['seconds'] for run in runs), runs[-1]['loaded']
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--repeat', type=int, default=5)
+    args = parser.parse_args()
+
+    # Before: main.py imported every stage, and models/__init__ imported visualization
+    rows = [('eager (all stages)', *measure("import models.extraction, models.cleaning, models.analysis, "
+                                            "models.visualization, models.drawing, models.aggregates, dotenv",
+                                            [], args.repeat))]
+    for command, imports in COMMANDS.items():
+        rows.append((f"main.py {command}", *measure("import main", imports, args.repeat)))
+    rows.append(('main.py --help', *measure("import main; main.build_parser().format_help()", [], args.repeat)))
+
+    print(f"{'startup':<22}{'ms':>8}  heavy packages loaded")
+    for name, seconds, loaded in rows:
+        print(f"{name:<22}{seconds * 1000:>8.0f}  {', '.join(loaded) or '-'}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,84 @@
+"""KPI report from the cleaned CSV (pandas) vs. from the SQLite store (SQL pushdown).
+
+Cleans synthetic raw movies once in chunks, with and without writing the
+store, then builds the report each way in a fresh process and prints its
+time and peak RSS. The two reports must be identical.
+
+Usage: python benchmarks/bench_store.py [movies] [--cast 8] [--crew 40] [--workdir benchmarks/.data]
+"""
+import os
+import sys
+import time
+import json
+import argparse
+import subprocess
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+BENCH_DIR = os.path.dirname(os.path.abspath(__file__))
+
+REPORT = """
+import sys, time, json
+sys.path.insert(0, {root!r}); sys.path.insert(0, {bench!r})
+from models.analysis import MovieAnalyzer
+from bench_suite import peak_rss_mb
+start = time.perf_counter()
+analyzer = MovieAnalyzer.{loader}({path!r})
+report = analyzer.generate_report(verbose=False)
+seconds = time.perf_counter() - start
+with open({report_path!r}, 'w', encoding='utf-8') as f:
+    f.write(report)
+print(json.dumps({{'seconds': seconds, 'peak_rss_mb': peak_rss_mb()}}))
+"""
+
+
+def report_in_process(loader, path, report_path):
+    code = REPORT.format(root=os.path.dirname(BENCH_DIR), bench=BENCH_DIR, loader=loader, path=path,
+                         report_path=report_path)
+    output = subprocess.run([sys.executable, '-c', code], check=True, capture_output=True, text=True).stdout
+    return json.loads(output.strip().splitlines()[-1])
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('movies', type=int, nargs='?', default=100000)
+    parser.add_argument('--cast', type=int, default=8)
+    parser.add_argument('--crew', type=int, default=40)
+    parser.add_argument('--chunk-size', type=int, default=20000)
+    parser.add_argument('--workdir', default=os.path.join(BENCH_DIR, '.data'))
+    args = parser.parse_args()
+
+    import logging
+    logging.basicConfig(level=logging.WARNING)
+    from models.cleaning import DataCleaner
+    from synthetic import write_raw_csv
+
+    name = f"{args.movies}_{args.cast}x{args.crew}"
+    directory = os.path.join(args.workdir, f"store_{name}")
+    os.makedirs(directory, exist_ok=True)
+    raw = os.path.join(args.workdir, f"raw_{name}.csv")
+    cleaned = os.path.join(directory, 'movies_data_cleaned.csv')
+    store = os.path.join(directory, 'movies.sqlite')
+    if not os.path.exists(raw):
+        write_raw_csv(raw, args.movies, args.cast, args.crew)
+
+    start = time.perf_counter()
+    DataCleaner().run(raw, cleaned, chunk_size=args.chunk_size, with_relations=True)
+    plain = time.perf_counter() - start
+    start = time.perf_counter()
+    DataCleaner().run(raw, cleaned, chunk_size=args.chunk_size, with_relations=True, store_path=store)
+    with_store = time.perf_counter() - start
+    print(f"clean {args.movies} movies: {plain:.1f}s, {with_store:.1f}s with the store "
+          f"({os.path.getsize(store) / 2 ** 20:.0f} MB)")
+
+    results = {}
+    for loader, path in [('from_path', cleaned), ('from_store', store)]:
+        report_path = os.path.join(directory, f"report_{loader}.txt")
+        results[loader] = report_in_process(loader, path, report_path)
+        results[loader]['report'] = open(report_path, encoding='utf-8').read()
+        print(f"report {loader:<11} {results[loader]['seconds']:>7.2f}s  peak RSS {results[loader]['peak_rss_mb']:.0f} MB")
+    print(f"reports identical: {results['from_path']['report'] == results['from_store']['report']}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,212 @@
+"""End-to-end benchmark suite on synthetic TMDB-shaped data, with a stored baseline.
+
+Times MovieExtractor against the local stub API, then DataCleaner.run (clean),
+MovieAnalyzer.generate_report (analyze) and DataVisualizer.run (plot) on
+synthetic raw movies with full-size credits (~80 cast, ~400 crew each, like
+data/raw/cast_data.csv and crew_data.csv). Each case runs in its own process,
+so its peak RSS is measured in isolation. Results are compared with
+benchmarks/baseline.json: a case more than --tolerance slower or larger than
+its baseline is flagged and the suite exits with status 1.
+
+Raw files are about 115 KB per movie at full credit size (~1.1 GB at 10k
+rows); for 1M rows pass smaller --cast/--crew. Generated data is kept in
+--workdir and reused across runs.
+
+Usage: python benchmarks/bench_suite.py [--rows 10000 100000 1000000] [--cases extract clean analyze plot]
+                                        [--cast 80] [--crew 400] [--update-baseline]
+"""
+import os
+import sys
+import json
+import time
+import random
+import platform
+import argparse
+import subprocess
+import logging
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+BENCH_DIR = os.path.dirname(os.path.abspath(__file__))
+CASES = ('extract', 'clean', 'analyze', 'plot')
+
+
+def peak_rss_mb():
+    # VmHWM starts over at exec; ru_maxrss can carry the parent's peak into the child
+    try:
+        with open('/proc/self/status') as f:
+            return next(int(line.split()[1]) for line in f if line.startswith('VmHWM:')) / 2 ** 10
+    except (OSError, StopIteration):
+        pass
+    import resource
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return peak / 2 ** 20 if sys.platform == 'darwin' else peak / 2 ** 10
+
+
+def data_paths(args, rows):
+    name = f"{rows}_{args.cast}x{args.crew}"
+    return {
+        'raw': os.path.join(args.workdir, f"raw_{name}.csv"),
+        'cleaned': os.path.join(args.workdir, f"cleaned_{name}.csv"),
+        'extracted': os.path.join(args.workdir, f"extracted_{name}.csv"),
+        'report': os.path.join(args.workdir, f"report_{name}.txt"),
+        'plots': os.path.join(args.workdir, f"plots_{name}"),
+    }
+
+
+# --- cases (each runs in a child process) ---------------------------------------
+
+def run_extract(args, rows, paths):
+    from models.extraction import MovieExtractor
+    from stub_server import StubTMDBHandler, StubTMDBServer
+    from synthetic import make_raw_movie
+
+    class FullShapeHandler(StubTMDBHandler):
+        # Same movie every time an id is requested, with full-size credits
+        def make_payload(self, movie_id):
+            return make_raw_movie(movie_id, random.Random(movie_id), args.cast, args.crew)
+
+    n_ids = min(rows, args.extract_ids)
+    with StubTMDBServer(handler=FullShapeHandler, latency=args.stub_latency) as server:
+        extractor = MovieExtractor('stub-key', base_url=server.base_url)
+        start = time.perf_counter()
+        extractor.run(list(range(1, n_ids + 1)), paths['extracted'], mode='thread', max_workers=args.extract_workers)
+        seconds = time.perf_counter() - start
+    return {'rows': n_ids, 'seconds': seconds, 'latency': extractor.latency.stats()}
+
+
+def run_clean(args, rows, paths):
+    from models.cleaning import DataCleaner
+    start = time.perf_counter()
+    DataCleaner().run(paths['raw'], paths['cleaned'], chunk_size=args.chunk_size, with_relations=True)
+    return {'rows': rows, 'seconds': time.perf_counter() - start}
+
+
+def run_analyze(args, rows, paths):
+    from models.analysis import MovieAnalyzer
+    start = time.perf_counter()
+    analyzer = MovieAnalyzer.from_path(paths['cleaned'])
+    analyzer.generate_report(paths['report'], verbose=False)
+    return {'rows': rows, 'seconds': time.perf_counter() - start}
+
+
+def run_plot(args, rows, paths):
+    from models.visualization import DataVisualizer
+    start = time.perf_counter()
+    DataVisualizer.from_path(paths['cleaned'], paths['plots'], dpi=args.plot_dpi).run()
+    return {'rows': rows, 'seconds': time.perf_counter() - start}
+
+
+RUNNERS = {'extract': run_extract, 'clean': run_clean, 'analyze': run_analyze, 'plot': run_plot}
+
+
+def run_case(args):
+    """Child process entry point: run one case and print its result as JSON."""
+    logging.basicConfig(level=logging.WARNING)
+    result = RUNNERS[args.case](args, args.rows[0], data_paths(args, args.rows[0]))
+    result['peak_rss_mb'] = round(peak_rss_mb(), 1)
+    print(json.dumps(result))
+
+
+def spawn_case(args, case, rows):
+    command = [sys.executable, os.path.abspath(__file__), '--case', case, '--rows', str(rows),
+               '--cast', str(args.cast), '--crew', str(args.crew), '--workdir', args.workdir,
+               '--chunk-size', str(args.chunk_size), '--plot-dpi', str(args.plot_dpi),
+               '--extract-ids', str(args.extract_ids), '--extract-workers', str(args.extract_workers),
+               '--stub-latency', str(args.stub_latency)]
+    output = subprocess.run(command, check=True, capture_output=True, text=True).stdout
+    return json.loads(output.strip().splitlines()[-1])
+
+
+# --- baseline -----------------------------------------------------------------
+
+def machine():
+    return {'python': platform.python_version(), 'platform': platform.platform(), 'cpus': os.cpu_count()}
+
+
+def load_baseline(path):
+    if not os.path.exists(path):
+        return {'machine': None, 'results': {}}
+    with open(path, encoding='utf-8') as f:
+        return json.load(f)
+
+
+def compare(result, base, tolerance):
+    """Regression messages for result against its baseline entry."""
+    problems = []
+    if result['seconds'] > base['seconds'] * (1 + tolerance):
+        problems.append(f"time {result['seconds']:.2f}s vs {base['seconds']:.2f}s")
+    if result['peak_rss_mb'] > base['peak_rss_mb'] * (1 + tolerance):
+        problems.append(f"peak RSS {result['peak_rss_mb']:.0f} MB vs {base['peak_rss_mb']:.0f} MB")
+    return problems
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--rows', type=int, nargs='+', default=[10000], help="dataset sizes (default: 10000)")
+    parser.add_argument('--cases', nargs='+', choices=CASES, default=list(CASES))
+    parser.add_argument('--cast', type=int, default=80, help="cast members per synthetic movie")
+    parser.add_argument('--crew', type=int, default=400, help="crew members per synthetic movie")
+    parser.add_argument('--workdir', default=os.path.join(BENCH_DIR, '.data'))
+    parser.add_argument('--baseline', default=os.path.join(BENCH_DIR, 'baseline.json'))
+    parser.add_argument('--update-baseline', action='store_true', help="store these results as the new baseline")
+    parser.add_argument('--tolerance', type=float, default=0.25, help="allowed slowdown/growth (default: 0.25)")
+    parser.add_argument('--chunk-size', type=int, default=2000, help="clean in batches of this many rows")
+    parser.add_argument('--plot-dpi', type=int, default=100)
+    parser.add_argument('--extract-ids', type=int, default=2000, help="movies fetched from the stub (at most --rows)")
+    parser.add_argument('--extract-workers', type=int, default=10)
+    parser.add_argument('--stub-latency', type=float, default=0.0, help="seconds the stub waits per request")
+    parser.add_argument('--case', choices=CASES, help=argparse.SUPPRESS)
+    return parser.parse_args(argv)
+
+
+def main(argv=None):
+    args = parse_args(argv)
+    if args.case:
+        return run_case(args)
+
+    from synthetic import write_raw_csv
+    baseline = load_baseline(args.baseline)
+    if baseline['machine'] not in (None, machine()):
+        print(f"Note: baseline was recorded on {baseline['machine']}; timings may not be comparable.")
+
+    results, regressions = {}, []
+    print(f"{'case':<10}{'rows':>10}{'seconds':>10}{'rows/s':>10}{'peak MB':>10}  vs baseline")
+    for rows in args.rows:
+        paths = data_paths(args, rows)
+        if not os.path.exists(paths['raw']) and {'clean', 'analyze', 'plot'} & set(args.cases):
+            start = time.perf_counter()
+            write_raw_csv(paths['raw'], rows, args.cast, args.crew)
+            print(f"Generated {rows} raw movies in {time.perf_counter() - start:.1f}s "
+                  f"({os.path.getsize(paths['raw']) / 2 ** 20:.0f} MB)")
+        for case in CASES:
+            if case not in args.cases:
+                continue
+            key = f"{case}:{rows}:{args.cast}x{args.crew}"
+            result = spawn_case(args, case, rows)
+            result['rows_per_sec'] = round(result['rows'] / result['seconds'], 1)
+            results[key] = result
+            base = baseline['results'].get(key)
+            problems = compare(result, base, args.tolerance) if base else []
+            status = 'REGRESSION: ' + ', '.join(problems) if problems else ('ok' if base else 'no baseline')
+            if problems:
+                regressions.append(key)
+            print(f"{case:<10}{result['rows']:>10}{result['seconds']:>10.2f}{result['rows_per_sec']:>10.0f}"
+                  f"{result['peak_rss_mb']:>10.0f}  {status}")
+            if case == 'extract':
+                latency = result['latency']
+                print(f"{'':<10}request latency p50 <= {latency['p50_ms']}ms, p99 <= {latency['p99_ms']}ms")
+
+    if args.update_baseline:
+        baseline['machine'] = machine()
+        baseline['results'].update(results)
+        with open(args.baseline, 'w', encoding='utf-8') as f:
+            json.dump(baseline, f, indent=2, sort_keys=True)
+        print(f"Baseline updated: {args.baseline}")
+    elif regressions:
+        print(f"{len(regressions)} regression(s): {', '.join(regressions)}")
+        sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
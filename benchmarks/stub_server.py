@@ -0,0 +1,98 @@
+"""Local stand-in for the TMDB API so benchmarks can run offline."""
+import json
+import multiprocessing
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+
+def make_movie_payload(movie_id):
+    return {
+        'id': movie_id,
+        'title': f"Movie {movie_id}",
+        'status': 'Released',
+        'budget': 1000000 * (movie_id % 300 + 1),
+        'revenue': 2500000 * (movie_id % 400 + 1),
+        'genres': [{'id': 28, 'name': 'Action'}],
+        'credits': {
+            'cast': [{'id': i, 'name': f"Actor {i}"} for i in range(20)],
+            'crew': [{'id': 1, 'name': 'Some Director', 'job': 'Director'}],
+        },
+    }
+
+
+class StubTMDBHandler(BaseHTTPRequestHandler):
+    protocol_version = 'HTTP/1.1'  # keep-alive, like the real API
+    disable_nagle_algorithm = True
+    latency = 0.0
+    make_payload = staticmethod(make_movie_payload)
+
+    def do_GET(self):
+        path = self.path.split('?', 1)[0]
+        try:
+            movie_id = int(path.rstrip('/').rsplit('/', 1)[-1])
+        except ValueError:
+            movie_id = 0
+
+        if self.latency:
+            time.sleep(self.latency)
+
+        etag = f'"movie-{movie_id}"'
+        if movie_id > 0 and self.headers.get('If-None-Match') == etag:
+            self.send_response(304)
+            self.send_header('ETag', etag)
+            self.send_header('Content-Length', '0')
+            self.end_headers()
+            return
+
+        if movie_id <= 0:
+            status, payload = 404, {'success': False, 'status_code': 34}
+        else:
+            status, payload = 200, self.make_payload(movie_id)
+
+        body = json.dumps(payload).encode('utf-8')
+        self.send_response(status)
+        self.send_header('Content-Type', 'application/json')
+        if status == 200:
+            self.send_header('ETag', etag)
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        pass
+
+
+def _serve(handler, latency, port_queue):
+    handler = type('Handler', (handler,), {'latency': latency})
+    httpd = ThreadingHTTPServer(('127.0.0.1', 0), handler)
+    httpd.daemon_threads = True
+    port_queue.put(httpd.server_address[1])
+    httpd.serve_forever()
+
+
+class StubTMDBServer:
+    """
+    Run the stub API in a separate process; usable as a context manager.
+
+    A separate process keeps the server off the client's GIL so thread-mode
+    measurements are not skewed.
+    """
+
+    def __init__(self, handler=StubTMDBHandler, latency=0.0):
+        self.port_queue = multiprocessing.Queue()
+        self.process = multiprocessing.Process(
+            target=_serve, args=(handler, latency, self.port_queue), daemon=True)
+        self.port = None
+
+    @property
+    def base_url(self):
+        return f"http://127.0.0.1:{self.port}/3"
+
+    def __enter__(self):
+        self.process.start()
+        self.port = self.port_queue.get(timeout=10)
+        return self
+
+    def __exit__(self, *exc):
+        self.process.terminate()
+        self.process.join()
@@ -0,0 +1,120 @@
+"""Synthetic TMDB-shaped data: raw API records and cleaned-schema frames."""
+import os
+import sys
+import random
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import numpy as np
+import pandas as pd
+from models.sink import encode_nested_columns
+
+GENRES = [(28, 'Action'), (12, 'Adventure'), (16, 'Animation'), (35, 'Comedy'), (80, 'Crime'),
+          (18, 'Drama'), (14, 'Fantasy'), (27, 'Horror'), (10749, 'Romance'), (878, 'Science Fiction'),
+          (53, 'Thriller'), (10751, 'Family')]
+JOBS = ['Director', 'Producer', 'Screenplay', 'Editor', 'Original Music Composer',
+        'Director of Photography', 'Casting', 'Sound Designer', 'Visual Effects Supervisor']
+
+
+def make_raw_movie(movie_id, rng, cast_size=10, crew_size=20, n_people=50000):
+    genres = rng.sample(GENRES, rng.randint(1, 3))
+    in_collection = rng.random() < 0.3
+    budget = rng.choice([0, rng.randint(1, 400) * 1000000])
+    return {
+        'adult': False,
+        'backdrop_path': f"/backdrop{movie_id}.jpg",
+        'belongs_to_collection': {'id': movie_id % 5000, 'name': f"Collection {movie_id % 5000}",
+                                  'poster_path': None, 'backdrop_path': None} if in_collection else None,
+        'budget': budget,
+        'genres': [{'id': gid, 'name': name} for gid, name in genres],
+        'homepage': '',
+        'id': movie_id,
+        'imdb_id': f"tt{movie_id:07d}",
+        'origin_country': ['US'],
+        'original_language': rng.choice(['en', 'en', 'en', 'fr', 'ja', 'es', 'ko']),
+        'original_title': f"Movie {movie_id}",
+        'overview': f"Synthetic overview for movie {movie_id}. " * 3,
+        'popularity': round(rng.random() * 100, 4),
+        'poster_path': f"/poster{movie_id}.jpg",
+        'production_companies': [{'id': c, 'logo_path': None, 'name': f"Studio {c}", 'origin_country': 'US'}
+                                 for c in rng.sample(range(2000), 2)],
+        'production_countries': [{'iso_3166_1': 'US', 'name': 'United States of America'}],
+        'release_date': f"{rng.randint(1970, 2025)}-{rng.randint(1, 12):02d}-{rng.randint(1, 28):02d}",
+        'revenue': int(budget * rng.random() * 5) if budget else 0,
+        'runtime': rng.randint(80, 180),
+        'spoken_languages': [{'english_name': 'English', 'iso_639_1': 'en', 'name': 'English'}],
+        'status': 'Released' if rng.random() < 0.97 else 'Post Production',
+        'tagline': rng.choice(['', f"Tagline {movie_id}"]),
+        'title': f"Movie {movie_id}",
+        'video': False,
+        'vote_average': round(rng.random() * 10, 3),
+        'vote_count': rng.randint(0, 30000),
+        'credits': {
+            'cast': [{'adult': False, 'gender': 2, 'id': pid, 'known_for_department': 'Acting',
+                      'name': f"Actor {pid}", 'original_name': f"Actor {pid}", 'popularity': 1.0,
+                      'profile_path': None, 'cast_id': i, 'character': f"Role {i}",
+                      'credit_id': f"c{movie_id}-{i}", 'order': i}
+                     for i, pid in enumerate(rng.sample(range(n_people), cast_size))],
+            'crew': [{'adult': False, 'gender': 2, 'id': pid, 'known_for_department': 'Crew',
+                      'name': f"Person {pid}", 'original_name': f"Person {pid}", 'popularity': 1.0,
+                      'profile_path': None, 'credit_id': f"w{movie_id}-{i}", 'department': 'Crew',
+                      'job': 'Director' if i == 0 else rng.choice(JOBS)}
+                     for i, pid in enumerate(rng.sample(range(n_people), crew_size))],
+        },
+    }
+
+
+def generate_raw_movies(n, cast_size=10, crew_size=20, seed=0):
+    rng = random.Random(seed)
+    return [make_raw_movie(movie_id, rng, cast_size, crew_size) for movie_id in range(1, n + 1)]
+
+
+def write_raw_csv(path, n, cast_size=10, crew_size=20, seed=0, legacy=False, chunk_size=1000):
+    """
+    Write n synthetic movies as a raw CSV, generated and appended chunk_size
+    movies at a time so memory stays bounded for large n; legacy=True stores
+    Python reprs like old extraction runs.
+    """
+    rng = random.Random(seed)
+    os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+    for start in range(0, max(n, 1), chunk_size):
+        stop = min(start + chunk_size, n)
+        df = pd.DataFrame([make_raw_movie(movie_id, rng, cast_size, crew_size)
+                           for movie_id in range(start + 1, stop + 1)])
+        if not legacy:
+            df = encode_nested_columns(df)
+        df.to_csv(path, index=False, mode='w' if start == 0 else 'a', header=start == 0)
+    return path
+
+
+def generate_cleaned_movies(n, cast_size=5, n_actors=200000, n_directors=20000, seed=0):
+    """A cleaned-schema DataFrame of n movies, built with vectorized numpy for large n."""
+    rng = np.random.default_rng(seed)
+    genre_names = np.array([name for _, name in GENRES])
+    combos = np.array(['|'.join(rng.choice(genre_names, size=rng.integers(1, 4), replace=False))
+                       for _ in range(300)])
+    actors = rng.integers(0, n_actors, size=(n, cast_size))
+    budget = np.where(rng.random(n) < 0.2, np.nan, rng.integers(1, 400, size=n).astype(float))
+    revenue = budget * rng.random(n) * 5
+    collection = np.array([f"Collection {i}" for i in range(5000)], dtype=object)[rng.integers(0, 5000, size=n)]
+    df = pd.DataFrame({
+        'id': np.arange(1, n + 1),
+        'title': [f"Movie {i}" for i in range(1, n + 1)],
+        'release_date': pd.to_datetime('1970-01-01') + pd.to_timedelta(rng.integers(0, 20000, size=n), unit='D'),
+        'genres': combos[rng.integers(0, len(combos), size=n)],
+        'original_language': rng.choice(['en', 'fr', 'ja', 'es', 'ko'], size=n),
+        'budget_musd': budget,
+        'revenue_musd': revenue,
+        'vote_count': rng.integers(0, 30000, size=n),
+        'vote_average': rng.random(n) * 10,
+        'popularity': rng.random(n) * 100,
+        'runtime': rng.integers(80, 180, size=n),
+        'cast': ['|'.join(f"Actor {a}" for a in row) for row in actors],
+        'cast_size': cast_size,
+        'director': np.array([f"Director {d}" for d in range(n_directors)])[rng.integers(0, n_directors, size=n)],
+        'crew_size': rng.integers(5, 400, size=n),
+        'collection_name': np.where(rng.random(n) < 0.3, collection, None),
+    })
+    df['profit_musd'] = df['revenue_musd'] - df['budget_musd']
+    df['roi'] = df['revenue_musd'] / df['budget_musd']
+    return df
@@ -1,11 +1,32 @@
 import os
 import sys
 import logging
-from dotenv import load_dotenv
-from models.extraction import MovieExtractor
-from models.cleaning import DataCleaner
-from models.analysis import MovieAnalyzer
-from models.visualization import DataVisualizer
+import argparse
+from contextlib import nullcontext
+# Only light modules here (no pandas or numpy); each stage imports what it needs when it runs
+from models.layout import (FORMATS, PLOTS, PLOT_FORMATS, RELATION_SCHEMAS, SCATTER_MODES,
+                           file_digest, relation_path, with_format)
+from models.manifest import StageManifest
+from models.profiling import Profiler, section
+
+STAGES = ('extract', 'clean', 'analyze', 'plot')
+COMMANDS = {
+    'extract': "fetch the movies from the TMDB API into data/raw",
+    'clean': "clean the raw data into data/cleaned",
+    'analyze': "compute the KPIs and write kpi_report.txt",
+    'plot': "render the plots into plots/",
+    'all': "run every stage (the default)",
+    'serve': "serve the KPIs, franchise comparison, top directors and searches as JSON over HTTP",
+}
+
+# Modules whose source, with their in-package imports, is hashed into each stage's manifest entry;
+# named rather than imported so skipped stages import nothing
+STAGE_MODULES = {
+    'extract': ['models.extraction', 'models.ingest', 'models.cache'],
+    'clean': ['models.cleaning'],
+    'analyze': ['models.analysis', 'models.aggregates'],
+    'plot': ['models.visualization'],
+}
 
 def setup_logging():
     """Configure logging to file and console."""
@@ -19,51 +40,320 @@ def setup_logging():
         ]
     )
 
-def main():
+def _add_options(parser, command):
+    """Options of the stages `command` runs, plus the ones every command shares."""
+    stages = STAGES if command == 'all' else (command,)
+    parser.add_argument('--format', choices=FORMATS, default='csv',
+                        help="storage format for the raw and cleaned datasets (default: csv)")
+    if command == 'all':
+        parser.add_argument('--force', action='append', choices=STAGES + ('all',), default=[],
+                            help="re-run this stage even if its inputs are unchanged (repeatable)")
+    else:
+        parser.add_argument('--force', action='append_const', const=command, default=[],
+                            help="re-run the stage even if its inputs are unchanged")
+    if 'extract' in stages:
+        parser.add_argument('--export', metavar='PATH', default=None,
+                            help="fetch the IDs of a gzipped TMDB daily ID export that are not in data/raw yet")
+        parser.add_argument('--shard', type=int, default=0,
+                            help="with --export, fetch only the IDs with id %% SHARDS == SHARD (default: 0)")
+        parser.add_argument('--shards', type=int, default=1,
+                            help="split --export into this many shards, each fetched by its own run and "
+                                 "written next to the raw file until --merge (default: 1, fetched into data/raw directly)")
+        parser.add_argument('--merge', action='store_true',
+                            help="merge the outputs of shards 0..SHARDS-1 into data/raw without fetching, "
+                                 "then delete them and their checkpoints")
+        parser.add_argument('--retry-failed', action='store_true',
+                            help="with --export, also refetch IDs that failed earlier in this shard's checkpoint")
+    if 'clean' in stages:
+        parser.add_argument('--chunk-size', type=int, default=None,
+                            help="clean the raw data in batches of this many rows to bound memory")
+        parser.add_argument('--clean-workers', type=int, default=None,
+                            help="clean row partitions on this many processes")
+        parser.add_argument('--drop-raw-collection', action='store_true',
+                            help="leave the raw belongs_to_collection column out of the cleaned data (collection_name stays)")
+    if 'clean' in stages or 'analyze' in stages:
+        parser.add_argument('--store', action='store_true',
+                            help="also write the cleaned data to an indexed SQLite store (clean) and compute the "
+                                 "report from it with SQL instead of loading the dataset (analyze)")
+    if 'analyze' in stages:
+        parser.add_argument('--incremental', action='store_true',
+                            help="fold only new movies into saved KPI aggregates instead of recomputing the report; "
+                                 "movies already folded keep their figures until data/cache/kpi_state.json is deleted")
+        parser.add_argument('--batch', metavar='PATH', default=None,
+                            help="with --incremental, fold this cleaned CSV/Parquet batch of new movies "
+                                 "instead of reading the whole cleaned dataset")
+    if 'analyze' in stages or 'plot' in stages:
+        parser.add_argument('--compact', action='store_true',
+                            help="analyze and plot from a frame with categorical, Arrow string and downcast integer dtypes")
+    if 'plot' in stages:
+        parser.add_argument('--plot-workers', type=int, default=None,
+                            help="render the plots on this many processes")
+        parser.add_argument('--plot-format', choices=PLOT_FORMATS, default='png',
+                            help="image format for the plots (default: png)")
+        parser.add_argument('--plot-dpi', type=int, default=300,
+                            help="resolution of raster plots (default: 300)")
+        parser.add_argument('--scatter-mode', choices=SCATTER_MODES, default='sample',
+                            help="large scatter plots: stratified sample keeping outliers, or 2D density (default: sample)")
+        parser.add_argument('--scatter-threshold', type=int, default=100000,
+                            help="scatter plots with more points than this switch to --scatter-mode (default: 100000)")
+    parser.add_argument('--metrics', metavar='PATH', default=None,
+                        help="write wall/CPU time, memory and row counts per stage and sub-step to this JSON file")
+    parser.add_argument('--cprofile', metavar='DIR', default=None,
+                        help="dump cProfile stats of each stage that runs to DIR/<stage>.prof")
+    parser.add_argument('--trace-memory', action='store_true',
+                        help="with --metrics, also record each step's peak allocation via tracemalloc (slower)")
+
+def _add_serve_options(parser):
+    parser.add_argument('--format', choices=FORMATS, default='csv',
+                        help="storage format of the cleaned dataset to serve (default: csv)")
+    parser.add_argument('--store', action='store_true',
+                        help="serve from the SQLite store written by `clean --store` instead of loading the cleaned file")
+    parser.add_argument('--compact', action='store_true',
+                        help="hold the cleaned data in categorical, Arrow string and downcast integer dtypes")
+    parser.add_argument('--host', default='127.0.0.1', help="address to listen on (default: 127.0.0.1)")
+    parser.add_argument('--port', type=int, default=8000, help="port to listen on (default: 8000)")
+    parser.add_argument('--cache-size', type=int, default=1024,
+                        help="responses kept in the LRU cache; 0 disables it (default: 1024)")
+
+def build_parser():
+    parser = argparse.ArgumentParser(description="TMDB movie data pipeline",
+                                     epilog="Without a command, every stage runs: `main.py [options]` is `main.py all [options]`.")
+    commands = parser.add_subparsers(dest='command', metavar='COMMAND')
+    for command, description in COMMANDS.items():
+        subparser = commands.add_parser(command, help=description, description=description)
+        if command == 'serve':
+            _add_serve_options(subparser)
+        else:
+            _add_options(subparser, command)
+    return parser
+
+def parse_args(argv=None):
+    argv = sys.argv[1:] if argv is None else list(argv)
+    if not argv or (argv[0] not in COMMANDS and argv[0] not in ('-h', '--help')):
+        argv = ['all'] + argv
+    parser = build_parser()
+    args = parser.parse_args(argv)
+    if getattr(args, 'store', False) and getattr(args, 'incremental', False):
+        parser.error("--store and --incremental cannot be combined: incremental aggregates are folded from a frame")
+    if getattr(args, 'batch', None) and not args.incremental:
+        parser.error("--batch needs --incremental")
+    if args.command in ('extract', 'all'):
+        if args.shards < 1 or not 0 <= args.shard < args.shards:
+            parser.error("--shard must be between 0 and --shards - 1")
+        if args.command == 'all' and (args.shards > 1 or args.merge):
+            parser.error("--shards and --merge run the extract command only; clean once every shard is merged")
+        if args.retry_failed and not args.export:
+            parser.error("--retry-failed needs --export")
+        if args.merge and args.export:
+            parser.error("--merge does not fetch; run it after the --export runs of every shard")
+        if args.shards > 1 and not (args.export or args.merge):
+            parser.error("--shards needs --export (or --merge)")
+    return args
+
+def main(argv=None):
+    args = parse_args(argv)
     setup_logging()
     logger = logging.getLogger(__name__)
-    
+    if args.command == 'serve':
+        return serve(args, logger)
+    stages = STAGES if args.command == 'all' else (args.command,)
+    profiler = Profiler(cprofile_dir=args.cprofile, trace_memory=args.trace_memory)
+    with profiler if args.metrics or args.cprofile else nullcontext():
+        run_pipeline(args, stages, logger, profiler)
+    if args.metrics or args.cprofile:
+        profiler.log_summary()
+    if args.metrics:
+        profiler.write(args.metrics)
+
+def run_pipeline(args, stages, logger, profiler):
     # Setup paths
     project_root = os.path.dirname(os.path.abspath(__file__))
-    raw_data_path = os.path.join(project_root, 'data', 'raw', 'movies_data.csv')
-    cleaned_data_path = os.path.join(project_root, 'data', 'cleaned', 'movies_data_cleaned.csv')
+    raw_data_path = with_format(os.path.join(project_root, 'data', 'raw', 'movies_data.csv'), args.format)
+    cleaned_data_path = with_format(os.path.join(project_root, 'data', 'cleaned', 'movies_data_cleaned.csv'), args.format)
     plots_dir = os.path.join(project_root, 'plots')
+    plot_cache_dir = os.path.join(plots_dir, '.cache')
     report_path = os.path.join(project_root, 'kpi_report.txt')
+    cache_path = os.path.join(project_root, 'data', 'cache', 'tmdb_responses.sqlite')
+    kpi_state_path = os.path.join(project_root, 'data', 'cache', 'kpi_state.json')
+    store_path = os.path.join(project_root, 'data', 'cleaned', 'movies.sqlite')
+    cleaned_outputs = [cleaned_data_path] + [relation_path(cleaned_data_path, table) for table in RELATION_SCHEMAS]
 
-    # Load environment variables
-    load_dotenv()
-    api_key = os.getenv("api_key")
-    if not api_key:
-        logger.error("API key not found in .env")
-        sys.exit(1)
-    
     logger.info("\n=== TMDB Data Pipeline Starting ===")
+    # Stages whose inputs, code and outputs are unchanged since the last run are skipped
+    manifest = StageManifest(os.path.join(project_root, 'data', 'cache', 'pipeline_manifest.json'), root=project_root)
+    forced = set(STAGES) if 'all' in args.force else set(args.force)
+    shared = {}
+
+    def run_stage(stage, func, **inputs):
+        # Timed (and cProfiled, with --cprofile) as one section; sub-steps nest under it
+        with profiler.section(stage, profile=True) as values:
+            values['ran'] = manifest.run(stage, func, code=STAGE_MODULES[stage], force=stage in forced, **inputs)
 
     # 1. Extraction
-    logger.info("--- Step 1: Data Extraction ---")
-    movie_ids = [0, 299534, 19995, 140607, 299536, 597, 135397, 420818, 24428,
-                 168259, 99861, 284054, 12445, 181808, 330457, 351286, 109445,
-                 321612, 260513]
-    extractor = MovieExtractor(api_key)
-    # Note: extraction logs will be handled inside the class
-    extractor.run(movie_ids, raw_data_path)
+    def merge():
+        from models.ingest import clear_shards, merge_shards, shard_path
+        if not any(os.path.exists(shard_path(raw_data_path, shard, args.shards)) for shard in range(args.shards)):
+            logger.warning(f"No shard outputs to merge next to {raw_data_path}; were they merged already?")
+            return
+        merge_shards(raw_data_path, args.shards, extra_paths=[raw_data_path])
+        clear_shards(raw_data_path, args.shards)
+
+    def extract():
+        from dotenv import load_dotenv
+        from models.extraction import MovieExtractor
+        from models.cache import ResponseCache
+        # Load environment variables
+        load_dotenv()
+        api_key = os.getenv("api_key")
+        if not api_key:
+            logger.error("API key not found in .env")
+            sys.exit(1)
+        # TMDB allows roughly 40-50 requests/sec; stay under it across all workers
+        # Responses are cached on disk, so warm reruns barely touch the network
+        extractor = MovieExtractor(api_key, rate_limit=40, cache=ResponseCache(cache_path))
+        if args.export:
+            from models.ingest import ingest_shard
+            # IDs already in data/raw are skipped; the shard streams into its own checkpointed output
+            output = ingest_shard(extractor, args.export, raw_data_path, args.shard, args.shards,
+                                  known_paths=[raw_data_path], retry_failed=args.retry_failed)
+            if output is not None and args.shards == 1:
+                merge()
+            return
+        # Note: extraction logs will be handled inside the class
+        extractor.run(movie_ids, raw_data_path)
+
+    if 'extract' in stages:
+        logger.info("--- Step 1: Data Extraction ---")
+        movie_ids = [0, 299534, 19995, 140607, 299536, 597, 135397, 420818, 24428,
+                     168259, 99861, 284054, 12445, 181808, 330457, 351286, 109445,
+                     321612, 260513]
+        if args.merge:
+            from models.ingest import shard_path
+            shard_paths = [shard_path(raw_data_path, shard, args.shards) for shard in range(args.shards)]
+            run_stage('extract', merge, files=shard_paths, params={'merge': args.shards}, outputs=[raw_data_path])
+        elif args.export:
+            from models.ingest import shard_path
+            output = raw_data_path if args.shards == 1 else shard_path(raw_data_path, args.shard, args.shards)
+            run_stage('extract', extract, files=[args.export],
+                      params={'shard': args.shard, 'shards': args.shards, 'retry_failed': args.retry_failed},
+                      outputs=[output])
+        else:
+            run_stage('extract', extract, params={'movie_ids': movie_ids}, outputs=[raw_data_path])
 
     # 2. Cleaning
-    logger.info("\n--- Step 2: Data Cleaning ---")
-    cleaner = DataCleaner()
-    df_cleaned = cleaner.run(raw_data_path, cleaned_data_path)
+    def clean():
+        from models.cleaning import DataCleaner
+        cleaner = DataCleaner(drop_raw_collection=args.drop_raw_collection)
+        cleaner.run(raw_data_path, cleaned_data_path, chunk_size=args.chunk_size, workers=args.clean_workers,
+                    with_relations=True, store_path=store_path if args.store else None)
+
+    if 'clean' in stages:
+        logger.info("\n--- Step 2: Data Cleaning ---")
+        # Chunking and workers do not change the output, so they are not part of the inputs
+        run_stage('clean', clean, files=[raw_data_path],
+                  params={'drop_raw_collection': args.drop_raw_collection, 'store': args.store},
+                  outputs=cleaned_outputs + ([store_path] if args.store else []))
+
+    # 3. Analysis (loads only the columns analysis and plots need, once)
+    def analyze():
+        from models.analysis import MovieAnalyzer
+        if args.batch:
+            from models.aggregates import KPIAggregates
+            from models.storage import CLEANED_SCHEMA, load_frame
+            # Only the batch and the saved state are read, so the cost follows the batch size
+            with section('load') as counts:
+                batch = load_frame(args.batch, columns=MovieAnalyzer.COLUMNS, schema=CLEANED_SCHEMA)
+                counts['rows_out'] = len(batch)
+            kpi_state = KPIAggregates.load(kpi_state_path)
+            with section('fold', rows_in=len(batch)):
+                kpi_state.fold(batch)
+            kpi_state.save(kpi_state_path)
+            with section('write_report'):
+                kpi_state.report(report_path)
+            return
+        if args.store:
+            # Only the report's result rows are loaded; the plot stage reads the cleaned file itself
+            analyzer = MovieAnalyzer.from_store(store_path)
+            shared['analyzer'] = analyzer
+            analyzer.run(report_path)
+            return
+        from models.visualization import DataVisualizer
+        # The plot stage reuses this frame when it runs in the same process
+        extra_columns = DataVisualizer.COLUMNS if 'plot' in stages else ()
+        analyzer = MovieAnalyzer.from_path(cleaned_data_path, extra_columns=extra_columns, compact=args.compact)
+        shared['analyzer'] = analyzer
+        if args.incremental:
+            from models.aggregates import KPIAggregates
+            kpi_state = KPIAggregates.load(kpi_state_path)
+            with section('fold', rows_in=len(analyzer.df)):
+                kpi_state.fold(analyzer.df)
+            kpi_state.save(kpi_state_path)
+            with section('write_report'):
+                kpi_state.report(report_path)
+        else:
+            analyzer.run(report_path)
 
-    # 3. Analysis
-    logger.info("\n--- Step 3: Analysis ---")
-    analyzer = MovieAnalyzer(df_cleaned)
-    analyzer.run(report_path)
+    if 'analyze' in stages:
+        logger.info("\n--- Step 3: Analysis ---")
+        if args.batch:
+            analyze_files = [args.batch]
+        else:
+            analyze_files = [store_path] if args.store else cleaned_outputs
+        # --compact only changes in-memory dtypes, not the report, so it is not part of the inputs
+        run_stage('analyze', analyze, files=analyze_files,
+                  params={'incremental': args.incremental, 'store': args.store, 'batch': args.batch},
+                  outputs=[report_path])
 
     # 4. Visualization
-    logger.info("\n--- Step 4: Visualization ---")
-    visualizer = DataVisualizer(df_cleaned, plots_dir)
-    visualizer.run()
+    def plot():
+        from models.visualization import DataVisualizer
+        options = dict(dpi=args.plot_dpi, fmt=args.plot_format,
+                       scatter_mode=args.scatter_mode, scatter_threshold=args.scatter_threshold)
+        if 'analyzer' in shared and shared['analyzer'].df is not None:
+            # Shares the analyzer's frame and memoized tables, e.g. the franchise comparison;
+            # plot data is reused from plots/.cache while the cleaned file is unchanged
+            analyzer = shared['analyzer']
+            visualizer = DataVisualizer(analyzer.df, plots_dir, results=analyzer.results,
+                                        cache_dir=plot_cache_dir, dataset_key=file_digest(cleaned_data_path),
+                                        **options)
+        else:
+            visualizer = DataVisualizer.from_path(cleaned_data_path, plots_dir, cache_dir=plot_cache_dir,
+                                                  compact=args.compact, **options)
+        visualizer.run(workers=args.plot_workers)
+
+    if 'plot' in stages:
+        logger.info("\n--- Step 4: Visualization ---")
+        plot_paths = [os.path.join(plots_dir, f"{os.path.splitext(name)[0]}.{args.plot_format}")
+                      for name in PLOTS.values()]
+        # Like --plot-workers, --compact leaves the plots byte-identical
+        run_stage('plot', plot, files=[cleaned_data_path],
+                  params={'dpi': args.plot_dpi, 'format': args.plot_format,
+                          'scatter_mode': args.scatter_mode, 'scatter_threshold': args.scatter_threshold},
+                  outputs=plot_paths)
+
+    if 'analyzer' in shared:
+        # Compute time and cache hits of every derived table, shared by steps 3 and 4
+        shared['analyzer'].results.log_stats()
 
     logger.info("\n=== Pipeline Complete ===")
 
+def serve(args, logger):
+    from models.service import KPIService, make_server
+    project_root = os.path.dirname(os.path.abspath(__file__))
+    if args.store:
+        path = os.path.join(project_root, 'data', 'cleaned', 'movies.sqlite')
+    else:
+        path = with_format(os.path.join(project_root, 'data', 'cleaned', 'movies_data_cleaned.csv'), args.format)
+    service = KPIService(path, store=args.store, compact=args.compact, cache_size=args.cache_size)
+    server = make_server(service, args.host, args.port)
+    logger.info(f"Serving KPIs on http://{args.host}:{server.server_address[1]} "
+                f"(/kpis, /franchise, /directors, /searches, /search, /health)")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        logger.info("Shutting down.")
+    finally:
+        server.server_close()
+
 if __name__ == "__main__":
     main()
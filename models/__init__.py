@@ -1,4 +1,19 @@
-from .extraction import MovieExtractor
-from .cleaning import DataCleaner
-from .analysis import MovieAnalyzer
-from .visualization import DataVisualizer
+import importlib
+
+# Each class is imported on first access, so `import models` (or any submodule)
+# does not load requests or the plotting stack unless a stage needs them
+_EXPORTS = {
+    'MovieExtractor': '.extraction',
+    'DataCleaner': '.cleaning',
+    'MovieAnalyzer': '.analysis',
+    'DataVisualizer': '.visualization',
+}
+
+__all__ = list(_EXPORTS)
+
+def __getattr__(name):
+    if name not in _EXPORTS:
+        raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+    value = getattr(importlib.import_module(_EXPORTS[name], __name__), name)
+    globals()[name] = value
+    return value
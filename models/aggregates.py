@@ -0,0 +1,330 @@
+import os
+import glob
+import json
+import math
+import heapq
+import numpy as np
+import pandas as pd
+import logging
+from .analysis import MovieAnalyzer, CUSTOM_SEARCHES, SEARCH_COLUMNS, format_report, write_report
+from .kpi import RANKED_KPIS, TopKEngine
+from .storage import CLEANED_SCHEMA, apply_schema
+
+logger = logging.getLogger(__name__)
+
+# Columns averaged per franchise group; ROI is summarized by its median instead
+FRANCHISE_MEANS = ['revenue_musd', 'budget_musd', 'popularity', 'vote_average']
+FRANCHISE_COLUMNS = ['revenue_musd', 'roi', 'budget_musd', 'popularity', 'vote_average']
+FRANCHISE_GROUPS = [(False, 'Standalone'), (True, 'Franchise')]
+
+class MedianSketch:
+    """
+    Mergeable median summary. Values are kept exactly until there are more
+    than exact_limit of them, then folded into logarithmic buckets whose
+    width bounds the relative error of the median by relative_accuracy.
+    """
+
+    def __init__(self, relative_accuracy=0.01, exact_limit=10000):
+        self.relative_accuracy = relative_accuracy
+        self.exact_limit = exact_limit
+        self.gamma = (1 + relative_accuracy) / (1 - relative_accuracy)
+        self.count = 0
+        self.values = []
+        self.positive, self.negative, self.zero = {}, {}, 0
+
+    @property
+    def exact(self):
+        return self.values is not None
+
+    def update(self, values):
+        values = np.asarray(values, dtype='float64')
+        values = values[~np.isnan(values)]
+        self.count += len(values)
+        if self.exact:
+            self.values.extend(values.tolist())
+            if len(self.values) <= self.exact_limit:
+                return
+            values, self.values = np.asarray(self.values), None
+        self._add_to_buckets(values)
+
+    def _add_to_buckets(self, values):
+        self.zero += int((values == 0).sum())
+        for buckets, part in ((self.positive, values[values > 0]), (self.negative, -values[values < 0])):
+            keys, counts = np.unique(np.ceil(np.log(part) / np.log(self.gamma)).astype('int64'), return_counts=True)
+            for key, count in zip(keys.tolist(), counts.tolist()):
+                buckets[key] = buckets.get(key, 0) + count
+
+    def _value_at(self, rank):
+        """Approximate value of the rank-th smallest element (0-based) from the buckets."""
+        for key in sorted(self.negative, reverse=True):
+            rank -= self.negative[key]
+            if rank < 0:
+                return -2 * self.gamma ** key / (self.gamma + 1)
+        rank -= self.zero
+        if rank < 0:
+            return 0.0
+        for key in sorted(self.positive):
+            rank -= self.positive[key]
+            if rank < 0:
+                return 2 * self.gamma ** key / (self.gamma + 1)
+        return math.nan
+
+    def median(self):
+        if not self.count:
+            return math.nan
+        if self.exact:
+            return float(np.median(self.values))
+        # Average the two middle elements for an even count, like pandas
+        return (self._value_at((self.count - 1) // 2) + self._value_at(self.count // 2)) / 2
+
+    def to_dict(self):
+        return {'relative_accuracy': self.relative_accuracy, 'exact_limit': self.exact_limit,
+                'count': self.count, 'values': self.values, 'zero': self.zero,
+                'positive': self.positive, 'negative': self.negative}
+
+    @classmethod
+    def from_dict(cls, state):
+        sketch = cls(state['relative_accuracy'], state['exact_limit'])
+        sketch.count, sketch.values, sketch.zero = state['count'], state['values'], state['zero']
+        sketch.positive = {int(k): v for k, v in state['positive'].items()}
+        sketch.negative = {int(k): v for k, v in state['negative'].items()}
+        return sketch
+
+class KPIAggregates:
+    """
+    Mergeable report state, folded batch by batch instead of recomputing
+    over the whole cleaned dataset.
+
+    Per ranked KPI it keeps the k best (value, arrival order) candidates and,
+    while fewer than k rows have a value, the first k rows without one; per
+    franchise group, counts and sums for the means plus a ROI MedianSketch;
+    per director, the movie count and revenue/rating sums; and the rows that
+    match the report's custom searches. Folding costs time proportional to
+    the batch, and the report reads only this state. Movies already folded
+    (by id) are skipped, so a movie whose figures change keeps the values it
+    was folded with; rebuild the state from the full dataset to pick them up.
+    """
+
+    def __init__(self, k=5):
+        self.k = k
+        self.rows = 0
+        self.ids = np.empty(0, dtype='int64')  # saved ids, sorted, for binary-search membership
+        self._runs = []  # sorted runs of the ids folded since the last save
+        self.top = {title: {'valid': [], 'missing': []} for title, _, _, _ in RANKED_KPIS}
+        self.groups = {}
+        self.directors = {}
+        self.searches = {name: [] for name in CUSTOM_SEARCHES}
+
+    # --- folding --------------------------------------------------------------
+
+    def fold(self, df):
+        """Fold the movies of df that are not in the state yet; returns how many were added."""
+        ids = pd.to_numeric(df['id'], errors='coerce')
+        batch = df[ids.notna().to_numpy() & ~self._folded(ids.fillna(0).to_numpy(dtype='int64'))]
+        batch = batch.drop_duplicates(subset='id').reset_index(drop=True)
+        if batch.empty:
+            return 0
+        self._fold_ranked(batch)
+        self._fold_franchise(batch)
+        self._fold_directors(batch)
+        self._fold_searches(batch)
+
+        self._add_run(np.sort(batch['id'].to_numpy(dtype='int64')))
+        self.rows += len(batch)
+        logger.info(f"Folded {len(batch)} new movies into KPI aggregates ({self.rows} total).")
+        return len(batch)
+
+    def _add_run(self, ids):
+        """
+        Keep a batch's sorted ids as a run instead of inserting them into the
+        saved ids. Runs are merged while the last is at least half the size of
+        the one before, so there are O(log n) of them and merging stays
+        proportional to the folded ids rather than to the whole state.
+        """
+        self._runs.append(ids)
+        while len(self._runs) > 1 and len(self._runs[-2]) <= 2 * len(self._runs[-1]):
+            last = self._runs.pop()
+            # Stable sort of two sorted runs is a single linear merge (timsort)
+            self._runs[-1] = np.sort(np.concatenate([self._runs[-1], last]), kind='stable')
+
+    def _folded(self, ids):
+        """Which of ids are already in the state: binary searches, so the cost follows the batch."""
+        folded = np.zeros(len(ids), dtype=bool)
+        for run in [self.ids] + self._runs:
+            if len(run):
+                found = np.minimum(np.searchsorted(run, ids), len(run) - 1)
+                folded |= run[found] == ids
+        return folded
+
+    def _fold_ranked(self, batch):
+        engine = TopKEngine(batch)
+        ids, titles = batch['id'].tolist(), batch['title'].tolist()
+        for title, metric, asc, cond in RANKED_KPIS:
+            positions, _ = engine.top_k(metric, self.k, asc, cond)
+            values = engine.values(metric)
+            entry = self.top[title]
+            for p in positions.tolist():
+                row = [self.rows + p, int(ids[p]), None if pd.isna(titles[p]) else titles[p]]
+                if np.isnan(values[p]):
+                    entry['missing'].append(row)
+                else:
+                    entry['valid'].append([float(values[p])] + row)
+            entry['valid'] = heapq.nsmallest(self.k, entry['valid'],
+                                             key=lambda e: (e[0] if asc else -e[0], e[1]))
+            entry['missing'] = sorted(entry['missing'])[:self.k]
+
+    def _fold_franchise(self, batch):
+        is_franchise = batch['collection_name'].notna().to_numpy()
+        for flag, name in FRANCHISE_GROUPS:
+            rows = batch[is_franchise == flag]
+            if rows.empty:
+                continue
+            group = self.groups.setdefault(name, {'rows': 0, 'sums': dict.fromkeys(FRANCHISE_MEANS, 0.0),
+                                                  'counts': dict.fromkeys(FRANCHISE_MEANS, 0), 'roi': MedianSketch()})
+            group['rows'] += len(rows)
+            for col in FRANCHISE_MEANS:
+                values = pd.to_numeric(rows[col], errors='coerce').to_numpy(dtype='float64', na_value=np.nan)
+                group['sums'][col] += float(np.nansum(values))
+                group['counts'][col] += int((~np.isnan(values)).sum())
+            group['roi'].update(pd.to_numeric(rows['roi'], errors='coerce').to_numpy(dtype='float64', na_value=np.nan))
+
+    def _fold_directors(self, batch):
+        stats = batch.dropna(subset=['director']).groupby('director').agg(
+            movie_count=('title', 'count'),
+            total_revenue=('revenue_musd', 'sum'),
+            rating_sum=('vote_average', 'sum'),
+            rating_count=('vote_average', 'count'),
+        )
+        for director, row in zip(stats.index, stats.itertuples(index=False)):
+            totals = self.directors.setdefault(director, [0, 0.0, 0.0, 0])
+            totals[0] += int(row.movie_count)
+            totals[1] += float(row.total_revenue)
+            totals[2] += float(row.rating_sum)
+            totals[3] += int(row.rating_count)
+
+    def _fold_searches(self, batch):
+        results = MovieAnalyzer(batch).get_custom_search_results()
+        for name, result in results.items():
+            # Stored in arrival order; the report re-sorts them stably
+            result = result.sort_index()[SEARCH_COLUMNS[name]]
+            for record in result.astype(object).where(result.notna(), None).to_dict('records'):
+                self.searches[name].append(record)
+
+    # --- report ---------------------------------------------------------------
+
+    def ranked_kpis(self):
+        results = []
+        for title, metric, asc, _ in RANKED_KPIS:
+            entry = self.top[title]
+            valid = sorted(entry['valid'], key=lambda e: (e[0] if asc else -e[0], e[1]))
+            keys = np.array([e[0] if asc else -e[0] for e in valid], dtype='float64')
+            ranks = (np.searchsorted(keys, keys, side='left') + 1).tolist()
+            rows = [(e[2], e[3], e[0], rank) for e, rank in zip(valid, ranks)]
+            rows += [(e[1], e[2], None, None) for e in entry['missing'][:self.k - len(rows)]]
+            frame = apply_schema(pd.DataFrame(rows, columns=['id', 'title', metric, 'rank']), CLEANED_SCHEMA)
+            frame['rank'] = frame['rank'].astype('Int64')
+            results.append((title, frame))
+        return results
+
+    def search_results(self):
+        results = {}
+        for name, search in CUSTOM_SEARCHES.items():
+            frame = apply_schema(pd.DataFrame(self.searches[name], columns=SEARCH_COLUMNS[name]), CLEANED_SCHEMA)
+            results[name] = frame.sort_values(search['sort_by'], ascending=search['ascending'],
+                                              kind='stable').reset_index(drop=True)
+        return results
+
+    def franchise_comparison(self):
+        rows, names = [], []
+        for _, name in FRANCHISE_GROUPS:
+            group = self.groups.get(name)
+            if group is None:
+                continue
+            means = {col: group['sums'][col] / group['counts'][col] if group['counts'][col] else math.nan
+                     for col in FRANCHISE_MEANS}
+            means['roi'] = group['roi'].median()
+            rows.append([means[col] for col in FRANCHISE_COLUMNS])
+            names.append(name)
+        return pd.DataFrame(rows, columns=FRANCHISE_COLUMNS, index=pd.Index(names, name='is_franchise'))
+
+    def top_directors(self, n=5):
+        # Ties keep the name order of the groupby this replaces
+        top = heapq.nsmallest(n, self.directors.items(), key=lambda item: (-item[1][1], item[0]))
+        rows = [[count, revenue, rating_sum / rating_count if rating_count else math.nan]
+                for _, (count, revenue, rating_sum, rating_count) in top]
+        return pd.DataFrame(rows, columns=['movie_count', 'total_revenue', 'mean_rating'],
+                            index=pd.Index([name for name, _ in top], name='director'))
+
+    def report(self, output_path=None, verbose=True):
+        report = format_report(self.ranked_kpis(), self.search_results(),
+                               self.franchise_comparison(), self.top_directors())
+        if output_path:
+            write_report(report, output_path, verbose)
+        return report
+
+    # --- persistence ----------------------------------------------------------
+
+    @staticmethod
+    def ids_path(path, rows):
+        return f"{os.path.splitext(path)[0]}_ids.{rows}.bin"
+
+    def save(self, path):
+        """
+        Write the folded ids, sorted, to an int64 file named after the row
+        count, then the state as JSON, each replaced atomically. The JSON only
+        ever names a complete id file, so a save interrupted between the two
+        writes leaves the previous state intact; id files of earlier saves
+        are removed once the JSON is in place.
+        """
+        os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+        state = {
+            'k': self.k,
+            'rows': self.rows,
+            'top': self.top,
+            'groups': {name: dict(group, roi=group['roi'].to_dict()) for name, group in self.groups.items()},
+            'directors': self.directors,
+            'searches': self.searches,
+        }
+        ids_path = self.ids_path(path, self.rows)
+        if self._runs or not os.path.exists(ids_path):
+            # One linear merge of the saved ids and the new runs per save
+            ids = np.sort(np.concatenate([self.ids] + self._runs), kind='stable').astype('int64')
+            ids.astype('<i8').tofile(f"{ids_path}.tmp")
+            os.replace(f"{ids_path}.tmp", ids_path)
+            self.ids, self._runs = ids, []
+        with open(f"{path}.tmp", 'w', encoding='utf-8') as f:
+            # dumps uses the C encoder; json.dump streams through the pure-Python one
+            f.write(json.dumps(state))
+        os.replace(f"{path}.tmp", path)
+        for old in glob.glob(f"{glob.escape(os.path.splitext(path)[0])}_ids.*.bin"):
+            if old != ids_path:
+                os.remove(old)
+        logger.info(f"Saved KPI aggregates for {self.rows} movies to {path}")
+
+    @classmethod
+    def load(cls, path, k=5):
+        """Load saved state, or start an empty one when path does not exist yet."""
+        if not os.path.exists(path):
+            return cls(k)
+        with open(path, encoding='utf-8') as f:
+            state = json.load(f)
+        aggregates = cls(state['k'])
+        aggregates.rows = state['rows']
+        ids_path = cls.ids_path(path, state['rows'])
+        if not state['rows']:
+            ids = np.empty(0, dtype='int64')
+        elif os.path.exists(ids_path):
+            # Sorted on disk, so it is mapped rather than read and sorted: lookups touch only the pages they search
+            ids = np.memmap(ids_path, dtype='<i8', mode='r')
+        else:
+            ids = []
+        if len(ids) != state['rows']:
+            raise ValueError(f"{ids_path} holds {len(ids)} folded ids, expected {state['rows']}; "
+                             f"delete {path} to rebuild the state")
+        aggregates.ids = ids
+        aggregates.top = state['top']
+        aggregates.groups = {name: dict(group, roi=MedianSketch.from_dict(group['roi']))
+                             for name, group in state['groups'].items()}
+        aggregates.directors = state['directors']
+        aggregates.searches = state['searches']
+        return aggregates
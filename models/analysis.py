@@ -1,126 +1,202 @@
 import pandas as pd
+import numpy as np
 import logging
 import os
+from .storage import CLEANED_SCHEMA, compact_frame, load_frame, log_memory_report, memory_report
+from .relations import load_relations
+from .query import MovieQueryIndex
+from .results import AnalysisResults
+from .sqlstore import MovieStore, StoreResults
+from .profiling import section
 
 logger = logging.getLogger(__name__)
 
+def _as_list(value):
+    if value is None:
+        return []
+    return [value] if isinstance(value, str) else list(value)
+
+# Fixed searches shown in the report: query() arguments and the columns printed
+CUSTOM_SEARCHES = {
+    'bruce_willis_scifi': dict(actor='Bruce Willis', genres=['Science Fiction', 'Action'],
+                               sort_by='vote_average', ascending=False),
+    'uma_thurman_tarantino': dict(actor='Uma Thurman', director='Quentin Tarantino',
+                                  sort_by='runtime', ascending=True),
+}
+SEARCH_COLUMNS = {
+    'bruce_willis_scifi': ['id', 'title', 'genres', 'vote_average'],
+    'uma_thurman_tarantino': ['id', 'title', 'director', 'runtime'],
+}
+
+def format_report(ranked_kpis, search_results, franchise_comparison, top_directors):
+    """Render the KPI report from its parts; shared by full and incremental analysis."""
+    lines = ["--- KPI Analysis ---"]
+
+    for title, result_df in ranked_kpis:
+        msg_title = f"\n{title}:"
+        lines.append(msg_title)
+        
+        # Convert dataframe to string for file output
+        df_str = result_df.to_string(index=False)
+        lines.append(f"\n{df_str}")
+
+    # Add Custom Search Results
+    lines.append("\n\n--- Custom Search Results ---")
+    
+    lines.append("\n\nSearch 1: Bruce Willis in Science Fiction/Action movies:")
+    if not search_results['bruce_willis_scifi'].empty:
+        lines.append(search_results['bruce_willis_scifi'][SEARCH_COLUMNS['bruce_willis_scifi']].to_string(index=False))
+    else:
+        lines.append("No results found.")
+    
+    lines.append("\n\nSearch 2: Uma Thurman with Quentin Tarantino:")
+    if not search_results['uma_thurman_tarantino'].empty:
+        lines.append(search_results['uma_thurman_tarantino'][SEARCH_COLUMNS['uma_thurman_tarantino']].to_string(index=False))
+    else:
+        lines.append("No results found.")
+
+    # Add Franchise vs Standalone Analysis
+    lines.append("\n\n--- Franchise vs Standalone Analysis ---")
+    lines.append(franchise_comparison.to_string())
+
+    # Add Top Directors
+    lines.append("\n\n--- Top 5 Directors by Total Revenue ---")
+    lines.append(top_directors.to_string())
+
+    return '\n'.join(lines)
+
+def write_report(report, output_path, verbose=True):
+    try:
+        with open(output_path, 'w', encoding='utf-8') as f:
+            f.write(report)
+        if verbose:
+            logger.info(f"KPI Report saved to {output_path}")
+    except IOError as e:
+        if verbose:
+            logger.error(f"Failed to write KPI report to {output_path}: {e}")
+
 class MovieAnalyzer:
-    def __init__(self, df):
+    # Cleaned columns the report and query() read (release_date for year filters); everything else is left on disk
+    COLUMNS = ['id', 'title', 'genres', 'budget_musd', 'revenue_musd', 'profit_musd', 'roi',
+               'vote_count', 'vote_average', 'popularity', 'runtime', 'cast', 'director',
+               'collection_name', 'release_date']
+
+    def __init__(self, df, relations=None, results=None, store=None):
         self.df = df
+        self.relations = relations
+        self.store = store
+        self._index = None
+        self._results = results
+
+    @classmethod
+    def from_path(cls, path, extra_columns=(), compact=False):
+        """
+        Load only the analysis columns (plus extra_columns) of a cleaned
+        CSV/Parquet file, and the cast/genre relation tables saved next to
+        it, if any. compact=True converts the frame to COMPACT_SCHEMA dtypes.
+        """
+        columns = cls.COLUMNS + [col for col in extra_columns if col not in cls.COLUMNS]
+        with section('load') as counts:
+            df = load_frame(path, columns=columns, schema=CLEANED_SCHEMA)
+            relations = load_relations(path, tables=['movie_cast', 'person', 'movie_genre', 'genre'],
+                                       movie_ids=df['id'])
+            counts['rows_out'] = len(df)
+        if compact:
+            with section('compact_dtypes'):
+                compacted = compact_frame(df)
+                log_memory_report(memory_report(df, compacted), 'analysis frame')
+                df = compacted
+        return cls(df, relations)
+
+    @classmethod
+    def from_store(cls, path):
+        """
+        Analyze a SQLite store written by DataCleaner.run(store_path=...)
+        without loading it: the report and query() run as indexed SQL and
+        only their result rows reach pandas. self.df is None.
+        """
+        store = MovieStore(path)
+        logger.info(f"Analyzing {store.count()} movies from the SQLite store {path}")
+        return cls(None, store=store, results=StoreResults(store))
+
+    @property
+    def results(self):
+        """Memoized derived tables of self.df; pass it to DataVisualizer to share them."""
+        if self._results is None or self._results.df is not self.df:
+            self._results = AnalysisResults(self.df)
+        return self._results
+
+    @property
+    def index(self):
+        """Query indexes over self.df, built lazily and rebuilt if self.df is replaced."""
+        if self._index is None or self._index.df is not self.df:
+            with section('query_index', rows_in=len(self.df)):
+                self._index = MovieQueryIndex(self.df, self.relations)
+        return self._index
+
+    def query(self, actor=None, director=None, genres=None, all_genres=False, year=None,
+              ranges=None, sort_by=None, ascending=False, top_n=None, columns=None):
+        """
+        Indexed movie search. actor/director/genres take a name or a list of
+        names: every actor and director must match, and any genre matches
+        unless all_genres is set. year is a year or an inclusive (from, to)
+        pair; ranges maps numeric columns to inclusive (low, high) bounds with
+        None for an open end. Results keep dataset order unless sort_by is given.
+        """
+        ranges = dict(ranges or {})
+        if year is not None:
+            ranges['year'] = (year, year) if np.isscalar(year) else tuple(year)
+
+        if self.store is not None:
+            return self.store.select(actors=_as_list(actor), directors=_as_list(director),
+                                     genres=_as_list(genres), all_genres=all_genres, ranges=ranges,
+                                     sort_by=sort_by, ascending=ascending, top_n=top_n,
+                                     columns=columns or self.COLUMNS)
+        positions = self.index.select(actors=_as_list(actor), directors=_as_list(director),
+                                      genres=_as_list(genres), all_genres=all_genres, ranges=ranges)
+        if sort_by is not None and top_n is not None and pd.api.types.is_numeric_dtype(self.df[sort_by]):
+            # Rank on the indexed values so only the top rows are materialized
+            result = self.df.iloc[self.index.top(positions, sort_by, top_n, ascending=ascending)]
+            return result if columns is None else result[columns]
+
+        result = self.df.iloc[positions]
+        if sort_by is not None:
+            # Non-numeric column (nlargest cannot rank strings): ties keep dataset order and
+            # missing values come last, like the SQLite store's ORDER BY
+            result = result.sort_values(sort_by, ascending=ascending, kind='stable')
+        if top_n is not None:
+            result = result.head(top_n)
+        return result if columns is None else result[columns]
 
     def get_ranked_movies(self, metric, ascending=False, top_n=5, filter_condition=None):
-        data = self.df.copy()
-        if filter_condition is not None:
-            data = data[filter_condition]
-        
-        data = data.sort_values(by=metric, ascending=ascending).reset_index(drop=True)
-        data['rank'] = data[metric].rank(method='min', ascending=ascending).astype('Int64')
-        return data[['id', 'title', metric, 'rank']].head(top_n)
+        return self.results.engine().ranked(metric, top_n, ascending, filter_condition)
 
     def generate_report(self, output_path=None, verbose=True):
         if verbose:
             logger.info("Computing KPI analysis...")
-        lines = ["--- KPI Analysis ---"]
-        
-        kpis = [
-            ("Highest Revenue", 'revenue_musd', False, None),
-            ("Highest Budget", 'budget_musd', False, None),
-            ("Highest Profit", 'profit_musd', False, None),
-            ("Lowest Profit", 'profit_musd', True, None),
-            ("Highest ROI (Budget >= 10M)", 'roi', False, self.df['budget_musd'] >= 10),
-            ("Lowest ROI (Budget >= 10M)", 'roi', True, self.df['budget_musd'] >= 10),
-            ("Most Voted", 'vote_count', False, None),
-            ("Highest Rated (Votes >= 10)", 'vote_average', False, self.df['vote_count'] >= 10),
-        ]
-
-        for title, metric, asc, cond in kpis:
-            result_df = self.get_ranked_movies(metric, ascending=asc, top_n=5, filter_condition=cond)
-            msg_title = f"\n{title}:"
-            lines.append(msg_title)
-            
-            # Convert dataframe to string for file output
-            df_str = result_df.to_string(index=False)
-            lines.append(f"\n{df_str}")
-
-        # Add Custom Search Results
-        lines.append("\n\n--- Custom Search Results ---")
-        search_results = self.get_custom_search_results()
-        
-        lines.append("\n\nSearch 1: Bruce Willis in Science Fiction/Action movies:")
-        if not search_results['bruce_willis_scifi'].empty:
-            lines.append(search_results['bruce_willis_scifi'][['id', 'title', 'genres', 'vote_average']].to_string(index=False))
-        else:
-            lines.append("No results found.")
-        
-        lines.append("\n\nSearch 2: Uma Thurman with Quentin Tarantino:")
-        if not search_results['uma_thurman_tarantino'].empty:
-            lines.append(search_results['uma_thurman_tarantino'][['id', 'title', 'director', 'runtime']].to_string(index=False))
-        else:
-            lines.append("No results found.")
-
-        # Add Franchise vs Standalone Analysis
-        lines.append("\n\n--- Franchise vs Standalone Analysis ---")
-        franchise_comparison = self.analyze_franchise_vs_standalone()
-        lines.append(franchise_comparison.to_string())
-
-        # Add Top Directors
-        lines.append("\n\n--- Top 5 Directors by Total Revenue ---")
-        top_directors = self.get_top_directors()
-        lines.append(top_directors.to_string())
-
+        report = format_report(
+            self.results.ranked_kpis(k=5),
+            self.get_custom_search_results(),
+            self.analyze_franchise_vs_standalone(),
+            self.get_top_directors(),
+        )
         if output_path:
-            try:
-                with open(output_path, 'w', encoding='utf-8') as f:
-                    f.write('\n'.join(lines))
-                if verbose:
-                    logger.info(f"KPI Report saved to {output_path}")
-            except IOError as e:
-                if verbose:
-                    logger.error(f"Failed to write KPI report to {output_path}: {e}")
-
-        return '\n'.join(lines)
+            with section('write_report'):
+                write_report(report, output_path, verbose)
+        return report
 
     def get_custom_search_results(self):
         """Returns a dictionary of DataFrames for specific search queries."""
-        results = {}
-        
-        # Search 1
-        mask_genre = self.df['genres'].str.contains('Science Fiction', na=False) | self.df['genres'].str.contains('Action', na=False)
-        mask_actor = self.df['cast'].str.contains('Bruce Willis', na=False)
-        results['bruce_willis_scifi'] = self.df[mask_genre & mask_actor].sort_values('vote_average', ascending=False)
-
-        # Search 2
-        mask_actor_2 = self.df['cast'].str.contains('Uma Thurman', na=False)
-        mask_director = self.df['director'] == 'Quentin Tarantino'
-        results['uma_thurman_tarantino'] = self.df[mask_actor_2 & mask_director].sort_values('runtime', ascending=True)
-        
-        return results
+        return self.results.get('custom_searches', lambda: {
+            name: self.query(**search) for name, search in CUSTOM_SEARCHES.items()})
 
     def analyze_franchise_vs_standalone(self):
-        self.df['is_franchise'] = self.df['collection_name'].notna()
-        
-        comparison = self.df.groupby('is_franchise').agg({
-            'revenue_musd': 'mean',
-            'roi': 'median',
-            'budget_musd': 'mean',
-            'popularity': 'mean',
-            'vote_average': 'mean'
-        }).rename(index={True: 'Franchise', False: 'Standalone'})
-        
-        return comparison
+        return self.results.franchise_comparison()
 
     def get_top_directors(self):
-        director_stats = self.df.dropna(subset=['director']).groupby('director').agg({
-            'title': 'count',
-            'revenue_musd': 'sum',
-            'vote_average': 'mean'
-        }).rename(columns={'title': 'movie_count', 'revenue_musd': 'total_revenue', 'vote_average': 'mean_rating'})
-        
-        return director_stats.sort_values('total_revenue', ascending=False).head(5)
+        return self.results.top_directors(n=5)
 
     def run(self, report_path=None):
         logger.info("Starting analysis...")
-        self.generate_report(report_path)
-        self.get_custom_search_results()
-        self.analyze_franchise_vs_standalone()
-        self.get_top_directors()
+        # The report computes every analysis table; later callers reuse them from self.results
+        return self.generate_report(report_path)
@@ -0,0 +1,169 @@
+import os
+import json
+import time
+import hashlib
+import sqlite3
+import multiprocessing
+import logging
+from contextlib import contextmanager
+
+logger = logging.getLogger(__name__)
+
+class ResponseCache:
+    """
+    Persistent SQLite cache for TMDB responses, shared by all fetch workers.
+
+    Entries younger than ttl seconds are served without touching the network.
+    Older entries are revalidated with If-None-Match / If-Modified-Since when
+    the server sent an ETag or Last-Modified, and are evicted once older than
+    max_stale seconds or when the cache grows past max_bytes (least recently
+    used first, down to 90% of max_bytes). Counters live in shared memory so
+    process-pool workers report into the parent, like RateLimiter.
+
+    Stores add to a running byte total instead of summing the table, which
+    is re-summed every check_every stores to absorb replaced entries and
+    other writers. Hits are read-only unless the entry's access time is
+    more than touch_interval seconds old, so concurrent workers rarely
+    queue on SQLite's write lock; LRU order is kept to that granularity.
+    """
+
+    def __init__(self, path, ttl=24 * 3600, max_stale=30 * 24 * 3600, max_bytes=512 * 1024 * 1024,
+                 check_every=1000, touch_interval=3600):
+        self.path = path
+        self.ttl = ttl
+        self.max_stale = max_stale
+        self.max_bytes = max_bytes
+        self.check_every = check_every
+        self.touch_interval = touch_interval
+        self._lock = multiprocessing.Lock()
+        self._counters = {name: multiprocessing.Value('q', 0, lock=False)
+                          for name in ('hits', 'misses', 'stale', 'revalidated', 'stores', 'evictions')}
+        # Bytes stored as of the last size check plus those stored since, and the stores since
+        self._bytes = multiprocessing.Value('q', 0, lock=False)
+        self._unchecked = multiprocessing.Value('q', 0, lock=False)
+        os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+        with self._connect() as conn:
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("""
+                CREATE TABLE IF NOT EXISTS responses (
+                    key TEXT PRIMARY KEY,
+                    url TEXT NOT NULL,
+                    body TEXT NOT NULL,
+                    etag TEXT,
+                    last_modified TEXT,
+                    fetched_at REAL NOT NULL,
+                    accessed_at REAL NOT NULL,
+                    size INTEGER NOT NULL
+                )""")
+            conn.execute("CREATE INDEX IF NOT EXISTS idx_responses_accessed ON responses (accessed_at)")
+        self.purge_expired()
+        self.enforce_size_limit()
+
+    @contextmanager
+    def _connect(self):
+        # Short-lived connections: workers in other processes cannot share one
+        conn = sqlite3.connect(self.path, timeout=30)
+        try:
+            with conn:
+                yield conn
+        finally:
+            conn.close()
+
+    def _count(self, name, n=1):
+        with self._lock:
+            self._counters[name].value += n
+
+    @staticmethod
+    def make_key(url, params):
+        """Key on URL and request params; the API key is not part of the resource identity."""
+        relevant = sorted((k, str(v)) for k, v in params.items() if k != 'api_key')
+        return hashlib.sha256(json.dumps([url, relevant]).encode('utf-8')).hexdigest()
+
+    def get(self, key):
+        """Return the cached entry as a dict (with a 'fresh' flag) or None."""
+        with self._connect() as conn:
+            row = conn.execute(
+                "SELECT body, etag, last_modified, fetched_at, accessed_at FROM responses WHERE key = ?", (key,)
+            ).fetchone()
+            if row is None:
+                self._count('misses')
+                return None
+            now = time.time()
+            body, etag, last_modified, fetched_at, accessed_at = row
+            if now - accessed_at >= self.touch_interval:
+                conn.execute("UPDATE responses SET accessed_at = ? WHERE key = ?", (now, key))
+
+        fresh = now - fetched_at < self.ttl
+        self._count('hits' if fresh else 'stale')
+        return {'data': json.loads(body), 'etag': etag, 'last_modified': last_modified, 'fresh': fresh}
+
+    @staticmethod
+    def conditional_headers(entry):
+        headers = {}
+        if entry is not None:
+            if entry['etag']:
+                headers['If-None-Match'] = entry['etag']
+            if entry['last_modified']:
+                headers['If-Modified-Since'] = entry['last_modified']
+        return headers
+
+    def mark_revalidated(self, key):
+        """Record a 304 Not Modified: the stored body is fresh again."""
+        now = time.time()
+        with self._connect() as conn:
+            conn.execute("UPDATE responses SET fetched_at = ?, accessed_at = ? WHERE key = ?", (now, now, key))
+        self._count('revalidated')
+
+    def put(self, key, url, response):
+        body = response.text
+        now = time.time()
+        with self._connect() as conn:
+            conn.execute(
+                "INSERT OR REPLACE INTO responses VALUES (?, ?, ?, ?, ?, ?, ?, ?)",
+                (key, url, body, response.headers.get('ETag'), response.headers.get('Last-Modified'),
+                 now, now, len(body))
+            )
+        self._count('stores')
+        with self._lock:
+            self._bytes.value += len(body)
+            self._unchecked.value += 1
+            due = self._bytes.value > self.max_bytes or self._unchecked.value >= self.check_every
+        if due:
+            self.enforce_size_limit()
+
+    def enforce_size_limit(self):
+        """Re-sum the stored bytes and evict least recently used entries down to 90% of max_bytes if over."""
+        evicted = 0
+        with self._connect() as conn:
+            total = conn.execute("SELECT COALESCE(SUM(size), 0) FROM responses").fetchone()[0]
+            if total > self.max_bytes:
+                target = int(self.max_bytes * 0.9)
+                while total > target:
+                    # Oldest first, a page at a time from the accessed_at index
+                    victims = conn.execute("SELECT key, size FROM responses ORDER BY accessed_at LIMIT 500").fetchall()
+                    if not victims:
+                        break
+                    for key, size in victims:
+                        if total <= target:
+                            break
+                        conn.execute("DELETE FROM responses WHERE key = ?", (key,))
+                        total -= size
+                        evicted += 1
+        with self._lock:
+            self._bytes.value = total
+            self._unchecked.value = 0
+        if evicted:
+            self._count('evictions', evicted)
+
+    def purge_expired(self):
+        with self._connect() as conn:
+            cursor = conn.execute("DELETE FROM responses WHERE fetched_at < ?", (time.time() - self.max_stale,))
+        if cursor.rowcount:
+            self._count('evictions', cursor.rowcount)
+
+    def stats(self):
+        with self._lock:
+            counts = {name: value.value for name, value in self._counters.items()}
+        lookups = counts['hits'] + counts['stale'] + counts['misses']
+        counts['hit_rate'] = round((counts['hits'] + counts['revalidated']) / lookups, 3) if lookups else 0.0
+        return counts
@@ -1,19 +1,46 @@
 import pandas as pd
 import numpy as np
-from ast import literal_eval
+import json
 import os
+from ast import literal_eval
+import copy
 import logging
+from collections import deque
+from contextlib import nullcontext
+from concurrent.futures import ProcessPoolExecutor
+from .storage import (CLEANED_SCHEMA, ChunkedFrameWriter, apply_schema, compact_frame, iter_frames, load_frame,
+                      log_memory_report, memory_report, save_frame)
+from .profiling import section
+from .relations import (RelationWriter, build_relations, concat_relations, empty_relations,
+                        filter_relations, remove_relations, save_relations)
+from .sqlstore import MovieStoreWriter
 
 logger = logging.getLogger(__name__)
 
+def _clean_partition(cleaner, df, with_relations=False):
+    # Module-level so ProcessPoolExecutor can pickle it
+    return cleaner.clean(df, with_relations=with_relations)
+
+def _combine_partitions(parts):
+    """Concatenate cleaned partitions in order, restoring dtypes split by all-NaN partitions."""
+    df = pd.concat(parts)
+    mixed = [col for col in df.columns if len({str(p[col].dtype) for p in parts if len(p)}) > 1]
+    if mixed:
+        df[mixed] = df[mixed].infer_objects()
+    return df
+
 class DataCleaner:
-    def __init__(self):
-        pass
+    def __init__(self, compact=False, drop_raw_collection=False):
+        # Step progress level; chunked runs drop to DEBUG after the first chunk
+        self.log_level = logging.INFO
+        # run() returns the cleaned frame with compact in-memory dtypes
+        self.compact = compact
+        # collection_name already holds the collection; the raw dict string is optional
+        self.drop_raw_collection = drop_raw_collection
 
     def load_data(self, filepath):
-        if not os.path.exists(filepath):
-            raise FileNotFoundError(f"File not found: {filepath}")
-        return pd.read_csv(filepath)
+        # CSV or Parquet, by extension
+        return load_frame(filepath)
 
     def safe_parse(self, x):
         # If it's already a list or dict, return it directly
@@ -32,6 +59,14 @@ class DataCleaner:
             # Fallback if pd.isna fails on complex objects
             pass
 
+        # Raw files are written as JSON; legacy files hold Python reprs and
+        # fall through to the much slower literal_eval
+        if isinstance(x, str):
+            try:
+                return json.loads(x)
+            except ValueError:
+                pass
+
         try:
             return literal_eval(str(x))
         except (ValueError, SyntaxError, TypeError):
@@ -75,16 +110,32 @@ class DataCleaner:
 
     def drop_irrelevant_columns(self, df):
         """Step 1: Removal of irrelevant columns."""
-        logger.info("Dropping irrelevant columns...")
+        logger.log(self.log_level, "Dropping irrelevant columns...")
         irrelevant_cols = ['adult', 'imdb_id', 'original_title', 'video', 'homepage']
         initial_cols = len(df.columns)
         df = df.drop(columns=[c for c in irrelevant_cols if c in df.columns])
         logger.debug(f"Dropped {initial_cols - len(df.columns)} columns.")
         return df
 
+    def extract_relations(self, df):
+        """
+        Parse genres and credits into normalized movie_cast / movie_crew /
+        movie_genre / person / genre tables. Parsed values are written back so
+        the later steps do not parse them again.
+        """
+        logger.log(self.log_level, "Extracting cast, crew and genre relations...")
+        parsed = {}
+        for col in ['genres', 'credits']:
+            parsed[col] = df[col].map(self.safe_parse)
+            # Only replace cells that parsed to content, so missing values stay missing for dropna
+            has_content = parsed[col].map(lambda v: isinstance(v, (list, dict)) and len(v) > 0)
+            df[col] = parsed[col].where(has_content, df[col])
+        movie_ids = pd.to_numeric(df['id'], errors='coerce')
+        return build_relations(movie_ids, parsed['genres'], parsed['credits'])
+
     def flatten_json_columns(self, df):
         """Step 2: Parse and flatten JSON-like columns."""
-        logger.info("Flattening JSON columns...")
+        logger.log(self.log_level, "Flattening JSON columns...")
         # Collection
         df['collection_name'] = self.flatten_column(df, 'belongs_to_collection')
         
@@ -96,7 +147,7 @@ class DataCleaner:
 
     def convert_datatypes(self, df):
         """Step 3: Convert types and handle basic filtering."""
-        logger.info("Converting datatypes and filtering status...")
+        logger.log(self.log_level, "Converting datatypes and filtering status...")
         df['release_date'] = pd.to_datetime(df['release_date'], errors='coerce')
         
         if 'status' in df.columns:
@@ -105,7 +156,7 @@ class DataCleaner:
             df = df.drop(columns=['status'])
             dropped = initial_rows - len(df)
             if dropped > 0:
-                logger.info(f"Filtered out {dropped} non-released movies.")
+                logger.log(self.log_level, f"Filtered out {dropped} non-released movies.")
         
         numeric_cols = ['budget', 'id', 'popularity', 'revenue', 'vote_count', 'vote_average', 'runtime']
         for col in numeric_cols:
@@ -119,7 +170,7 @@ class DataCleaner:
 
     def calculate_financials(self, df):
         """Step 4: Calculate derived financial metrics."""
-        logger.info("Calculating financial metrics...")
+        logger.log(self.log_level, "Calculating financial metrics...")
         df['budget_musd'] = df['budget'] / 1e6
         df['revenue_musd'] = df['revenue'] / 1e6
         df['profit_musd'] = df['revenue_musd'] - df['budget_musd']
@@ -128,19 +179,21 @@ class DataCleaner:
 
     def process_credits(self, df):
         """Step 5: Extract Cast and Crew information."""
-        logger.info("Processing credits...")
-        cast_data = df['credits'].apply(self.parse_credits_cast)
-        df['cast'] = cast_data.apply(lambda x: "|".join(x[0]))
-        df['cast_size'] = cast_data.apply(lambda x: x[1])
+        logger.log(self.log_level, "Processing credits...")
+        # Parse the credits blob once; both extractors accept the parsed dict
+        credits = df['credits'].map(self.safe_parse)
+        cast_data = credits.map(self.parse_credits_cast)
+        df['cast'] = cast_data.map(lambda x: "|".join(x[0]))
+        df['cast_size'] = cast_data.map(lambda x: x[1])
         
-        crew_data = df['credits'].apply(self.parse_credits_director)
-        df['director'] = crew_data.apply(lambda x: x[0])
-        df['crew_size'] = crew_data.apply(lambda x: x[1])
+        crew_data = credits.map(self.parse_credits_director)
+        df['director'] = crew_data.map(lambda x: x[0])
+        df['crew_size'] = crew_data.map(lambda x: x[1])
         return df
 
     def handle_missing_and_duplicates(self, df):
         """Step 6: Handle missing text and remove duplicates."""
-        logger.info("Handling missing values and duplicates...")
+        logger.log(self.log_level, "Handling missing values and duplicates...")
         for col in ['overview', 'tagline']:
             df[col] = df[col].replace(['No Data', ''], np.nan)
         
@@ -150,12 +203,12 @@ class DataCleaner:
         df = df.dropna(thresh=10)
         dropped = initial_rows - len(df)
         if dropped > 0:
-            logger.info(f"Dropped {dropped} rows due to missing critical data.")
+            logger.log(self.log_level, f"Dropped {dropped} rows due to missing critical data.")
         return df
 
     def finalize_schema(self, df):
         """Step 7: Reorder columns to final schema."""
-        logger.info("Finalizing schema...")
+        logger.log(self.log_level, "Finalizing schema...")
         target_order = [
             'id', 'title', 'tagline', 'release_date', 'genres', 'belongs_to_collection',
             'original_language', 'budget_musd', 'revenue_musd', 'production_companies',
@@ -164,6 +217,9 @@ class DataCleaner:
             'cast_size', 'director', 'crew_size', 'profit_musd', 'roi', 'collection_name'
         ]
         
+        if self.drop_raw_collection:
+            target_order.remove('belongs_to_collection')
+
         for col in target_order:
             if col not in df.columns:
                 df[col] = np.nan
@@ -171,23 +227,188 @@ class DataCleaner:
         # Ensure we return a dataframe with only the target columns
         return df[target_order]
 
-    def clean(self, df):
-        """Orchestrate the full cleaning pipeline."""
-        logger.info(f"Starting full data cleaning pipeline on {len(df)} records...")
-        df = self.drop_irrelevant_columns(df)
-        df = self.flatten_json_columns(df)
-        df = self.convert_datatypes(df)
-        df = self.calculate_financials(df)
-        df = self.process_credits(df)
-        df = self.handle_missing_and_duplicates(df)
-        df = self.finalize_schema(df)
-        logger.info(f"Cleaning complete. Final dataset has {len(df)} records.")
+    def optimize_dtypes(self, df):
+        """Step 8 (optional): Categoricals, Arrow strings and downcast integers, see COMPACT_SCHEMA."""
+        logger.log(self.log_level, "Compacting dtypes...")
+        compact = compact_frame(df)
+        log_memory_report(memory_report(df, compact), 'cleaned frame')
+        return compact
+
+    def _step(self, step, df):
+        """Run one cleaning step, recording its time, memory and rows in and out."""
+        with section(step.__name__, rows_in=len(df)) as counts:
+            df = step(df)
+            counts['rows_out'] = len(df)
+        return df
+
+    def clean(self, df, with_relations=False):
+        """
+        Orchestrate the full cleaning pipeline. With with_relations=True,
+        returns (df, relations) where relations holds the normalized tables
+        for the movies that survived cleaning.
+        """
+        logger.log(self.log_level, f"Starting full data cleaning pipeline on {len(df)} records...")
+        df = self._step(self.drop_irrelevant_columns, df)
+        relations = None
+        if with_relations:
+            with section('extract_relations', rows_in=len(df)) as counts:
+                relations = self.extract_relations(df)
+                counts['rows_out'] = len(df)
+        df = self._step(self.flatten_json_columns, df)
+        df = self._step(self.convert_datatypes, df)
+        df = self._step(self.calculate_financials, df)
+        df = self._step(self.process_credits, df)
+        df = self._step(self.handle_missing_and_duplicates, df)
+        df = self._step(self.finalize_schema, df)
+        logger.log(self.log_level, f"Cleaning complete. Final dataset has {len(df)} records.")
+        if with_relations:
+            return df, filter_relations(relations, df['id'])
         return df
 
-    def run(self, input_path, output_path):
-        df = self.load_data(input_path)
-        df_cleaned = self.clean(df)
-        os.makedirs(os.path.dirname(output_path), exist_ok=True)
-        df_cleaned.to_csv(output_path, index=False)
+    def _quiet_copy(self):
+        """Copy of this cleaner for worker processes, logging its steps at DEBUG."""
+        worker = copy.copy(self)
+        worker.log_level = logging.DEBUG
+        return worker
+
+    def clean_parallel(self, df, workers=None, partitions=None, with_relations=False):
+        """
+        Run clean() on contiguous row partitions in a process pool. Partitions
+        are reassembled in input order with their original index, so the
+        result is identical to the serial clean(df).
+        """
+        workers = workers or os.cpu_count() or 1
+        partitions = partitions or workers * 4
+        logger.info(f"Starting parallel data cleaning on {len(df)} records ({workers} workers, {partitions} partitions)...")
+        bounds = np.linspace(0, len(df), min(partitions, max(len(df), 1)) + 1).astype(int)
+        parts = [df.iloc[start:stop] for start, stop in zip(bounds[:-1], bounds[1:])]
+
+        worker = self._quiet_copy()
+        with ProcessPoolExecutor(max_workers=workers) as executor:
+            cleaned = list(executor.map(_clean_partition, [worker] * len(parts), parts,
+                                        [with_relations] * len(parts)))
+        if with_relations:
+            df = _combine_partitions([part for part, _ in cleaned])
+            relations = concat_relations([rel for _, rel in cleaned])
+        else:
+            df = _combine_partitions(cleaned)
+        logger.info(f"Cleaning complete. Final dataset has {len(df)} records.")
+        return (df, relations) if with_relations else df
+
+    def _iter_cleaned(self, chunks, workers=None, with_relations=False):
+        """Yield clean(chunk) for each chunk in order, optionally on a process pool."""
+        if not workers or workers <= 1:
+            for i, chunk in enumerate(chunks):
+                self.log_level = logging.INFO if i == 0 else logging.DEBUG
+                yield self.clean(chunk, with_relations=with_relations)
+            self.log_level = logging.INFO
+            return
+
+        worker = self._quiet_copy()
+        pending = deque()
+        with ProcessPoolExecutor(max_workers=workers) as executor:
+            for chunk in chunks:
+                pending.append(executor.submit(_clean_partition, worker, chunk, with_relations))
+                # Bound the batches held in memory to two per worker
+                if len(pending) >= 2 * workers:
+                    yield pending.popleft().result()
+            while pending:
+                yield pending.popleft().result()
+
+    def run_chunked(self, input_path, output_path, chunk_size=50000, workers=None, with_relations=False,
+                    store_path=None):
+        """
+        Stream the raw file through clean() in batches of chunk_size rows and
+        append each cleaned batch to output_path, keeping memory bounded by the
+        batch size. Every cleaning step is row-wise, so the result matches the
+        in-memory run. With workers > 1, batches are cleaned in a process pool
+        and still written in input order. Relation tables, when requested, are
+        appended next to output_path the same way, and every batch also goes
+        to the SQLite store at store_path, if given. Returns output_path.
+        """
+        logger.info(f"Starting chunked data cleaning of {input_path} in batches of {chunk_size} rows...")
+        rows_in = 0
+
+        def counted(chunks):
+            nonlocal rows_in
+            for chunk in chunks:
+                rows_in += len(chunk)
+                yield chunk
+
+        relation_writer = RelationWriter(output_path) if with_relations else None
+        if not with_relations:
+            remove_relations(output_path)
+        # The store holds the relation tables too, so they are built for it either way
+        need_relations = with_relations or store_path is not None
+        try:
+            with ChunkedFrameWriter(output_path) as writer, \
+                    MovieStoreWriter(store_path) if store_path else nullcontext() as store:
+                cleaned_chunks = self._iter_cleaned(counted(iter_frames(input_path, chunk_size)), workers, need_relations)
+                for i, cleaned in enumerate(cleaned_chunks):
+                    relations = None
+                    if need_relations:
+                        cleaned, relations = cleaned
+                    if with_relations:
+                        relation_writer.write(relations)
+                    cleaned = apply_schema(cleaned, CLEANED_SCHEMA)
+                    writer.write(cleaned)
+                    if store is not None:
+                        store.write(cleaned, relations)
+                    logger.info(f"Cleaned chunk {i + 1}: {rows_in} rows read, {writer.rows} rows written.")
+                if writer.rows == 0:
+                    writer.write(apply_schema(pd.DataFrame(columns=list(CLEANED_SCHEMA)), CLEANED_SCHEMA))
+                    if with_relations:
+                        relation_writer.write(empty_relations())
+        finally:
+            if relation_writer is not None:
+                relation_writer.close()
+        logger.info(f"Cleaning complete. {rows_in} raw records -> {writer.rows} cleaned records saved to {output_path}")
+        return output_path
+
+    def run(self, input_path, output_path, chunk_size=None, workers=None, with_relations=False, store_path=None):
+        """
+        Clean input_path into output_path. With with_relations=True, the
+        normalized cast/crew/genre tables are saved next to output_path. With
+        store_path, the cleaned movies and those tables are also written to
+        an indexed SQLite store there (see MovieAnalyzer.from_store).
+        With chunk_size, the batches are streamed to disk and output_path is
+        returned instead of a frame, so compact does not apply.
+        """
+        if chunk_size:
+            if self.compact:
+                raise ValueError("compact=True shapes the returned frame; a chunked run returns no frame. "
+                                 "Load output_path with compact dtypes instead (e.g. MovieAnalyzer.from_path(..., compact=True)).")
+            return self.run_chunked(input_path, output_path, chunk_size, workers, with_relations, store_path)
+
+        with section('load') as counts:
+            df = self.load_data(input_path)
+            counts['rows_out'] = len(df)
+        need_relations = with_relations or store_path is not None
+        if workers and workers > 1:
+            result = self.clean_parallel(df, workers, with_relations=need_relations)
+        else:
+            result = self.clean(df, with_relations=need_relations)
+        if need_relations:
+            df_cleaned, relations = result
+        else:
+            df_cleaned = result
+        if self.compact:
+            df_cleaned = self._step(self.optimize_dtypes, df_cleaned)
+        with section('save', rows_in=len(df_cleaned)):
+            if with_relations:
+                save_relations(relations, output_path)
+            else:
+                remove_relations(output_path)
+            if self.compact:
+                # The file keeps the cleaned schema; only the returned frame is compact
+                save_frame(df_cleaned, output_path, schema=CLEANED_SCHEMA)
+            else:
+                df_cleaned = apply_schema(df_cleaned, CLEANED_SCHEMA)
+                save_frame(df_cleaned, output_path)
+        if store_path:
+            with section('save_store', rows_in=len(df_cleaned)):
+                with MovieStoreWriter(store_path) as store:
+                    store.write(apply_schema(df_cleaned.copy(), CLEANED_SCHEMA) if self.compact else df_cleaned,
+                                relations)
         logger.info(f"Cleaned data saved to {output_path}")
         return df_cleaned
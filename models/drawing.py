@@ -0,0 +1,121 @@
+import time
+import logging
+import numpy as np
+import seaborn as sns
+from matplotlib.colors import LogNorm
+from matplotlib.figure import Figure
+from matplotlib.backends.backend_agg import FigureCanvasAgg
+
+# Suppress matplotlib category info logs when plotting numeric-like strings
+logging.getLogger('matplotlib.category').setLevel(logging.WARNING)
+
+def _figure(figsize):
+    # An explicit Agg figure: no pyplot global state, safe to draw in worker processes
+    fig = Figure(figsize=figsize)
+    FigureCanvasAgg(fig)
+    return fig, fig.add_subplot()
+
+def _draw_density(fig, ax, data):
+    """Pre-binned 2D histogram of a large scatter, log-scaled so sparse regions stay visible."""
+    counts = np.ma.masked_equal(data['counts'].T, 0)
+    mesh = ax.pcolormesh(data['x_edges'], data['y_edges'], counts, norm=LogNorm(), cmap='viridis')
+    fig.colorbar(mesh, ax=ax, label='Movies')
+    _annotate_rows(ax, f"{data['rows']:,} movies binned")
+
+def _annotate_rows(ax, text):
+    ax.text(0.99, 0.01, text, transform=ax.transAxes, ha='right', va='bottom', fontsize=8, alpha=0.7)
+
+def _draw_scatter(fig, ax, data, x, y, **kwargs):
+    if isinstance(data, dict):
+        _draw_density(fig, ax, data)
+        return
+    sns.scatterplot(data=data, x=x, y=y, alpha=0.6, ax=ax, **kwargs)
+    if 'total_rows' in data.attrs:
+        _annotate_rows(ax, f"{len(data):,} of {data.attrs['total_rows']:,} movies shown (outliers kept)")
+
+def _draw_revenue_vs_budget(data):
+    fig, ax = _figure((10, 6))
+    _draw_scatter(fig, ax, data, 'budget_musd', 'revenue_musd', hue='primary_genre', legend=False)
+    ax.set_title('Revenue vs. Budget Trends')
+    ax.set_xlabel('Budget (Million USD)')
+    ax.set_ylabel('Revenue (Million USD)')
+    ax.grid(True, alpha=0.3)
+    return fig
+
+def _draw_roi_distribution(data):
+    fig, ax = _figure((12, 6))
+    sns.boxplot(data=data, x='primary_genre', y='roi', ax=ax)
+    ax.set_title('ROI Distribution by Top 10 Genres')
+    ax.tick_params(axis='x', labelrotation=45)
+    ax.set_ylim(-1, 10)
+    return fig
+
+def _draw_popularity_vs_rating(data):
+    fig, ax = _figure((10, 6))
+    _draw_scatter(fig, ax, data, 'vote_average', 'popularity')
+    ax.set_title('Popularity vs. Rating')
+    ax.set_xlabel('Vote Average')
+    ax.set_ylabel('Popularity')
+    ax.grid(True, alpha=0.3)
+    return fig
+
+def _draw_yearly_trends(data):
+    fig, ax = _figure((12, 6))
+    sns.lineplot(data=data, x='year', y='revenue_musd', marker='o', ax=ax)
+    ax.set_title('Yearly Trends in Box Office Revenue')
+    ax.set_xlabel('Year')
+    ax.set_ylabel('Total Revenue (Million USD)')
+    ax.grid(True, alpha=0.3)
+    return fig
+
+def _draw_franchise_comparison(data):
+    fig, ax = _figure((8, 6))
+    sns.barplot(data=data, x='Type', y='revenue_musd', hue='Type', palette='viridis', legend=False, ax=ax)
+    ax.set_title('Average Revenue: Franchise vs Standalone')
+    ax.set_ylabel('Average Revenue (Million USD)')
+    ax.set_xlabel('')
+    return fig
+
+def _draw_roi_by_genre(data):
+    fig, ax = _figure((12, 6))
+    # Using seaborn barplot for consistent coloring
+    sns.barplot(x=data['mean_roi'], y=data['genres'], color='#eb5d19', orient='h', ax=ax)
+
+    for container in ax.containers:
+        ax.bar_label(container, fmt='%.2f', padding=3, rotation=0, fontsize=9)
+
+    ax.set_title('Total ROI by Genre', fontsize=30, pad=20)
+    ax.set_xlabel('Mean ROI')
+    fig.tight_layout()
+    return fig
+
+def _draw_revenue_vs_budget_yearly(data):
+    fig, ax = _figure((12, 6))
+    sns.barplot(data=data, x='year', y='Amount', hue='Type', palette=['#eb5d19', 'darkgray'], ax=ax)
+
+    for container in ax.containers:
+        ax.bar_label(container, fmt='%.1f', padding=3, rotation=0, fontsize=9)
+
+    ax.set_title('Revenue vs Budget Over Years', fontsize=30, pad=20)
+    ax.set_xlabel('Year')
+    ax.set_ylabel('Amount (Million USD)')
+    ax.legend(title='Type')
+    fig.tight_layout()
+    return fig
+
+DRAWERS = {
+    'revenue_vs_budget': _draw_revenue_vs_budget,
+    'roi_distribution': _draw_roi_distribution,
+    'popularity_vs_rating': _draw_popularity_vs_rating,
+    'yearly_trends': _draw_yearly_trends,
+    'franchise_comparison': _draw_franchise_comparison,
+    'roi_by_genre': _draw_roi_by_genre,
+    'revenue_vs_budget_yearly': _draw_revenue_vs_budget_yearly,
+}
+
+def render_plot(name, data, path, dpi=300, fmt='png'):
+    """Draw one plot from its prepared data and save it; returns (path, seconds). Runs in pool workers."""
+    start = time.perf_counter()
+    fig = DRAWERS[name](data)
+    fig.savefig(path, dpi=dpi, bbox_inches='tight', format=fmt)
+    return path, time.perf_counter() - start
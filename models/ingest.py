@@ -0,0 +1,148 @@
+import os
+import gzip
+import shutil
+import json
+import pandas as pd
+import logging
+from .sink import IdBitmap, JsonlSink
+from .storage import RAW_SCHEMA, ChunkedFrameWriter, apply_schema, iter_frames
+from .profiling import section
+
+logger = logging.getLogger(__name__)
+
+def iter_export_ids(path):
+    """
+    Stream the movie IDs of a TMDB daily ID export (movie_ids_MM_DD_YYYY.json.gz:
+    gzipped JSON lines like {"adult":false,"id":3924,"original_title":...}),
+    one line at a time. Lines without a positive integer id are skipped.
+    """
+    skipped = 0
+    with gzip.open(path, 'rt', encoding='utf-8') as f:
+        for line in f:
+            if not line.strip():
+                continue
+            try:
+                movie_id = json.loads(line)['id']
+            except (ValueError, KeyError, TypeError):
+                skipped += 1
+                continue
+            if isinstance(movie_id, int) and movie_id > 0:
+                yield movie_id
+            else:
+                skipped += 1
+    if skipped:
+        logger.warning(f"Skipped {skipped} malformed lines in {path}")
+
+def shard_of(movie_id, shards):
+    """The shard an ID belongs to; the same on every machine and for every export."""
+    return movie_id % shards
+
+def shard_ids(export_path, shard=0, shards=1, known=None):
+    """The IDs of one shard in export order, without IDs in known or repeated in the export."""
+    queued = IdBitmap()
+    for movie_id in iter_export_ids(export_path):
+        if shard_of(movie_id, shards) != shard or movie_id in queued or (known is not None and movie_id in known):
+            continue
+        queued.add(movie_id)
+        yield movie_id
+
+def shard_path(output_path, shard, shards):
+    """Output of one shard, next to output_path: movies_data.shard-002-of-004.csv."""
+    root, ext = os.path.splitext(output_path)
+    return f"{root}.shard-{shard:03d}-of-{shards:03d}{ext}"
+
+def _parts_dir(path):
+    return os.path.splitext(path)[0] + '_parts'
+
+def _batches(ids, size):
+    batch = []
+    for movie_id in ids:
+        batch.append(movie_id)
+        if len(batch) >= size:
+            yield batch
+            batch = []
+    if batch:
+        yield batch
+
+def ingest_shard(extractor, export_path, output_path, shard=0, shards=1, known_paths=(), batch_size=10000,
+                 mode='thread', max_workers=10, chunk_size=1000, retry_failed=False):
+    """
+    Fetch one shard of an ID export with extractor.fetch_all_movies and
+    export it to shard_path(output_path, shard, shards). IDs already in
+    known_paths (e.g. the current raw file) are skipped. The export is
+    streamed and fetched batch_size IDs at a time into a checkpointed
+    JsonlSink, so memory does not grow with the export, and a rerun
+    only fetches the IDs its checkpoint does not have yet (failed IDs too
+    with retry_failed). The sink is kept until clear_shards() runs after
+    the merge. Returns the shard's output path, or None if it has no rows.
+    """
+    path = shard_path(output_path, shard, shards)
+    known = IdBitmap.from_files(known_paths)
+    logger.info(f"Ingesting shard {shard} of {shards} from {export_path} ({len(known)} IDs already extracted)")
+    queued = 0
+    with JsonlSink(_parts_dir(path), chunk_size=chunk_size) as sink:
+        for batch in _batches(shard_ids(export_path, shard, shards, known), batch_size):
+            queued += len(batch)
+            pending = sink.pending(batch, retry_failed=retry_failed)
+            if pending:
+                with section('fetch', rows_in=len(pending)):
+                    extractor.fetch_all_movies(pending, max_workers=max_workers, mode=mode, sink=sink)
+            logger.info(f"Shard {shard}: {queued} IDs queued, {len(sink.completed)} fetched, "
+                        f"{len(sink.failed)} failed")
+
+    with section('export') as exported:
+        rows = sink.export(path)
+        exported['rows_out'] = rows
+    if not rows:
+        logger.warning(f"Shard {shard} of {shards} fetched no movies.")
+        return None
+    logger.info(f"Shard {shard} of {shards} saved to {path} ({rows} records)")
+    return path
+
+def _columns(path):
+    first = next(iter_frames(path, 1), None)
+    return [] if first is None else list(first.columns)
+
+def merge_shards(output_path, shards, extra_paths=(), chunk_size=50000):
+    """
+    Merge the outputs of shards 0..shards-1 into output_path, after
+    extra_paths (e.g. the existing raw file), chunk by chunk. Rows whose ID
+    was already written are dropped, and every chunk gets the union of the
+    inputs' columns. output_path may be one of extra_paths: the result is
+    written next to it and then moved into place. Returns the row count.
+    """
+    paths = list(extra_paths) + [shard_path(output_path, shard, shards) for shard in range(shards)]
+    missing = [path for path in paths[len(extra_paths):] if not os.path.exists(path)]
+    if missing:
+        raise FileNotFoundError(f"Missing shard outputs: {', '.join(missing)}")
+    paths = [path for path in paths if os.path.exists(path)]
+    columns = list(dict.fromkeys(col for path in paths for col in _columns(path)))
+
+    root, ext = os.path.splitext(output_path)
+    tmp_path = f"{root}.merging{ext}"
+    written = IdBitmap()
+    with ChunkedFrameWriter(tmp_path) as writer:
+        for path in paths:
+            for chunk in iter_frames(path, chunk_size):
+                ids = pd.to_numeric(chunk['id'], errors='coerce')
+                keep = ids.notna().to_numpy() & ~ids.fillna(0).astype('int64').map(written.__contains__).to_numpy()
+                # The first occurrence of an ID wins, also within a chunk
+                keep &= ~ids.duplicated().to_numpy()
+                chunk = chunk[keep]
+                written.update(ids[keep].astype('int64').to_numpy())
+                writer.write(apply_schema(chunk.reindex(columns=columns), RAW_SCHEMA, others='string'))
+    os.replace(tmp_path, output_path)
+    logger.info(f"Merged {len(paths)} files into {output_path} ({writer.rows} records)")
+    return writer.rows
+
+def clear_shards(output_path, shards):
+    """
+    Delete the shard outputs and their checkpointed sinks once merged, so
+    the next export starts from an empty sink instead of re-exporting and
+    re-merging every movie fetched before; the raw file dedupes those.
+    """
+    for shard in range(shards):
+        path = shard_path(output_path, shard, shards)
+        if os.path.exists(path):
+            os.remove(path)
+        shutil.rmtree(_parts_dir(path), ignore_errors=True)
@@ -0,0 +1,92 @@
+import numpy as np
+import pandas as pd
+import logging
+
+logger = logging.getLogger(__name__)
+
+# (title, metric, ascending, condition); a condition keeps rows with column >= minimum
+RANKED_KPIS = [
+    ("Highest Revenue", 'revenue_musd', False, None),
+    ("Highest Budget", 'budget_musd', False, None),
+    ("Highest Profit", 'profit_musd', False, None),
+    ("Lowest Profit", 'profit_musd', True, None),
+    ("Highest ROI (Budget >= 10M)", 'roi', False, ('budget_musd', 10)),
+    ("Lowest ROI (Budget >= 10M)", 'roi', True, ('budget_musd', 10)),
+    ("Most Voted", 'vote_count', False, None),
+    ("Highest Rated (Votes >= 10)", 'vote_average', False, ('vote_count', 10)),
+]
+
+class TopKEngine:
+    """
+    Ranked KPIs by partial selection instead of a copy, full sort and full
+    rank per KPI. Each metric column is read into one float array and each
+    filter mask is computed once, then shared by every KPI that uses them.
+
+    Ties are deliberately ordered by row position (like the SQLite store's
+    rowid tie-break) and share the lowest rank; rows with a missing metric
+    come last with no rank. This matches sort_values(kind='stable') +
+    rank(method='min') + head(k), not the default quicksort, whose tie order
+    is unspecified.
+    """
+
+    def __init__(self, df):
+        self.df = df
+        self._values = {}
+        self._masks = {}
+
+    def values(self, column):
+        if column not in self._values:
+            self._values[column] = pd.to_numeric(self.df[column], errors='coerce').to_numpy(dtype='float64', na_value=np.nan)
+        return self._values[column]
+
+    def mask(self, condition):
+        """Boolean row mask for None, a (column, minimum) pair or a boolean Series/array."""
+        if condition is None:
+            return None
+        if isinstance(condition, tuple):
+            if condition not in self._masks:
+                column, minimum = condition
+                # NaN compares False, like the boolean filter it replaces
+                self._masks[condition] = self.values(column) >= minimum
+            return self._masks[condition]
+        if isinstance(condition, pd.Series):
+            return condition.to_numpy(dtype=bool, na_value=False)
+        return np.asarray(condition, dtype=bool)
+
+    def top_k(self, metric, k, ascending=False, condition=None):
+        """Row positions of the k best rows and their min-method ranks (NaN for missing metrics)."""
+        values = self.values(metric)
+        keys = values if ascending else -values
+        mask = self.mask(condition)
+        missing = np.isnan(keys)
+        candidates = np.flatnonzero(~missing if mask is None else mask & ~missing)
+
+        if len(candidates) > k:
+            candidate_keys = keys[candidates]
+            kth = np.partition(candidate_keys, k - 1)[k - 1]
+            # Everything strictly better than the k-th key, then its ties in row order
+            better = candidates[candidate_keys < kth]
+            tied = candidates[candidate_keys == kth][:k - len(better)]
+            candidates = np.concatenate([better, tied])
+        positions = candidates[np.lexsort((candidates, keys[candidates]))]
+
+        sorted_keys = keys[positions]
+        ranks = (np.searchsorted(sorted_keys, sorted_keys, side='left') + 1).astype('float64')
+
+        if len(positions) < k:
+            # sort_values puts missing metrics last, in row order, and rank leaves them blank
+            nan_rows = np.flatnonzero(missing if mask is None else mask & missing)[:k - len(positions)]
+            positions = np.concatenate([positions, nan_rows])
+            ranks = np.concatenate([ranks, np.full(len(nan_rows), np.nan)])
+        return positions, ranks
+
+    def ranked(self, metric, k=5, ascending=False, condition=None):
+        """The id/title/metric/rank frame for one KPI."""
+        positions, ranks = self.top_k(metric, k, ascending, condition)
+        result = self.df[['id', 'title', metric]].iloc[positions].reset_index(drop=True)
+        result['rank'] = pd.array(ranks, dtype='Float64').astype('Int64')
+        return result
+
+    def compute(self, kpis=RANKED_KPIS, k=5):
+        """[(title, frame)] for every ranked KPI."""
+        return [(title, self.ranked(metric, k, asc, cond)) for title, metric, asc, cond in kpis]
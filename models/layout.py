@@ -0,0 +1,53 @@
+import os
+import hashlib
+
+# File formats, names and choices that main.py needs before any stage runs.
+# Standard library only: importing this must not load pandas or numpy.
+
+FORMATS = ('csv', 'parquet')
+
+PLOT_FORMATS = ('png', 'svg')
+
+# How scatter plots handle more rows than scatter_threshold
+SCATTER_MODES = ('sample', 'density')
+
+# Plot name -> output file (the extension follows the plot's format)
+PLOTS = {
+    'revenue_vs_budget': "Revenue_vs_Budget.png",
+    'roi_distribution': "ROI_Distribution_by_Genre.png",
+    'popularity_vs_rating': "Popularity_vs_Rating.png",
+    'yearly_trends': "Yearly_Box_Office_Trends.png",
+    'franchise_comparison': "Franchise_vs_Standalone.png",
+    'roi_by_genre': "ROI_by_Genre.png",
+    'revenue_vs_budget_yearly': "Revenue_vs_Budget_Yearly.png",
+}
+
+# Normalized tables emitted next to the cleaned dataset; IDs are TMDB's integer IDs
+RELATION_SCHEMAS = {
+    'movie_cast': {'movie_id': 'Int64', 'person_id': 'Int64', 'cast_order': 'Int64', 'character': 'string'},
+    'movie_crew': {'movie_id': 'Int64', 'person_id': 'Int64', 'department': 'string', 'job': 'string'},
+    'movie_genre': {'movie_id': 'Int64', 'genre_id': 'Int64'},
+    'person': {'person_id': 'Int64', 'name': 'string'},
+    'genre': {'genre_id': 'Int64', 'name': 'string'},
+}
+
+def with_format(path, fmt):
+    """Swap the extension of path for the given storage format."""
+    return f"{os.path.splitext(path)[0]}.{fmt}"
+
+def file_digest(path, block_size=1 << 20):
+    """SHA-256 of a file's bytes, read in blocks; identifies a dataset version without parsing it."""
+    digest = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for block in iter(lambda: f.read(block_size), b''):
+            digest.update(block)
+    return digest.hexdigest()
+
+def relation_path(cleaned_path, table):
+    """
+    Relation tables live next to the cleaned dataset, in the same format and
+    named after it (movies_data_cleaned.movie_cast.csv), so datasets sharing
+    a directory keep their own tables.
+    """
+    stem, ext = os.path.splitext(cleaned_path)
+    return f"{stem}.{table}{ext}"
@@ -0,0 +1,106 @@
+import os
+import ast
+import json
+import hashlib
+import importlib.util
+import logging
+from .layout import file_digest
+
+logger = logging.getLogger(__name__)
+
+class StageManifest:
+    """
+    Records, per pipeline stage, a content hash of its inputs (files and
+    parameters), of the source code that implements it and of every output
+    file. A stage is current, and can be skipped, when all three still
+    match; downstream stages list upstream outputs among their inputs, so a
+    changed output re-runs exactly the stages that depend on it.
+    """
+
+    def __init__(self, path, root=None):
+        self.path = path
+        self.root = root or os.path.dirname(os.path.abspath(path))
+        self.stages = {}
+        if os.path.exists(path):
+            try:
+                with open(path, encoding='utf-8') as f:
+                    self.stages = json.load(f)
+            except ValueError:
+                logger.warning(f"Ignoring unreadable stage manifest {path}; every stage will run.")
+
+    def _key(self, path):
+        return os.path.relpath(os.path.abspath(path), self.root)
+
+    def _files(self, paths):
+        return {self._key(p): file_digest(p) if os.path.exists(p) else None for p in paths}
+
+    def inputs_digest(self, files=(), params=None):
+        payload = {'files': self._files(files), 'params': params or {}}
+        return hashlib.sha256(json.dumps(payload, sort_keys=True, default=str).encode('utf-8')).hexdigest()
+
+    @staticmethod
+    def module_sources(names):
+        """
+        Source files of the named modules and of every module they import
+        from their own package (relative imports, followed transitively),
+        found by parsing the source rather than importing it.
+        """
+        sources = {}
+        pending = list(names)
+        while pending:
+            name = pending.pop()
+            if name in sources:
+                continue
+            sources[name] = importlib.util.find_spec(name).origin
+            package = name.rpartition('.')[0]
+            with open(sources[name], encoding='utf-8') as f:
+                tree = ast.parse(f.read())
+            for node in ast.walk(tree):
+                if isinstance(node, ast.ImportFrom) and node.level == 1:
+                    if node.module:
+                        pending.append(f"{package}.{node.module}")
+                    else:
+                        pending.extend(f"{package}.{alias.name}" for alias in node.names)
+        return sources
+
+    @classmethod
+    def code_digest(cls, modules):
+        """
+        Hash of the source files of the given modules (module objects, or
+        dotted names, which are not imported and include their package imports).
+        """
+        sources = cls.module_sources([module for module in modules if isinstance(module, str)])
+        for module in modules:
+            if not isinstance(module, str):
+                sources[module.__name__] = module.__file__
+        digest = hashlib.sha256()
+        for name in sorted(sources):
+            digest.update(name.encode('utf-8'))
+            digest.update(file_digest(sources[name]).encode('utf-8'))
+        return digest.hexdigest()
+
+    def is_current(self, stage, inputs, code):
+        entry = self.stages.get(stage)
+        if entry is None or entry['inputs'] != inputs or entry['code'] != code:
+            return False
+        # Outputs deleted or edited since the last run make the stage stale too
+        return all(os.path.exists(os.path.join(self.root, p)) and file_digest(os.path.join(self.root, p)) == d
+                   for p, d in entry['outputs'].items())
+
+    def record(self, stage, inputs, code, outputs):
+        self.stages[stage] = {'inputs': inputs, 'code': code, 'outputs': self._files(outputs)}
+        os.makedirs(os.path.dirname(os.path.abspath(self.path)), exist_ok=True)
+        with open(f"{self.path}.tmp", 'w', encoding='utf-8') as f:
+            json.dump(self.stages, f, indent=2, sort_keys=True)
+        os.replace(f"{self.path}.tmp", self.path)
+
+    def run(self, stage, func, files=(), params=None, code=(), outputs=(), force=False):
+        """Run func() unless the stage is current (or forced), then record its new state. Returns True if it ran."""
+        inputs = self.inputs_digest(files, params)
+        code = self.code_digest(code)
+        if not force and self.is_current(stage, inputs, code):
+            logger.info(f"Stage '{stage}' is up to date; skipping.")
+            return False
+        func()
+        self.record(stage, inputs, code, outputs)
+        return True
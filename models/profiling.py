@@ -0,0 +1,223 @@
+import os
+import sys
+import json
+import time
+import cProfile
+import tracemalloc
+import multiprocessing
+import logging
+from contextlib import contextmanager
+
+try:
+    import resource
+except ImportError:  # Windows
+    resource = None
+
+logger = logging.getLogger(__name__)
+
+# Upper bounds (ms) of the request latency buckets; one more bucket holds everything slower
+LATENCY_BUCKETS_MS = (5, 10, 25, 50, 100, 250, 500, 1000, 2500, 5000, 10000)
+
+# Profiler receiving section() and record() calls, set while a Profiler is entered
+_active = None
+
+def _rss_mb():
+    """Current resident set size, where /proc is available."""
+    try:
+        with open('/proc/self/statm') as f:
+            return int(f.read().split()[1]) * os.sysconf('SC_PAGE_SIZE') / 2 ** 20
+    except (OSError, ValueError, AttributeError):
+        return None
+
+def _peak_rss_mb():
+    """High-water mark of the resident set size since the process started."""
+    if resource is None:
+        return None
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # kilobytes on Linux, bytes on macOS
+    return peak / 2 ** 20 if sys.platform == 'darwin' else peak / 2 ** 10
+
+@contextmanager
+def section(name, rows_in=None):
+    """
+    Time the enclosed block as `name` under the enclosing section of the
+    active Profiler. Yields a dict the block may fill (e.g. rows_out); a
+    no-op when no profiler is active.
+    """
+    if _active is None:
+        yield {}
+        return
+    with _active.section(name, rows_in=rows_in) as values:
+        yield values
+
+def record(name, **values):
+    """Attach values measured elsewhere (worker timings, histograms) to section `name`."""
+    if _active is not None:
+        _active.record(name, **values)
+
+class Profiler:
+    """
+    Wall time, CPU time, memory and row counts per pipeline stage and
+    sub-step. Entering the profiler makes it the target of section() and
+    record() calls anywhere in the models, so library code is instrumented
+    without being handed a profiler; nested sections are named by path,
+    e.g. 'clean/convert_datatypes'. Repeated sections (one per chunk)
+    accumulate.
+
+    CPU time and memory cover this process only: steps run in process-pool
+    workers show up in the enclosing section's wall time, not as sub-steps.
+    With trace_memory, tracemalloc also reports the peak Python/numpy
+    allocation of each section, at a noticeable slowdown. With cprofile_dir,
+    profile=True sections dump cProfile stats to <cprofile_dir>/<name>.prof.
+    """
+
+    def __init__(self, cprofile_dir=None, trace_memory=False):
+        self.cprofile_dir = cprofile_dir
+        self.trace_memory = trace_memory
+        self.sections = {}
+        self._stack = []
+        # Running tracemalloc peak of each open section, see section()
+        self._traced_peaks = []
+        self._started = None
+        self._previous = None
+
+    def __enter__(self):
+        global _active
+        self._previous, _active = _active, self
+        self._started = time.perf_counter()
+        if self.trace_memory and not tracemalloc.is_tracing():
+            tracemalloc.start()
+        return self
+
+    def __exit__(self, *exc):
+        global _active
+        _active = self._previous
+        self.wall_seconds = time.perf_counter() - self._started
+        if self.trace_memory and tracemalloc.is_tracing():
+            tracemalloc.stop()
+
+    def _entry(self, name):
+        return self.sections.setdefault(name, {'calls': 0, 'wall_seconds': 0.0, 'cpu_seconds': 0.0})
+
+    @contextmanager
+    def section(self, name, rows_in=None, profile=False):
+        path = '/'.join(self._stack + [name])
+        values = {}
+        tracing = self.trace_memory and tracemalloc.is_tracing()
+        if tracing:
+            # tracemalloc keeps one peak: fold it into the parent before resetting it for this section
+            current, peak = tracemalloc.get_traced_memory()
+            if self._traced_peaks:
+                self._traced_peaks[-1] = max(self._traced_peaks[-1], peak)
+            tracemalloc.reset_peak()
+            self._traced_peaks.append(current)
+        profiler = None
+        if profile and self.cprofile_dir:
+            profiler = cProfile.Profile()
+            profiler.enable()
+
+        self._stack.append(name)
+        wall, cpu = time.perf_counter(), time.process_time()
+        try:
+            yield values
+        finally:
+            wall, cpu = time.perf_counter() - wall, time.process_time() - cpu
+            self._stack.pop()
+            entry = self._entry(path)
+            entry['calls'] += 1
+            entry['wall_seconds'] += wall
+            entry['cpu_seconds'] += cpu
+            for key, value in [('rows_in', rows_in), ('rows_out', values.pop('rows_out', None))]:
+                if value is not None:
+                    entry[key] = entry.get(key, 0) + value
+            entry['rss_mb'] = _rss_mb()
+            entry['peak_rss_mb'] = _peak_rss_mb()
+            if tracing:
+                start = self._traced_peaks.pop()
+                peak = max(tracemalloc.get_traced_memory()[1], start)
+                entry['traced_peak_mb'] = max(entry.get('traced_peak_mb', 0.0), (peak - start) / 2 ** 20)
+                if self._traced_peaks:
+                    self._traced_peaks[-1] = max(self._traced_peaks[-1], peak)
+            if profiler is not None:
+                profiler.disable()
+                os.makedirs(self.cprofile_dir, exist_ok=True)
+                entry['cprofile'] = os.path.join(self.cprofile_dir, f"{path.replace('/', '.')}.prof")
+                profiler.dump_stats(entry['cprofile'])
+            entry.update(values)
+
+    def record(self, name, **values):
+        path = '/'.join(self._stack + [name])
+        self.sections.setdefault(path, {}).update(values)
+
+    def metrics(self):
+        wall = getattr(self, 'wall_seconds', None)
+        if wall is None and self._started is not None:
+            wall = time.perf_counter() - self._started
+        return {
+            'wall_seconds': wall,
+            'peak_rss_mb': _peak_rss_mb(),
+            'sections': self.sections,
+        }
+
+    def write(self, path):
+        """Write metrics() as JSON to path."""
+        os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+        with open(path, 'w', encoding='utf-8') as f:
+            json.dump(self.metrics(), f, indent=2, default=str)
+        logger.info(f"Metrics saved to {path}")
+
+    def log_summary(self):
+        for name, entry in self.sections.items():
+            if 'wall_seconds' not in entry:
+                continue
+            cpu = f", {entry['cpu_seconds']:.3f}s CPU" if 'cpu_seconds' in entry else ''
+            rows = f", rows {entry['rows_in']} -> {entry['rows_out']}" if 'rows_in' in entry and 'rows_out' in entry else ''
+            logger.info(f"{name}: {entry['wall_seconds']:.3f}s wall{cpu}{rows}")
+
+class LatencyHistogram:
+    """
+    Request latency counts in fixed buckets, kept in multiprocessing shared
+    memory like RateLimiter so process-pool workers record into the parent.
+    Percentiles are bucket upper bounds, i.e. conservative estimates.
+    """
+
+    def __init__(self, bounds_ms=LATENCY_BUCKETS_MS):
+        self.bounds_ms = tuple(bounds_ms)
+        self._lock = multiprocessing.Lock()
+        self._counts = multiprocessing.Array('q', len(self.bounds_ms) + 1, lock=False)
+        self._total = multiprocessing.Value('d', 0.0, lock=False)
+        self._max = multiprocessing.Value('d', 0.0, lock=False)
+
+    def observe(self, seconds):
+        ms = seconds * 1000
+        bucket = next((i for i, bound in enumerate(self.bounds_ms) if ms <= bound), len(self.bounds_ms))
+        with self._lock:
+            self._counts[bucket] += 1
+            self._total.value += ms
+            if ms > self._max.value:
+                self._max.value = ms
+
+    def _percentile(self, counts, slowest, q):
+        target = q * sum(counts)
+        seen = 0
+        for i, n in enumerate(counts):
+            seen += n
+            if n and seen >= target:
+                return self.bounds_ms[i] if i < len(self.bounds_ms) else round(slowest, 1)
+        return None
+
+    def stats(self):
+        with self._lock:
+            counts = list(self._counts)
+            total, slowest = self._total.value, self._max.value
+        count = sum(counts)
+        labels = [f"<={bound}ms" for bound in self.bounds_ms] + [f">{self.bounds_ms[-1]}ms"]
+        return {
+            'count': count,
+            'mean_ms': round(total / count, 1) if count else None,
+            'max_ms': round(slowest, 1),
+            'p50_ms': self._percentile(counts, slowest, 0.5),
+            'p90_ms': self._percentile(counts, slowest, 0.9),
+            'p99_ms': self._percentile(counts, slowest, 0.99),
+            'buckets': dict(zip(labels, counts)),
+        }
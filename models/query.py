@@ -0,0 +1,180 @@
+import numpy as np
+import pandas as pd
+import logging
+
+logger = logging.getLogger(__name__)
+
+class MovieQueryIndex:
+    """
+    Lazily built indexes over one cleaned movie DataFrame.
+
+    Categorical filters (actor, director, genre) use inverted indexes stored
+    CSR-style: the row positions of every name are one contiguous, ascending
+    slice of a positions array. Numeric filters (year, any numeric column)
+    use a stable argsort of the column, so a range is two binary searches.
+    Each index is built on first use and reused for every later query.
+    """
+
+    def __init__(self, df, relations=None):
+        self.df = df
+        self.relations = relations
+        self._inverted = {}
+        self._sorted = {}
+        self._values = {}
+
+    # --- index construction -------------------------------------------------
+
+    @staticmethod
+    def _build_inverted(positions, names):
+        """CSR inverted index from parallel (row position, name) arrays; repeated pairs are kept once."""
+        codes, uniques = pd.factorize(names)
+        keep = codes >= 0
+        codes, positions = codes[keep], np.asarray(positions)[keep]
+        order = np.lexsort((positions, codes))
+        codes, positions = codes[order], positions[order]
+        # e.g. an actor with two roles in one movie, or two people sharing a name
+        distinct = np.ones(len(codes), dtype=bool)
+        distinct[1:] = (codes[1:] != codes[:-1]) | (positions[1:] != positions[:-1])
+        codes, positions = codes[distinct], positions[distinct]
+        offsets = np.searchsorted(codes, np.arange(len(uniques) + 1))
+        return pd.Index(uniques), offsets, positions
+
+    def _tokens(self, column):
+        tokens = self.df[column].reset_index(drop=True).dropna().str.split('|').explode().dropna()
+        return tokens.index.to_numpy(), tokens.to_numpy()
+
+    def _links(self, link_table, dim_table, key):
+        rows = pd.DataFrame({'movie_id': self.df['id'].to_numpy(), 'position': np.arange(len(self.df))})
+        links = (self.relations[link_table][['movie_id', key]]
+                 .merge(self.relations[dim_table], on=key)
+                 .merge(rows, on='movie_id'))
+        return links['position'].to_numpy(), links['name'].to_numpy()
+
+    def _inverted_index(self, kind):
+        if kind not in self._inverted:
+            if kind == 'director':
+                positions, names = self._tokens('director')
+            elif kind == 'cast' and self.relations is not None:
+                positions, names = self._links('movie_cast', 'person', 'person_id')
+            elif kind == 'genres' and self.relations is not None:
+                positions, names = self._links('movie_genre', 'genre', 'genre_id')
+            else:
+                positions, names = self._tokens(kind)
+            self._inverted[kind] = self._build_inverted(positions, names)
+            logger.debug(f"Built {kind} index with {len(self._inverted[kind][0])} keys.")
+        return self._inverted[kind]
+
+    def _column_values(self, column):
+        if column not in self._values:
+            if column == 'year':
+                values = self.df['release_date'].dt.year
+            else:
+                values = self.df[column]
+            self._values[column] = pd.to_numeric(values, errors='coerce').to_numpy(dtype='float64', na_value=np.nan)
+        return self._values[column]
+
+    def _sorted_index(self, column):
+        if column not in self._sorted:
+            values = self._column_values(column)
+            order = np.argsort(values, kind='stable')  # NaNs sort last
+            self._sorted[column] = (values[order], order)
+        return self._sorted[column]
+
+    # --- lookups --------------------------------------------------------------
+
+    def lookup(self, kind, name):
+        """Ascending row positions of movies whose `kind` (cast/director/genres) includes name."""
+        uniques, offsets, positions = self._inverted_index(kind)
+        code = uniques.get_indexer([name])[0]
+        if code < 0:
+            return np.empty(0, dtype=np.int64)
+        return positions[offsets[code]:offsets[code + 1]]
+
+    def _range_bounds(self, column, low, high):
+        sorted_values, _ = self._sorted_index(column)
+        start = 0 if low is None else np.searchsorted(sorted_values, low, side='left')
+        # NaNs are sorted last and never match a range
+        stop = np.searchsorted(sorted_values, np.inf if high is None else high, side='right')
+        return start, stop
+
+    def range_size(self, column, low=None, high=None):
+        start, stop = self._range_bounds(column, low, high)
+        return stop - start
+
+    def range_positions(self, column, low=None, high=None):
+        """Ascending row positions with low <= column <= high (None = unbounded)."""
+        start, stop = self._range_bounds(column, low, high)
+        return np.sort(self._sorted_index(column)[1][start:stop])
+
+    def _filter_range(self, candidates, column, low, high):
+        values = self._column_values(column)[candidates]
+        mask = ~np.isnan(values)
+        if low is not None:
+            mask &= values >= low
+        if high is not None:
+            mask &= values <= high
+        return candidates[mask]
+
+    @staticmethod
+    def _member(small, large):
+        """Boolean mask of which ascending positions in small also appear in large (binary searches)."""
+        if not len(large):
+            return np.zeros(len(small), dtype=bool)
+        found = np.searchsorted(large, small)
+        found[found == len(large)] = 0
+        return large[found] == small
+
+    def _union(self, sets):
+        mask = np.zeros(len(self.df), dtype=bool)
+        for positions in sets:
+            mask[positions] = True
+        return np.flatnonzero(mask)
+
+    def select(self, actors=(), directors=(), genres=(), all_genres=False, ranges=None):
+        """
+        Ascending row positions matching every filter. Index lookups run
+        first; numeric ranges are then checked on the surviving candidates, or
+        answered from the sorted index when they are the only filters.
+        """
+        sets = [self.lookup('cast', name) for name in actors]
+        sets += [self.lookup('director', name) for name in directors]
+        genre_sets = [self.lookup('genres', name) for name in genres]
+        if all_genres:
+            sets += genre_sets
+            genre_sets = []
+
+        ranges = dict(ranges or {})
+        if not sets and genre_sets:
+            sets.append(self._union(genre_sets))
+            genre_sets = []
+        if not sets and ranges:
+            # Start from the most selective range, measured with binary searches only
+            column = min(ranges, key=lambda c: self.range_size(c, *ranges[c]))
+            sets.append(self.range_positions(column, *ranges.pop(column)))
+        if not sets:
+            candidates = np.arange(len(self.df))
+        else:
+            sets.sort(key=len)
+            candidates = sets[0]
+            for other in sets[1:]:
+                candidates = candidates[self._member(candidates, other)]
+
+        if genre_sets:
+            # Any-genre filter on a small candidate set: probe each genre instead of building the union
+            matched = np.zeros(len(candidates), dtype=bool)
+            for positions in genre_sets:
+                matched |= self._member(candidates, positions)
+            candidates = candidates[matched]
+
+        for column, (low, high) in ranges.items():
+            candidates = self._filter_range(candidates, column, low, high)
+        return candidates
+
+    def top(self, positions, column, n, ascending=False):
+        """
+        The n row positions with the largest (or smallest) values of a numeric
+        column, ordered like DataFrame.nlargest/nsmallest (ties keep row order).
+        """
+        values = pd.Series(self._column_values(column)[positions])
+        best = values.nsmallest(n) if ascending else values.nlargest(n)
+        return positions[best.index.to_numpy()]
@@ -0,0 +1,97 @@
+import multiprocessing
+import time
+import logging
+
+logger = logging.getLogger(__name__)
+
+class RateLimiter:
+    """
+    Token bucket shared by every worker of a batch fetch.
+
+    State lives in multiprocessing shared memory, so one instance can be handed
+    to ProcessPoolExecutor workers (via the pool initializer) as well as used
+    from threads. rate=None disables throttling but still collects stats.
+    """
+
+    def __init__(self, rate=None, burst=None):
+        if rate is not None and rate <= 0:
+            raise ValueError(f"rate must be positive, got {rate}")
+        self.rate = rate
+        self.burst = float(burst if burst is not None else 1)
+        self._lock = multiprocessing.Lock()
+        self._tokens = multiprocessing.Value('d', self.burst, lock=False)
+        self._last_refill = multiprocessing.Value('d', time.monotonic(), lock=False)
+        self._blocked_until = multiprocessing.Value('d', 0.0, lock=False)
+        self._started_at = multiprocessing.Value('d', 0.0, lock=False)
+        self._requests = multiprocessing.Value('q', 0, lock=False)
+        self._retries = multiprocessing.Value('q', 0, lock=False)
+        self._throttle_events = multiprocessing.Value('q', 0, lock=False)
+        self._wait_seconds = multiprocessing.Value('d', 0.0, lock=False)
+        self._backoff_seconds = multiprocessing.Value('d', 0.0, lock=False)
+
+    def _reserve(self, now):
+        """Take a token if one is available; otherwise return seconds to wait."""
+        with self._lock:
+            if self._started_at.value == 0.0:
+                self._started_at.value = now
+            if now < self._blocked_until.value:
+                return self._blocked_until.value - now
+            if self.rate is None:
+                self._requests.value += 1
+                return 0.0
+
+            elapsed = now - self._last_refill.value
+            self._tokens.value = min(self.burst, self._tokens.value + elapsed * self.rate)
+            self._last_refill.value = now
+            if self._tokens.value >= 1:
+                self._tokens.value -= 1
+                self._requests.value += 1
+                return 0.0
+            return (1 - self._tokens.value) / self.rate
+
+    def acquire(self):
+        """Block until a request may be sent."""
+        waited = 0.0
+        while True:
+            delay = self._reserve(time.monotonic())
+            if delay <= 0:
+                break
+            time.sleep(delay)
+            waited += delay
+        if waited:
+            with self._lock:
+                self._wait_seconds.value += waited
+        return waited
+
+    def throttle(self, delay):
+        """Pause every worker for delay seconds (e.g. after an HTTP 429)."""
+        with self._lock:
+            self._throttle_events.value += 1
+            self._retries.value += 1
+            until = time.monotonic() + delay
+            if until > self._blocked_until.value:
+                self._blocked_until.value = until
+                # Drain the bucket so workers do not burst as soon as the pause ends
+                self._tokens.value = 0.0
+                self._last_refill.value = until
+
+    def record_backoff(self, delay):
+        with self._lock:
+            self._retries.value += 1
+            self._backoff_seconds.value += delay
+
+    def stats(self):
+        with self._lock:
+            started = self._started_at.value
+            elapsed = time.monotonic() - started if started else 0.0
+            requests_sent = self._requests.value
+            return {
+                'requests': requests_sent,
+                'elapsed_seconds': round(elapsed, 3),
+                'achieved_rate': round(requests_sent / elapsed, 2) if elapsed > 0 else 0.0,
+                'target_rate': self.rate,
+                'throttle_events': self._throttle_events.value,
+                'retries': self._retries.value,
+                'wait_seconds': round(self._wait_seconds.value, 3),
+                'backoff_seconds': round(self._backoff_seconds.value, 3),
+            }
@@ -0,0 +1,126 @@
+import os
+import pandas as pd
+import logging
+from .layout import RELATION_SCHEMAS, relation_path
+from .storage import ChunkedFrameWriter, apply_schema, load_frame, storage_format
+
+logger = logging.getLogger(__name__)
+
+# Dimension tables are deduplicated on their key when partitions are combined
+DIMENSION_KEYS = {'person': 'person_id', 'genre': 'genre_id'}
+
+def empty_relations():
+    return {table: apply_schema(pd.DataFrame(columns=list(schema)), schema)
+            for table, schema in RELATION_SCHEMAS.items()}
+
+def build_relations(movie_ids, genres, credits):
+    """Build the normalized tables from parsed genre lists and credits dicts, row-aligned with movie_ids."""
+    cast_rows, crew_rows, genre_rows = [], [], []
+    people, genre_names = {}, {}
+    for movie_id, movie_genres, movie_credits in zip(movie_ids, genres, credits):
+        if pd.isna(movie_id):
+            continue
+        if isinstance(movie_genres, list):
+            for g in movie_genres:
+                if isinstance(g, dict) and 'id' in g:
+                    genre_rows.append((movie_id, g['id']))
+                    # First name seen wins, like the drop_duplicates of chunked and parallel runs
+                    genre_names.setdefault(g['id'], g.get('name'))
+        if not isinstance(movie_credits, dict):
+            continue
+        for p in movie_credits.get('cast') or []:
+            if isinstance(p, dict) and 'id' in p:
+                cast_rows.append((movie_id, p['id'], p.get('order'), p.get('character')))
+                people.setdefault(p['id'], p.get('name'))
+        for p in movie_credits.get('crew') or []:
+            if isinstance(p, dict) and 'id' in p:
+                crew_rows.append((movie_id, p['id'], p.get('department'), p.get('job')))
+                people.setdefault(p['id'], p.get('name'))
+
+    rows = {
+        'movie_cast': cast_rows,
+        'movie_crew': crew_rows,
+        'movie_genre': genre_rows,
+        'person': list(people.items()),
+        'genre': list(genre_names.items()),
+    }
+    return {table: apply_schema(pd.DataFrame(rows[table], columns=list(schema)), schema)
+            for table, schema in RELATION_SCHEMAS.items()}
+
+def filter_relations(relations, movie_ids):
+    """Keep only link rows for movies that survived cleaning."""
+    keep = set(movie_ids)
+    return {table: df[df['movie_id'].isin(keep)] if 'movie_id' in df.columns else df
+            for table, df in relations.items()}
+
+def concat_relations(parts):
+    """Combine per-partition relations in order, deduplicating the dimension tables."""
+    combined = {}
+    for table in RELATION_SCHEMAS:
+        df = pd.concat([part[table] for part in parts], ignore_index=True)
+        if table in DIMENSION_KEYS:
+            df = df.drop_duplicates(subset=DIMENSION_KEYS[table]).reset_index(drop=True)
+        combined[table] = df
+    return combined
+
+def remove_relations(cleaned_path):
+    """Delete the relation tables of cleaned_path, so a run without relations leaves none stale."""
+    for table in RELATION_SCHEMAS:
+        path = relation_path(cleaned_path, table)
+        if os.path.exists(path):
+            os.remove(path)
+            logger.info(f"Removed stale relation table {path}")
+
+def save_relations(relations, cleaned_path):
+    for table, df in relations.items():
+        path = relation_path(cleaned_path, table)
+        with ChunkedFrameWriter(path) as writer:
+            writer.write(df)
+    logger.info(f"Saved relation tables ({', '.join(relations)}) next to {cleaned_path}")
+
+def load_relations(cleaned_path, tables=None, movie_ids=None):
+    """
+    Load relation tables saved next to cleaned_path; returns None when they
+    are missing, or, given the cleaned frame's movie_ids, when they link
+    movies that are not in it (tables left from another cleaning run).
+    """
+    tables = tables or list(RELATION_SCHEMAS)
+    paths = {table: relation_path(cleaned_path, table) for table in tables}
+    if not all(os.path.exists(path) for path in paths.values()):
+        return None
+    relations = {table: load_frame(path, schema=RELATION_SCHEMAS[table]) for table, path in paths.items()}
+    if movie_ids is not None:
+        known = pd.Index(movie_ids)
+        for table, df in relations.items():
+            if 'movie_id' in df.columns and not df['movie_id'].dropna().isin(known).all():
+                logger.warning(f"Ignoring the relation tables next to {cleaned_path}: {relation_path(cleaned_path, table)} "
+                               f"links movies that are not in the cleaned data. Re-run cleaning to rebuild them.")
+                return None
+    return relations
+
+class RelationWriter:
+    """Append per-chunk relations to their files, writing each person/genre only once."""
+
+    def __init__(self, cleaned_path):
+        storage_format(cleaned_path)
+        self.writers = {table: ChunkedFrameWriter(relation_path(cleaned_path, table))
+                        for table in RELATION_SCHEMAS}
+        self.seen = {table: set() for table in DIMENSION_KEYS}
+
+    def write(self, relations):
+        for table, df in relations.items():
+            if table in DIMENSION_KEYS:
+                key = DIMENSION_KEYS[table]
+                df = df[~df[key].isin(self.seen[table])].drop_duplicates(subset=key)
+                self.seen[table].update(df[key].tolist())
+            self.writers[table].write(df)
+
+    def close(self):
+        for writer in self.writers.values():
+            writer.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
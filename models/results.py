@@ -0,0 +1,114 @@
+import time
+import numpy as np
+import pandas as pd
+import logging
+from .profiling import section
+from .kpi import RANKED_KPIS, TopKEngine
+
+logger = logging.getLogger(__name__)
+
+def _plain(values):
+    """Categorical values as their categories' dtype, so plots order them by appearance, not by category."""
+    if isinstance(values.dtype, pd.CategoricalDtype):
+        return values.astype(values.cat.categories.dtype)
+    return values
+
+class AnalysisResults:
+    """
+    Memoized derived tables of one cleaned dataset, shared by MovieAnalyzer
+    and DataVisualizer so each table is computed once per dataset. Nothing
+    here writes to df; replacing df drops every cached table. Returned
+    tables are shared between callers and must not be modified.
+
+    Hits, misses and compute time per table are kept for stats()/log_stats().
+    """
+
+    def __init__(self, df):
+        self.df = df
+        self._data = df
+        self._tables = {}
+        self._metrics = {}
+
+    def get(self, name, compute):
+        """Return the cached table called name, computing it with compute() on a miss."""
+        if self._data is not self.df:
+            self._tables.clear()
+            self._data = self.df
+        metrics = self._metrics.setdefault(name, {'hits': 0, 'misses': 0, 'compute_seconds': 0.0})
+        if name in self._tables:
+            metrics['hits'] += 1
+            return self._tables[name]
+        start = time.perf_counter()
+        with section(name):
+            table = compute()
+        metrics['misses'] += 1
+        metrics['compute_seconds'] += time.perf_counter() - start
+        self._tables[name] = table
+        return table
+
+    def stats(self):
+        return {name: dict(metrics) for name, metrics in self._metrics.items()}
+
+    def log_stats(self):
+        for name, metrics in sorted(self._metrics.items(), key=lambda item: -item[1]['compute_seconds']):
+            logger.info(f"Result '{name}': {metrics['misses']} computed in {metrics['compute_seconds']:.3f}s, "
+                        f"{metrics['hits']} cache hits")
+
+    # --- analysis tables ------------------------------------------------------
+
+    def engine(self):
+        """The TopKEngine over df; it keeps the metric arrays and filter masks it has read."""
+        return self.get('kpi_engine', lambda: TopKEngine(self.df))
+
+    def ranked_kpis(self, k=5):
+        return self.get(f"ranked_kpis_top{k}", lambda: self.engine().compute(RANKED_KPIS, k=k))
+
+    def is_franchise(self):
+        return self.get('is_franchise', lambda: self.df['collection_name'].notna())
+
+    def franchise_comparison(self):
+        def compute():
+            return self.df.groupby(self.is_franchise().rename('is_franchise')).agg({
+                'revenue_musd': 'mean',
+                'roi': 'median',
+                'budget_musd': 'mean',
+                'popularity': 'mean',
+                'vote_average': 'mean'
+            }).rename(index={True: 'Franchise', False: 'Standalone'})
+        return self.get('franchise_comparison', compute)
+
+    def top_directors(self, n=5):
+        def compute():
+            director_stats = self.df.dropna(subset=['director']).groupby('director').agg({
+                'title': 'count',
+                'revenue_musd': 'sum',
+                'vote_average': 'mean'
+            }).rename(columns={'title': 'movie_count', 'revenue_musd': 'total_revenue', 'vote_average': 'mean_rating'})
+            return director_stats.sort_values('total_revenue', ascending=False).head(n)
+        return self.get(f"top_directors_top{n}", compute)
+
+    # --- plot tables ----------------------------------------------------------
+
+    def year(self):
+        return self.get('year', lambda: self.df['release_date'].dt.year.rename('year'))
+
+    def primary_genre(self):
+        def compute():
+            # Genre lists repeat heavily: split each distinct string once, then map back by code
+            genres = _plain(self.df['genres'])
+            codes, uniques = pd.factorize(genres)
+            firsts = np.append(uniques.str.split('|', n=1).str[0].to_numpy(dtype=object), np.nan)
+            return pd.Series(firsts[codes], index=genres.index, name='primary_genre', dtype=genres.dtype)
+        return self.get('primary_genre', compute)
+
+    def yearly_totals(self):
+        """Revenue and budget summed per release year."""
+        return self.get('yearly_totals', lambda: self.df.groupby(self.year())[['revenue_musd', 'budget_musd']].sum())
+
+    def roi_by_genre(self):
+        def compute():
+            roi = self.df['roi'] if 'roi' in self.df.columns else self.df['revenue_musd'] / self.df['budget_musd']
+            table = roi.groupby(self.df['genres']).mean().reset_index(name='mean_roi')
+            table['genres'] = _plain(table['genres'])
+            return table.sort_values('mean_roi', ascending=False)
+        return self.get('roi_by_genre', compute)
@@ -0,0 +1,269 @@
+import os
+import json
+import time
+import threading
+import logging
+from collections import OrderedDict
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlsplit
+from .analysis import SEARCH_COLUMNS, MovieAnalyzer
+from .profiling import LatencyHistogram
+from .storage import CLEANED_SCHEMA
+
+logger = logging.getLogger(__name__)
+
+NUMERIC_COLUMNS = [col for col, dtype in CLEANED_SCHEMA.items() if dtype in ('Int64', 'float64')]
+MAX_ROWS = 10000
+
+def _records(df, index=False):
+    """Frame rows as JSON-ready dicts, with None for missing values."""
+    if index:
+        df = df.reset_index()
+    df = df.astype(object)
+    return df.where(df.notna(), None).to_dict('records')
+
+def _int(params, name, default, low=1, high=MAX_ROWS):
+    value = int(params.pop(name, [default])[-1])
+    if not low <= value <= high:
+        raise ValueError(f"{name} must be between {low} and {high}")
+    return value
+
+def _flag(params, name):
+    return params.pop(name, ['0'])[-1].lower() in ('1', 'true', 'yes')
+
+class LRUCache:
+    """Thread-safe mapping that keeps the maxsize most recently used entries; maxsize=0 disables it."""
+
+    def __init__(self, maxsize=1024):
+        self.maxsize = maxsize
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def get(self, key):
+        with self._lock:
+            if key in self._entries:
+                self._entries.move_to_end(key)
+                self.hits += 1
+                return self._entries[key]
+            self.misses += 1
+            return None
+
+    def put(self, key, value):
+        if not self.maxsize:
+            return
+        with self._lock:
+            self._entries[key] = value
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.maxsize:
+                self._entries.popitem(last=False)
+                self.evictions += 1
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+    def stats(self):
+        with self._lock:
+            return {'size': len(self._entries), 'maxsize': self.maxsize, 'hits': self.hits,
+                    'misses': self.misses, 'evictions': self.evictions}
+
+class KPIService:
+    """
+    The report's tables and MovieAnalyzer.query() over one cleaned dataset,
+    loaded once and served as JSON by make_server(). The dataset is either a
+    cleaned CSV/Parquet file, loaded column-projected (compact=True for the
+    compact dtypes), or a SQLite store (store=True), queried in place
+    through a memory map.
+
+    Responses are kept in an LRU cache keyed by the dataset file's mtime and
+    size and the canonical request. Each request stats the file; when it
+    has changed, one request reloads it while the others keep answering
+    from the previous data, and the cache is cleared. Cache hits are served
+    concurrently; misses compute one at a time, as analysis is CPU-bound
+    under the GIL and the lazily built indexes are not thread-safe. Both
+    backends return MovieAnalyzer.COLUMNS from /search unless asked for
+    other columns. A replaced store's connection is closed once no miss
+    is computing on it.
+    """
+
+    def __init__(self, path, store=False, compact=False, cache_size=1024):
+        self.path = path
+        self.store = store
+        self.compact = compact
+        self.cache = LRUCache(cache_size)
+        self.latency = LatencyHistogram()
+        self.reloads = 0
+        self._current = None
+        self._load_lock = threading.Lock()
+        self._compute_lock = threading.Lock()
+        self.refresh()
+
+    def _signature(self):
+        stat = os.stat(self.path)
+        return stat.st_mtime_ns, stat.st_size
+
+    def _load(self):
+        if self.store:
+            analyzer = MovieAnalyzer.from_store(self.path)
+            return analyzer, analyzer.store.count()
+        analyzer = MovieAnalyzer.from_path(self.path, compact=self.compact)
+        return analyzer, len(analyzer.df)
+
+    def refresh(self):
+        """Reload the dataset if its file changed since it was loaded. Returns True if it was reloaded."""
+        signature = self._signature()
+        if self._current is not None and signature == self._current['signature']:
+            return False
+        # The first request to notice the change reloads; the others carry on with the loaded data
+        if not self._load_lock.acquire(blocking=self._current is None):
+            return False
+        try:
+            signature = self._signature()
+            if self._current is not None and signature == self._current['signature']:
+                return False
+            try:
+                analyzer, rows = self._load()
+            except Exception as e:
+                if self._current is None:
+                    raise
+                # e.g. a file caught mid-write: keep serving the loaded data and retry on the next request
+                logger.warning(f"Reloading {self.path} failed, serving the previously loaded data: {e}")
+                return False
+            previous = self._current
+            self._current = {'signature': signature, 'analyzer': analyzer, 'rows': rows, 'loaded_at': time.time()}
+            self.cache.clear()
+            self.reloads += 1
+            logger.info(f"Serving {rows} movies from {self.path}")
+            if previous is not None and previous['analyzer'].store is not None:
+                # The file was replaced (os.replace); release the old inode's connection and fd
+                with self._compute_lock:
+                    previous['analyzer'].store.close()
+            return True
+        finally:
+            self._load_lock.release()
+
+    # --- endpoints ------------------------------------------------------------
+
+    def kpis(self, analyzer, params):
+        k = _int(params, 'k', 5)
+        return [{'title': title, 'rows': _records(df)} for title, df in analyzer.results.ranked_kpis(k=k)]
+
+    def franchise(self, analyzer, params):
+        return _records(analyzer.analyze_franchise_vs_standalone(), index=True)
+
+    def directors(self, analyzer, params):
+        return _records(analyzer.results.top_directors(n=_int(params, 'n', 5)), index=True)
+
+    def searches(self, analyzer, params):
+        return {name: _records(df[SEARCH_COLUMNS[name]])
+                for name, df in analyzer.get_custom_search_results().items()}
+
+    def search(self, analyzer, params):
+        """
+        query() from URL parameters: actor, director and genre (repeatable),
+        all_genres, year ('2015' or '2010-2015'), min_<column>/max_<column>
+        for numeric columns, sort_by, ascending, top_n, columns (comma
+        separated, default MovieAnalyzer.COLUMNS). At most `limit` rows
+        (default 100) are returned.
+        """
+        kwargs = {
+            'actor': params.pop('actor', None),
+            'director': params.pop('director', None),
+            'genres': params.pop('genre', None),
+            'all_genres': _flag(params, 'all_genres'),
+            'ascending': _flag(params, 'ascending'),
+            'sort_by': params.pop('sort_by', [None])[-1],
+        }
+        if 'year' in params:
+            low, _, high = params.pop('year')[-1].partition('-')
+            kwargs['year'] = (int(low), int(high or low))
+        if 'top_n' in params:
+            kwargs['top_n'] = _int(params, 'top_n', None)
+        # The same default columns, in the same order, from either backend
+        kwargs['columns'] = params.pop('columns')[-1].split(',') if 'columns' in params else MovieAnalyzer.COLUMNS
+        limit = _int(params, 'limit', 100)
+        ranges = {}
+        for name in list(params):
+            bound, _, column = name.partition('_')
+            if bound in ('min', 'max') and column in NUMERIC_COLUMNS:
+                low, high = ranges.get(column, (None, None))
+                value = float(params.pop(name)[-1])
+                ranges[column] = (value, high) if bound == 'min' else (low, value)
+        if params:
+            raise ValueError(f"Unknown parameters: {', '.join(sorted(params))}")
+        result = analyzer.query(ranges=ranges, **kwargs)
+        return {'count': len(result), 'rows': _records(result.head(limit))}
+
+    def health(self):
+        current = self._current
+        return {
+            'path': self.path,
+            'backend': 'sqlite' if self.store else 'frame',
+            'rows': current['rows'],
+            'loaded_at': current['loaded_at'],
+            'reloads': self.reloads,
+            'cache': self.cache.stats(),
+            'latency': self.latency.stats(),
+        }
+
+    ENDPOINTS = {'/kpis': kpis, '/franchise': franchise, '/directors': directors,
+                 '/searches': searches, '/search': search}
+
+    def handle(self, target):
+        """(HTTP status, JSON body) for a GET of target, e.g. '/directors?n=10'."""
+        url = urlsplit(target)
+        path = url.path.rstrip('/') or '/'
+        if path == '/health':
+            return 200, json.dumps(self.health()).encode('utf-8')
+        endpoint = self.ENDPOINTS.get(path)
+        if endpoint is None:
+            return 404, json.dumps({'error': f"Unknown endpoint {path}",
+                                    'endpoints': sorted(self.ENDPOINTS) + ['/health']}).encode('utf-8')
+
+        self.refresh()
+        params = parse_qs(url.query, keep_blank_values=True)
+        request = (path, tuple(sorted((name, tuple(values)) for name, values in params.items())))
+        body = self.cache.get((self._current['signature'],) + request)
+        if body is None:
+            try:
+                with self._compute_lock:
+                    # Read under the lock: a reload closes the previous store only while holding it
+                    current = self._current
+                    result = endpoint(self, current['analyzer'], params)
+            except (ValueError, KeyError, TypeError) as e:
+                return 400, json.dumps({'error': str(e)}).encode('utf-8')
+            body = json.dumps(result, default=str).encode('utf-8')
+            self.cache.put((current['signature'],) + request, body)
+        return 200, body
+
+class KPIRequestHandler(BaseHTTPRequestHandler):
+    protocol_version = 'HTTP/1.1'  # keep-alive
+    disable_nagle_algorithm = True
+    service = None
+
+    def do_GET(self):
+        start = time.perf_counter()
+        try:
+            status, body = self.service.handle(self.path)
+        except Exception as e:
+            logger.exception(f"Request {self.path} failed")
+            status, body = 500, json.dumps({'error': str(e)}).encode('utf-8')
+        self.send_response(status)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+        self.service.latency.observe(time.perf_counter() - start)
+
+    def log_message(self, format, *args):
+        logger.debug(f"{self.address_string()} {format % args}")
+
+def make_server(service, host='127.0.0.1', port=8000):
+    """A ThreadingHTTPServer answering each connection on its own thread; port=0 picks a free port."""
+    handler = type('Handler', (KPIRequestHandler,), {'service': service})
+    server = ThreadingHTTPServer((host, port), handler)
+    server.daemon_threads = True
+    return server
@@ -0,0 +1,195 @@
+import os
+import json
+import glob
+import numpy as np
+import pandas as pd
+import logging
+from .storage import RAW_SCHEMA, ChunkedFrameWriter, apply_schema, iter_frames
+
+logger = logging.getLogger(__name__)
+
+def encode_nested_columns(df):
+    """JSON-encode list/dict cells so the cleaner can parse them with json.loads."""
+    for col in df.columns[df.dtypes == object]:
+        df[col] = df[col].map(lambda v: json.dumps(v) if isinstance(v, (list, dict)) else v)
+    return df
+
+class IdBitmap:
+    """
+    Set of positive integer IDs stored as one bit per ID: TMDB's ~1.5M ID
+    range fits in under 200 KB, where a Python set of a million IDs takes
+    tens of MB.
+    """
+
+    def __init__(self, ids=()):
+        self._bits = bytearray()
+        self.update(ids)
+
+    def _grow(self, movie_id):
+        size = (movie_id >> 3) + 1
+        if size > len(self._bits):
+            # Grow geometrically so streaming adds stay amortized O(1)
+            self._bits.extend(bytes(max(size, 2 * len(self._bits)) - len(self._bits)))
+
+    def add(self, movie_id):
+        self._grow(movie_id)
+        self._bits[movie_id >> 3] |= 1 << (movie_id & 7)
+
+    def discard(self, movie_id):
+        if movie_id in self:
+            self._bits[movie_id >> 3] &= ~(1 << (movie_id & 7)) & 0xFF
+
+    def update(self, ids):
+        ids = np.asarray(ids, dtype=np.int64)
+        if not len(ids):
+            return
+        self._grow(int(ids.max()))
+        np.bitwise_or.at(np.frombuffer(self._bits, dtype=np.uint8), ids >> 3, (1 << (ids & 7)).astype(np.uint8))
+
+    def __contains__(self, movie_id):
+        index = movie_id >> 3
+        return 0 <= index < len(self._bits) and bool(self._bits[index] >> (movie_id & 7) & 1)
+
+    def __len__(self):
+        return int.from_bytes(self._bits, 'little').bit_count()
+
+    @classmethod
+    def from_files(cls, paths, chunk_size=100000):
+        """IDs of every existing raw CSV/Parquet file in paths, read by column in chunks."""
+        bitmap = cls()
+        for path in paths:
+            if not os.path.exists(path):
+                continue
+            for chunk in iter_frames(path, chunk_size, columns=['id']):
+                ids = pd.to_numeric(chunk['id'], errors='coerce').dropna()
+                bitmap.update(ids[ids > 0].to_numpy(dtype=np.int64))
+        return bitmap
+
+class JsonlSink:
+    """
+    Chunked, append-only on-disk store for extracted movie payloads.
+
+    Each fetched record is appended to part-NNNNN.jsonl as soon as it arrives
+    (a new part every chunk_size records), and its ID is appended to
+    checkpoint.jsonl together with any failed IDs. Reopening the directory
+    restores the checkpoint, so an interrupted run resumes where it stopped.
+    Completed and failed IDs are held as IdBitmaps, so a checkpoint of a
+    million movies costs kilobytes.
+    """
+
+    def __init__(self, directory, chunk_size=1000):
+        self.directory = directory
+        self.chunk_size = chunk_size
+        self.checkpoint_path = os.path.join(directory, 'checkpoint.jsonl')
+        os.makedirs(directory, exist_ok=True)
+        self.completed, self.failed = self._load_checkpoint()
+        self._part_index = len(self.part_paths())
+        self._part_file = None
+        self._rows_in_part = 0
+        self._checkpoint_file = open(self.checkpoint_path, 'a', encoding='utf-8')
+
+    def _load_checkpoint(self):
+        completed, failed = IdBitmap(), IdBitmap()
+        if not os.path.exists(self.checkpoint_path):
+            return completed, failed
+        with open(self.checkpoint_path, encoding='utf-8') as f:
+            for line in f:
+                try:
+                    entry = json.loads(line)
+                except ValueError:
+                    # Torn final line from an interrupted run
+                    continue
+                if entry['status'] == 'ok':
+                    completed.add(entry['id'])
+                    failed.discard(entry['id'])
+                else:
+                    failed.add(entry['id'])
+        logger.info(f"Loaded checkpoint: {len(completed)} completed, {len(failed)} failed IDs.")
+        return completed, failed
+
+    def part_paths(self):
+        return sorted(glob.glob(os.path.join(self.directory, 'part-*.jsonl')))
+
+    def pending(self, movie_ids, retry_failed=False):
+        """Return the IDs that still need fetching."""
+        return [mid for mid in movie_ids
+                if mid not in self.completed and (retry_failed or mid not in self.failed)]
+
+    def _checkpoint(self, movie_id, status):
+        self._checkpoint_file.write(json.dumps({'id': movie_id, 'status': status}) + '\n')
+        self._checkpoint_file.flush()
+
+    def write(self, movie_id, record):
+        if self._part_file is None or self._rows_in_part >= self.chunk_size:
+            self._roll_part()
+        self._part_file.write(json.dumps(record) + '\n')
+        self._part_file.flush()
+        self._rows_in_part += 1
+        # Checkpoint only after the record itself is on disk
+        self._checkpoint(movie_id, 'ok')
+        self.completed.add(movie_id)
+        self.failed.discard(movie_id)
+
+    def mark_failed(self, movie_id):
+        self._checkpoint(movie_id, 'failed')
+        self.failed.add(movie_id)
+
+    def _roll_part(self):
+        if self._part_file is not None:
+            self._part_file.close()
+        path = os.path.join(self.directory, f"part-{self._part_index:05d}.jsonl")
+        self._part_file = open(path, 'a', encoding='utf-8')
+        self._part_index += 1
+        self._rows_in_part = 0
+
+    def close(self):
+        if self._part_file is not None:
+            self._part_file.close()
+            self._part_file = None
+        self._checkpoint_file.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def iter_chunks(self):
+        """Yield one list of records per part file, skipping duplicates and torn lines."""
+        seen = IdBitmap()
+        for path in self.part_paths():
+            records = []
+            with open(path, encoding='utf-8') as f:
+                for line in f:
+                    try:
+                        record = json.loads(line)
+                    except ValueError:
+                        continue
+                    # A crash between record and checkpoint write can refetch a movie
+                    movie_id = record.get('id')
+                    if isinstance(movie_id, int) and movie_id >= 0:
+                        if movie_id in seen:
+                            continue
+                        seen.add(movie_id)
+                    records.append(record)
+            if records:
+                yield records
+
+    def export(self, output_path):
+        """
+        Export all parts to one CSV or Parquet file (by extension), one chunk
+        at a time; Parquet gets one row group per chunk. Returns the row count.
+        """
+        # First pass collects the union of keys so every chunk shares one header
+        columns = {}
+        for records in self.iter_chunks():
+            for record in records:
+                columns.update(dict.fromkeys(record))
+        columns = list(columns)
+
+        with ChunkedFrameWriter(output_path) as writer:
+            for records in self.iter_chunks():
+                chunk = encode_nested_columns(pd.DataFrame(records).reindex(columns=columns))
+                # Fixed dtypes keep every row group on the same Parquet schema
+                writer.write(apply_schema(chunk, RAW_SCHEMA, others='string'))
+        return writer.rows
@@ -0,0 +1,288 @@
+import os
+import sqlite3
+import threading
+import pandas as pd
+import logging
+from .storage import CLEANED_SCHEMA, apply_schema
+from .relations import DIMENSION_KEYS, RELATION_SCHEMAS
+from .results import AnalysisResults
+from .kpi import RANKED_KPIS
+
+logger = logging.getLogger(__name__)
+
+SQL_TYPES = {'Int64': 'INTEGER', 'float64': 'REAL', 'string': 'TEXT', 'datetime64[us]': 'TEXT'}
+NUMERIC_COLUMNS = [col for col, dtype in CLEANED_SCHEMA.items() if dtype in ('Int64', 'float64')]
+
+# Created after the bulk load: the filter, sort and group-by columns of the report and of query()
+INDEXES = {
+    'movies': ['id', 'director', 'release_date', 'revenue_musd', 'roi', 'vote_count',
+               'budget_musd', 'profit_musd', 'vote_average'],
+    'movie_cast': ['person_id', 'movie_id'],
+    'movie_crew': ['person_id', 'movie_id'],
+    'movie_genre': ['genre_id', 'movie_id'],
+    'person': ['name'],
+    'genre': ['name'],
+}
+
+def _quote(column):
+    # 'cast' is an SQL keyword
+    return f'"{column}"'
+
+def _table_sql(table, schema, key=None):
+    columns = [f"{_quote(col)} {SQL_TYPES[dtype]}{' PRIMARY KEY' if col == key else ''}" for col, dtype in schema.items()]
+    return f"CREATE TABLE {table} ({', '.join(columns)})"
+
+def _rows(df, columns):
+    """df[columns] as tuples of plain Python values, with None for missing ones."""
+    df = df.reindex(columns=columns).astype(object)
+    return df.where(df.notna(), None).itertuples(index=False, name=None)
+
+class MovieStoreWriter:
+    """
+    Build the SQLite store of a cleaned dataset chunk by chunk: a movies
+    table with the cleaned columns in dataset order (rowid), plus the
+    normalized cast/crew/genre tables. The file is built next to `path` and
+    only replaces it, indexed, when close() succeeds.
+    """
+
+    def __init__(self, path):
+        self.path = path
+        self.rows = 0
+        self._tmp_path = f"{path}.tmp"
+        os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+        if os.path.exists(self._tmp_path):
+            os.remove(self._tmp_path)
+        self.conn = sqlite3.connect(self._tmp_path)
+        # A failed build is thrown away, so the load needs no journal or fsyncs
+        self.conn.execute("PRAGMA journal_mode=OFF")
+        self.conn.execute("PRAGMA synchronous=OFF")
+        self.conn.execute(_table_sql('movies', CLEANED_SCHEMA))
+        for table, schema in RELATION_SCHEMAS.items():
+            self.conn.execute(_table_sql(table, schema, DIMENSION_KEYS.get(table)))
+
+    def _insert(self, table, columns, df):
+        # People and genres recur across chunks; the first name seen is kept
+        verb = 'INSERT OR IGNORE' if table in DIMENSION_KEYS else 'INSERT'
+        self.conn.executemany(f"{verb} INTO {table} ({', '.join(map(_quote, columns))}) VALUES ({', '.join('?' * len(columns))})",
+                              _rows(df, columns))
+
+    def write(self, df, relations=None):
+        """Append cleaned movies (CLEANED_SCHEMA dtypes) and, optionally, their relation tables."""
+        df = df.copy(deep=False)
+        # ISO dates sort and compare as text, so release_date ranges use its index
+        df['release_date'] = pd.to_datetime(df['release_date']).dt.strftime('%Y-%m-%d')
+        self._insert('movies', list(CLEANED_SCHEMA), df)
+        for table, rows in (relations or {}).items():
+            self._insert(table, list(RELATION_SCHEMAS[table]), rows)
+        self.conn.commit()
+        self.rows += len(df)
+
+    def close(self):
+        if self.conn is None:
+            return
+        for table, columns in INDEXES.items():
+            for col in columns:
+                self.conn.execute(f"CREATE INDEX idx_{table}_{col} ON {table} ({col})")
+        # Table statistics let the planner choose between indexes for combined filters
+        self.conn.execute("ANALYZE")
+        self.conn.commit()
+        self.conn.close()
+        self.conn = None
+        os.replace(self._tmp_path, self.path)
+        logger.info(f"SQLite store with {self.rows} movies saved to {self.path}")
+
+    def discard(self):
+        if self.conn is not None:
+            self.conn.close()
+            self.conn = None
+            os.remove(self._tmp_path)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, *exc):
+        if exc_type is None:
+            self.close()
+        else:
+            self.discard()
+
+class MovieStore:
+    """
+    Read side of the SQLite store. Answers the report's ranked KPIs (it has
+    TopKEngine's ranked()/compute() interface), franchise and director
+    aggregations and MovieAnalyzer.query() searches with indexed SQL, so
+    only result rows are loaded into pandas. Results match the in-memory
+    analysis: ties keep dataset order and missing metrics come last.
+    """
+
+    def __init__(self, path, mmap_size=1 << 30):
+        if not os.path.exists(path):
+            raise FileNotFoundError(f"File not found: {path}")
+        self.path = path
+        # Read-only; one connection shared by threads, used under a lock
+        self.conn = sqlite3.connect(f"file:{os.path.abspath(path)}?mode=ro", uri=True, check_same_thread=False)
+        # Pages are read through a memory map (up to mmap_size bytes) instead of copied into SQLite's cache
+        self.conn.execute(f"PRAGMA mmap_size={int(mmap_size)}")
+        self._lock = threading.Lock()
+
+    def fetch(self, sql, params=()):
+        with self._lock:
+            return self.conn.execute(sql, params).fetchall()
+
+    def frame(self, sql, params=()):
+        with self._lock:
+            cursor = self.conn.execute(sql, params)
+            rows = cursor.fetchall()
+            names = [d[0] for d in cursor.description]
+        return apply_schema(pd.DataFrame(rows, columns=names), CLEANED_SCHEMA)
+
+    def count(self):
+        return self.fetch("SELECT COUNT(*) FROM movies")[0][0]
+
+    def close(self):
+        self.conn.close()
+
+    @staticmethod
+    def _check(column):
+        """column quoted for SQL; only cleaned columns are accepted, as names are interpolated."""
+        if column not in CLEANED_SCHEMA:
+            raise ValueError(f"Unknown column: {column}")
+        return _quote(column)
+
+    # --- ranked KPIs ----------------------------------------------------------
+
+    def _condition(self, condition):
+        if condition is None:
+            return '', []
+        if not isinstance(condition, tuple):
+            raise TypeError("The SQLite store only supports (column, minimum) conditions")
+        column, minimum = condition
+        return f" AND {self._check(column)} >= ?", [minimum]
+
+    def ranked(self, metric, k=5, ascending=False, condition=None):
+        """The id/title/metric/rank frame for one KPI, like TopKEngine.ranked."""
+        column = self._check(metric)
+        where, params = self._condition(condition)
+        order = 'ASC' if ascending else 'DESC'
+        rows = self.fetch(f"SELECT id, title, {column} FROM movies WHERE {column} IS NOT NULL{where} "
+                          f"ORDER BY {column} {order}, rowid LIMIT ?", params + [k])
+        values = [row[2] for row in rows]
+        # Rows come sorted, so a tie's min rank is the position of its first occurrence
+        ranks = [values.index(value) + 1 for value in values]
+        if len(rows) < k:
+            missing = self.fetch(f"SELECT id, title, {column} FROM movies WHERE {column} IS NULL{where} "
+                                 f"ORDER BY rowid LIMIT ?", params + [k - len(rows)])
+            rows += missing
+            ranks += [None] * len(missing)
+        result = apply_schema(pd.DataFrame(rows, columns=['id', 'title', metric]), CLEANED_SCHEMA)
+        result['rank'] = pd.array(ranks, dtype='Int64')
+        return result
+
+    def compute(self, kpis=RANKED_KPIS, k=5):
+        """[(title, frame)] for every ranked KPI."""
+        return [(title, self.ranked(metric, k, asc, cond)) for title, metric, asc, cond in kpis]
+
+    # --- aggregations ---------------------------------------------------------
+
+    def franchise_comparison(self):
+        groups = self.fetch("SELECT collection_name IS NOT NULL, AVG(revenue_musd), AVG(budget_musd), "
+                            "AVG(popularity), AVG(vote_average), COUNT(roi) "
+                            "FROM movies GROUP BY 1 ORDER BY 1")
+        rows = []
+        for is_franchise, revenue, budget, popularity, vote_average, n in groups:
+            # Median from the middle one or two values, read in roi index order
+            middle = self.fetch("SELECT roi FROM movies WHERE roi IS NOT NULL AND (collection_name IS NOT NULL) = ? "
+                                "ORDER BY roi LIMIT ? OFFSET ?", (is_franchise, 2 - n % 2, (n - 1) // 2)) if n else []
+            median = sum(row[0] for row in middle) / len(middle) if middle else float('nan')
+            rows.append((revenue, median, budget, popularity, vote_average))
+        index = pd.Index(['Franchise' if g[0] else 'Standalone' for g in groups], name='is_franchise')
+        columns = ['revenue_musd', 'roi', 'budget_musd', 'popularity', 'vote_average']
+        return pd.DataFrame(rows, index=index, columns=columns, dtype='float64')
+
+    def top_directors(self, n=5):
+        rows = self.fetch("SELECT director, COUNT(title), TOTAL(revenue_musd), AVG(vote_average) "
+                          "FROM movies WHERE director IS NOT NULL GROUP BY director "
+                          "ORDER BY 3 DESC, director LIMIT ?", (n,))
+        result = pd.DataFrame(rows, columns=['director', 'movie_count', 'total_revenue', 'mean_rating'])
+        result = result.astype({'movie_count': 'int64', 'total_revenue': 'float64', 'mean_rating': 'float64'})
+        return result.set_index(result['director'].astype('string')).drop(columns='director')
+
+    # --- searches -------------------------------------------------------------
+
+    def select(self, actors=(), directors=(), genres=(), all_genres=False, ranges=None,
+               sort_by=None, ascending=False, top_n=None, columns=None):
+        """
+        Movies matching every filter, with MovieQueryIndex.select semantics,
+        ordered and limited like MovieAnalyzer.query. ranges may include
+        'year', answered from the release_date index.
+        """
+        where, params = [], []
+        for name in actors:
+            where.append("id IN (SELECT movie_id FROM movie_cast WHERE person_id IN "
+                         "(SELECT person_id FROM person WHERE name = ?))")
+            params.append(name)
+        for name in directors:
+            where.append("director = ?")
+            params.append(name)
+        genre_filter = ("id IN (SELECT movie_id FROM movie_genre WHERE genre_id IN "
+                        "(SELECT genre_id FROM genre WHERE name IN ({})))")
+        if genres and all_genres:
+            for name in genres:
+                where.append(genre_filter.format('?'))
+                params.append(name)
+        elif genres:
+            where.append(genre_filter.format(', '.join('?' * len(genres))))
+            params.extend(genres)
+        for column, (low, high) in (ranges or {}).items():
+            if column == 'year':
+                # Year bounds as ISO date prefixes: '2001' <= '2001-05-04' < '2002'
+                column = 'release_date'
+                low = None if low is None else f"{int(low):04d}"
+                high = None if high is None else f"{int(high) + 1:04d}"
+                upper = '<'
+            else:
+                upper = '<='
+            if low is not None:
+                where.append(f"{self._check(column)} >= ?")
+                params.append(low)
+            if high is not None:
+                where.append(f"{self._check(column)} {upper} ?")
+                params.append(high)
+
+        order = 'rowid'
+        if sort_by is not None:
+            column = self._check(sort_by)
+            direction = 'ASC' if ascending else 'DESC'
+            if top_n is not None and sort_by in NUMERIC_COLUMNS:
+                # nlargest/nsmallest skip missing values
+                where.append(f"{column} IS NOT NULL")
+            order = f"{column} IS NULL, {column} {direction}, rowid"
+        select = ', '.join(self._check(col) for col in columns) if columns else '*'
+        sql = f"SELECT {select} FROM movies"
+        if where:
+            sql += f" WHERE {' AND '.join(where)}"
+        sql += f" ORDER BY {order}"
+        if top_n is not None:
+            sql += " LIMIT ?"
+            params.append(top_n)
+        return self.frame(sql, params)
+
+class StoreResults(AnalysisResults):
+    """
+    AnalysisResults whose report tables come from a MovieStore instead of a
+    DataFrame; memoization and stats work the same. The plot tables need a
+    frame and are not available.
+    """
+
+    def __init__(self, store):
+        super().__init__(None)
+        self.store = store
+
+    def engine(self):
+        return self.store
+
+    def franchise_comparison(self):
+        return self.get('franchise_comparison', self.store.franchise_comparison)
+
+    def top_directors(self, n=5):
+        return self.get(f"top_directors_top{n}", lambda: self.store.top_directors(n))
@@ -0,0 +1,247 @@
+import os
+import numpy as np
+import pandas as pd
+import logging
+from .layout import FORMATS
+
+logger = logging.getLogger(__name__)
+
+# Typed scalar columns of a raw TMDB payload; nested fields are stored as JSON strings
+RAW_SCHEMA = {
+    'id': 'Int64',
+    'adult': 'boolean',
+    'video': 'boolean',
+    'budget': 'Int64',
+    'revenue': 'Int64',
+    'runtime': 'Int64',
+    'vote_count': 'Int64',
+    'vote_average': 'float64',
+    'popularity': 'float64',
+}
+
+CLEANED_SCHEMA = {
+    'id': 'Int64',
+    'title': 'string',
+    'tagline': 'string',
+    'release_date': 'datetime64[us]',
+    'genres': 'string',
+    'belongs_to_collection': 'string',
+    'original_language': 'string',
+    'budget_musd': 'float64',
+    'revenue_musd': 'float64',
+    'production_companies': 'string',
+    'production_countries': 'string',
+    'vote_count': 'Int64',
+    'vote_average': 'float64',
+    'popularity': 'float64',
+    'runtime': 'Int64',
+    'overview': 'string',
+    'spoken_languages': 'string',
+    'poster_path': 'string',
+    'cast': 'string',
+    'cast_size': 'Int64',
+    'director': 'string',
+    'crew_size': 'Int64',
+    'profit_musd': 'float64',
+    'roi': 'float64',
+    'collection_name': 'string',
+}
+
+# In-memory dtypes for analysis: categoricals for repetitive text, Arrow strings for
+# free text and, for 'integer', the smallest nullable integer type holding the column
+COMPACT_SCHEMA = {
+    'id': 'integer',
+    'title': 'string[pyarrow]',
+    'tagline': 'string[pyarrow]',
+    'genres': 'category',
+    'belongs_to_collection': 'category',
+    'original_language': 'category',
+    'production_companies': 'string[pyarrow]',
+    'production_countries': 'category',
+    'vote_count': 'integer',
+    'runtime': 'integer',
+    'overview': 'string[pyarrow]',
+    'spoken_languages': 'category',
+    'poster_path': 'string[pyarrow]',
+    'cast': 'string[pyarrow]',
+    'cast_size': 'integer',
+    'director': 'category',
+    'crew_size': 'integer',
+    'collection_name': 'category',
+}
+
+INTEGER_TYPES = ('Int8', 'Int16', 'Int32', 'Int64')
+
+def storage_format(path):
+    """Infer the storage format from the file extension."""
+    ext = os.path.splitext(path)[1].lower().lstrip('.')
+    if ext not in FORMATS:
+        raise ValueError(f"Unsupported storage format for {path}; expected one of {FORMATS}")
+    return ext
+
+def _require_pyarrow():
+    try:
+        import pyarrow
+        import pyarrow.parquet
+    except ImportError as e:
+        raise ImportError("Parquet storage requires pyarrow: pip install pyarrow") from e
+    return pyarrow
+
+def apply_schema(df, schema, others=None):
+    """Cast the schema's columns present in df; optionally cast every other column to `others`."""
+    dtypes = {col: dtype for col, dtype in schema.items() if col in df.columns}
+    if others is not None:
+        dtypes.update({col: others for col in df.columns if col not in schema})
+    for col, dtype in dtypes.items():
+        if dtype.startswith('datetime64'):
+            df[col] = pd.to_datetime(df[col], errors='coerce').astype(dtype)
+        elif dtype in ('Int64', 'float64'):
+            df[col] = pd.to_numeric(df[col], errors='coerce').astype(dtype)
+        else:
+            df[col] = df[col].astype(dtype)
+    return df
+
+def smallest_integer(series):
+    """Cast series to the narrowest nullable integer type that holds all its values."""
+    series = pd.to_numeric(series, errors='coerce')
+    low, high = series.min(), series.max()
+    for dtype in INTEGER_TYPES:
+        info = np.iinfo(dtype.lower())
+        if pd.isna(low) or (info.min <= low and high <= info.max):
+            return series.astype(dtype)
+    return series.astype('Int64')
+
+def compact_frame(df, schema=COMPACT_SCHEMA, downcast_floats=False):
+    """
+    A copy of df with the compact in-memory dtypes of schema; other columns
+    keep their dtype. Floats stay float64 unless downcast_floats is set, as
+    float32 would change the report's figures.
+    """
+    df = df.copy(deep=False)
+    for col in df.columns:
+        dtype = schema.get(col)
+        if dtype == 'integer':
+            df[col] = smallest_integer(df[col])
+        elif dtype is not None:
+            df[col] = df[col].astype(dtype)
+        elif downcast_floats and pd.api.types.is_float_dtype(df[col]):
+            df[col] = df[col].astype('float32')
+    return df
+
+def memory_report(before, after):
+    """Per-column dtype and deep memory (MB) of two versions of a frame, with a total row."""
+    report = pd.DataFrame({
+        'dtype_before': before.dtypes.astype(str),
+        'mb_before': before.memory_usage(deep=True, index=False) / 2 ** 20,
+        'dtype_after': after.dtypes.astype(str).reindex(before.columns).fillna('dropped'),
+        'mb_after': after.memory_usage(deep=True, index=False).reindex(before.columns).fillna(0.0) / 2 ** 20,
+    })
+    report.loc['total'] = ['', report['mb_before'].sum(), '', report['mb_after'].sum()]
+    report['ratio'] = report['mb_before'] / report['mb_after']
+    return report.round(3)
+
+def log_memory_report(report, label='frame'):
+    total = report.loc['total']
+    logger.info(f"Compact dtypes: {label} uses {total['mb_after']:.2f} MB instead of {total['mb_before']:.2f} MB "
+                f"({total['ratio']:.1f}x smaller)")
+    logger.debug(f"Memory per column:\n{report.to_string()}")
+
+def save_frame(df, path, schema=None, compression='zstd'):
+    """Write df as CSV or Parquet (by extension), applying the schema first."""
+    os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+    if schema is not None:
+        df = apply_schema(df.copy(), schema)
+    if storage_format(path) == 'parquet':
+        _require_pyarrow()
+        df.to_parquet(path, index=False, compression=compression)
+    else:
+        df.to_csv(path, index=False)
+    return path
+
+def load_frame(path, columns=None, schema=None):
+    """
+    Read a CSV or Parquet file, loading only `columns` when given.
+    Parquet keeps its stored dtypes; CSV is cast to the schema on load.
+    """
+    if not os.path.exists(path):
+        raise FileNotFoundError(f"File not found: {path}")
+    if storage_format(path) == 'parquet':
+        _require_pyarrow()
+        df = pd.read_parquet(path, columns=columns)
+    else:
+        df = pd.read_csv(path, usecols=columns)
+    if schema is not None:
+        df = apply_schema(df, schema)
+    return df
+
+def iter_frames(path, chunk_size, columns=None):
+    """Yield a CSV or Parquet file as DataFrames of at most chunk_size rows."""
+    if not os.path.exists(path):
+        raise FileNotFoundError(f"File not found: {path}")
+    if storage_format(path) == 'parquet':
+        pa = _require_pyarrow()
+        parquet_file = pa.parquet.ParquetFile(path)
+        for batch in parquet_file.iter_batches(batch_size=chunk_size, columns=columns):
+            yield batch.to_pandas()
+    else:
+        with pd.read_csv(path, chunksize=chunk_size, usecols=columns) as reader:
+            yield from reader
+
+class ChunkedFrameWriter:
+    """Append DataFrame chunks to a CSV or Parquet file (by extension)."""
+
+    def __init__(self, path, compression='zstd'):
+        self.path = path
+        self.format = storage_format(path)
+        self.rows = 0
+        self._parquet = ParquetChunkWriter(path, compression) if self.format == 'parquet' else None
+        self._started = False
+
+    def write(self, df):
+        if self._parquet is not None:
+            self._parquet.write(df)
+        else:
+            if not self._started:
+                os.makedirs(os.path.dirname(os.path.abspath(self.path)), exist_ok=True)
+            df.to_csv(self.path, mode='a' if self._started else 'w', header=not self._started, index=False)
+        self._started = True
+        self.rows += len(df)
+
+    def close(self):
+        if self._parquet is not None:
+            self._parquet.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+class ParquetChunkWriter:
+    """Append DataFrame chunks to one Parquet file, one row group per chunk."""
+
+    def __init__(self, path, compression='zstd'):
+        self.path = path
+        self.compression = compression
+        self._writer = None
+        self._schema = None
+
+    def write(self, df):
+        pa = _require_pyarrow()
+        table = pa.Table.from_pandas(df, preserve_index=False, schema=self._schema)
+        if self._writer is None:
+            os.makedirs(os.path.dirname(os.path.abspath(self.path)), exist_ok=True)
+            self._schema = table.schema
+            self._writer = pa.parquet.ParquetWriter(self.path, self._schema, compression=self.compression)
+        self._writer.write_table(table)
+
+    def close(self):
+        if self._writer is not None:
+            self._writer.close()
+            self._writer = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
@@ -1,137 +1,313 @@
+import numpy as np
 import pandas as pd
-import seaborn as sns
-import matplotlib.pyplot as plt
 import os
+import glob
+import time
+import pickle
 import logging
+from functools import lru_cache
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from .layout import PLOTS, PLOT_FORMATS, SCATTER_MODES, file_digest
+from .storage import CLEANED_SCHEMA, compact_frame, load_frame
+from .results import AnalysisResults
+from .profiling import record, section
+from .manifest import StageManifest
 
 logger = logging.getLogger(__name__)
-# Suppress matplotlib category info logs when plotting numeric-like strings
-logging.getLogger('matplotlib.category').setLevel(logging.WARNING)
+
+@lru_cache(maxsize=None)
+def plot_data_version():
+    """Digest of this module's source and the models modules it imports, which prepare the plot data."""
+    return StageManifest.code_digest([__name__])
+
+def render_plot(name, data, path, dpi=300, fmt='png'):
+    """Draw one plot and save it; returns (path, seconds). Runs in pool workers."""
+    # matplotlib and seaborn load here, on the first plot drawn, not when plot data is prepared
+    from .drawing import render_plot as draw
+    return draw(name, data, path, dpi, fmt)
 
 class DataVisualizer:
-    def __init__(self, df, output_dir):
+    # Cleaned columns the plots read; everything else is left on disk
+    COLUMNS = ['release_date', 'genres', 'budget_musd', 'revenue_musd', 'roi',
+               'vote_average', 'popularity', 'collection_name']
+
+    def __init__(self, df, output_dir, results=None, dpi=300, fmt='png', plot_options=None,
+                 scatter_threshold=100000, scatter_mode='sample', scatter_sample=20000, density_bins=200,
+                 cache_dir=None, dataset_key=None):
+        """
+        dpi and fmt ('png' or 'svg') apply to every plot; plot_options
+        overrides them per plot, e.g. {'roi_by_genre': {'dpi': 150, 'format': 'svg'}}.
+
+        Scatter plots with more than scatter_threshold points are drawn from
+        a stratified sample of scatter_sample points that keeps the outliers
+        ('sample'), or as a 2D histogram with density_bins bins per axis
+        ('density'), so their render time stops growing with the data.
+
+        With cache_dir and dataset_key (e.g. file_digest of the cleaned
+        file), prepared plot data is saved to and reused from cache_dir, so
+        re-rendering the same dataset never touches its rows; df may then
+        be None when every plot is cached.
+        """
         self.df = df
         self.output_dir = output_dir
+        # Derived columns and aggregates come from the shared results layer; df itself is never modified
+        self.results = results if results is not None else AnalysisResults(df)
+        self.dpi = dpi
+        self.fmt = fmt
+        self.plot_options = plot_options or {}
+        self.scatter_threshold = scatter_threshold
+        self.scatter_mode = scatter_mode
+        self.scatter_sample = scatter_sample
+        self.density_bins = density_bins
+        self.cache_dir = cache_dir
+        self.dataset_key = dataset_key
+        self._plot_data = self._load_plot_data()
+        self._plot_data_changed = False
+        if scatter_mode not in SCATTER_MODES:
+            raise ValueError(f"Unsupported scatter mode {scatter_mode}; expected one of {SCATTER_MODES}")
+        if fmt not in PLOT_FORMATS:
+            raise ValueError(f"Unsupported plot format {fmt}; expected one of {PLOT_FORMATS}")
+        for name, options in self.plot_options.items():
+            if name not in PLOTS:
+                raise ValueError(f"Unknown plot '{name}'; expected one of {list(PLOTS)}")
+            if options.get('format', fmt) not in PLOT_FORMATS:
+                raise ValueError(f"Unsupported plot format for {name}; expected one of {PLOT_FORMATS}")
         os.makedirs(output_dir, exist_ok=True)
-        
-        # Prepare data
-        self.df['year'] = self.df['release_date'].dt.year
-        self.df['primary_genre'] = self.df['genres'].apply(lambda x: x.split('|')[0] if isinstance(x, str) and '|' in x else x)
-
-    def save_plot(self, filename):
-        path = os.path.join(self.output_dir, filename)
-        plt.savefig(path, dpi=300, bbox_inches='tight')
-        plt.close()
-        logger.info(f"Saved plot: {path}")
-        return path
 
-    def plot_revenue_vs_budget(self):
-        plt.figure(figsize=(10,6))
-        sns.scatterplot(data=self.df, x='budget_musd', y='revenue_musd', hue='primary_genre', alpha=0.6, legend=False)
-        plt.title('Revenue vs. Budget Trends')
-        plt.xlabel('Budget (Million USD)')
-        plt.ylabel('Revenue (Million USD)')
-        plt.grid(True, alpha=0.3)
-        return self.save_plot("Revenue_vs_Budget.png")
+    @classmethod
+    def from_path(cls, path, output_dir, cache_dir=None, compact=False, **kwargs):
+        """
+        Load only the plotting columns of a cleaned CSV/Parquet file, with
+        COMPACT_SCHEMA dtypes if compact. With a cache_dir holding this
+        file's plot data, no rows are loaded at all.
+        """
+        if cache_dir is not None:
+            visualizer = cls(None, output_dir, cache_dir=cache_dir, dataset_key=file_digest(path), **kwargs)
+            if visualizer.is_cached():
+                logger.info(f"Plot data for {path} found in {cache_dir}; skipping the dataset load.")
+                return visualizer
+            kwargs.update(cache_dir=cache_dir, dataset_key=visualizer.dataset_key)
+        df = load_frame(path, columns=cls.COLUMNS, schema=CLEANED_SCHEMA)
+        return cls(compact_frame(df) if compact else df, output_dir, **kwargs)
 
-    def plot_roi_distribution(self):
-        plt.figure(figsize=(12,6))
-        top_genres = self.df['primary_genre'].value_counts().head(10).index
-        sns.boxplot(data=self.df[self.df['primary_genre'].isin(top_genres)], x='primary_genre', y='roi')
-        plt.title('ROI Distribution by Top 10 Genres')
-        plt.xticks(rotation=45)
-        plt.ylim(-1, 10)
-        return self.save_plot("ROI_Distribution_by_Genre.png")
+    # --- plot data --------------------------------------------------------------
 
-    def plot_popularity_vs_rating(self):
-        plt.figure(figsize=(10,6))
-        sns.scatterplot(data=self.df, x='vote_average', y='popularity', alpha=0.6)
-        plt.title('Popularity vs. Rating')
-        plt.xlabel('Vote Average')
-        plt.ylabel('Popularity')
-        plt.grid(True, alpha=0.3)
-        return self.save_plot("Popularity_vs_Rating.png")
+    def _scatter_data(self, data, x, y, stratify=None):
+        """Full scatter data up to scatter_threshold rows; a sample or 2D histogram above it."""
+        if len(data) <= self.scatter_threshold:
+            return data
+        data = data.dropna(subset=[x, y])
+        if len(data) <= self.scatter_threshold:
+            # Few complete points left (possibly none, which np.quantile cannot take): plot them all
+            return data
+        if self.scatter_mode == 'density':
+            counts, x_edges, y_edges = np.histogram2d(data[x].to_numpy(dtype='float64'), data[y].to_numpy(dtype='float64'),
+                                                      bins=self.density_bins)
+            return {'counts': counts, 'x_edges': x_edges, 'y_edges': y_edges, 'rows': len(data)}
+        return self._downsample(data, x, y, stratify)
 
-    def plot_yearly_trends(self):
-        plt.figure(figsize=(12,6))
-        yearly_rev = self.df.groupby('year')['revenue_musd'].sum().reset_index()
-        sns.lineplot(data=yearly_rev, x='year', y='revenue_musd', marker='o')
-        plt.title('Yearly Trends in Box Office Revenue')
-        plt.xlabel('Year')
-        plt.ylabel('Total Revenue (Million USD)')
-        plt.grid(True, alpha=0.3)
-        return self.save_plot("Yearly_Box_Office_Trends.png")
+    def _downsample(self, data, x, y, stratify=None):
+        """
+        Keep every point beyond the 0.1/99.9 percentiles of either axis (up to
+        a fifth of the sample), then fill the rest with a seeded random sample
+        drawn from each stratum in proportion to its size.
+        """
+        rng = np.random.default_rng(0)
+        outside = np.zeros(len(data), dtype=bool)
+        for col in (x, y):
+            values = data[col].to_numpy(dtype='float64')
+            low, high = np.quantile(values, [0.001, 0.999])
+            outside |= (values < low) | (values > high)
+        outliers = np.flatnonzero(outside)
+        if len(outliers) > self.scatter_sample // 5:
+            outliers = rng.choice(outliers, self.scatter_sample // 5, replace=False)
 
-    def plot_franchise_comparison(self):
-        self.df['is_franchise'] = self.df['collection_name'].notna()
-        comp = self.df.groupby('is_franchise')['revenue_musd'].mean().reset_index()
-        comp['Type'] = comp['is_franchise'].map({True: 'Franchise', False: 'Standalone'})
-        
-        plt.figure(figsize=(8,6))
-        sns.barplot(data=comp, x='Type', y='revenue_musd', hue='Type', palette='viridis', legend=False)
-        plt.title('Average Revenue: Franchise vs Standalone')
-        plt.ylabel('Average Revenue (Million USD)')
-        plt.xlabel('')
-        return self.save_plot("Franchise_vs_Standalone.png")
+        rest = np.flatnonzero(~outside)
+        budget = self.scatter_sample - len(outliers)
+        if stratify is None:
+            sampled = rng.choice(rest, min(budget, len(rest)), replace=False)
+        else:
+            strata = pd.Series(data[stratify].to_numpy()[rest]).fillna('')
+            sampled = []
+            for _, members in strata.groupby(strata, sort=True).indices.items():
+                # At least one point per stratum so rare groups keep their colour
+                take = min(len(members), max(1, round(budget * len(members) / len(rest))))
+                sampled.append(rest[rng.choice(members, take, replace=False)])
+            sampled = np.concatenate(sampled) if sampled else rest[:0]
 
-    def plot_roi_by_genre(self):
-        plt.figure(figsize=(12, 6))
-        
-        # Calculate ROI if not present
-        if 'roi' not in self.df.columns:
-            self.df['roi'] = self.df['revenue_musd'] / self.df['budget_musd']
-            
+        sample = data.iloc[np.sort(np.concatenate([outliers, sampled]))]
+        sample.attrs['total_rows'] = len(data)
+        return sample
+
+    def _prepare_revenue_vs_budget(self):
+        data = pd.DataFrame({'budget_musd': self.df['budget_musd'], 'revenue_musd': self.df['revenue_musd'],
+                             'primary_genre': self.results.primary_genre()})
+        return self._scatter_data(data, 'budget_musd', 'revenue_musd', stratify='primary_genre')
+
+    def _prepare_roi_distribution(self):
+        primary_genre = self.results.primary_genre()
+        top_genres = primary_genre.value_counts().head(10).index
+        in_top = primary_genre.isin(top_genres)
+        return pd.DataFrame({'primary_genre': primary_genre[in_top], 'roi': self.df['roi'][in_top]})
+
+    def _prepare_popularity_vs_rating(self):
+        return self._scatter_data(self.df[['vote_average', 'popularity']], 'vote_average', 'popularity')
+
+    def _prepare_yearly_trends(self):
+        return self.results.yearly_totals()['revenue_musd'].reset_index()
+
+    def _prepare_franchise_comparison(self):
+        # Same table as the report's franchise comparison, already labelled Standalone/Franchise
+        return self.results.franchise_comparison()['revenue_musd'].rename_axis('Type').reset_index()
+
+    def _prepare_roi_by_genre(self):
         # Group by genre (using the string column as requested by user snippet)
         # Note: This groups by the full genre string. If distinct genres are needed, use explode.
         # User snippet: df_clean.groupBy("genres").agg(F.mean("roi").alias("mean_roi"))
-        roi_genre = self.df.groupby("genres")['roi'].mean().reset_index(name="mean_roi").sort_values('mean_roi', ascending=False)
-        
-        # Using seaborn barplot for consistent coloring
-        ax = sns.barplot(x=roi_genre['mean_roi'], 
-                        y=roi_genre['genres'], color='#eb5d19',
-                        orient='h')
-
-        for container in ax.containers:
-            ax.bar_label(container, fmt='%.2f', padding=3, rotation=0, fontsize=9)
-            
-        plt.title('Total ROI by Genre', fontsize=30, pad=20)
-        plt.xlabel('Mean ROI') 
-        plt.tight_layout()
-        return self.save_plot("ROI_by_Genre.png")
+        # ROI is derived from revenue/budget when the column is missing
+        return self.results.roi_by_genre()
 
-    def plot_revenue_vs_budget_yearly(self):
+    def _prepare_revenue_vs_budget_yearly(self):
         # Aggregate Revenue and Budget by Year
-        pdf_rev_bud = self.df.groupby('year')[['revenue_musd', 'budget_musd']].sum().rename(
+        pdf_rev_bud = self.results.yearly_totals().rename(
             columns={'revenue_musd': 'Total Revenue', 'budget_musd': 'Total Budget'}).reset_index()
 
         # Ensure year is integer for cleaner plotting
         pdf_rev_bud['year'] = pdf_rev_bud['year'].astype(int)
 
-        pdf_melted = pdf_rev_bud.melt(id_vars='year', value_vars=['Total Revenue', 'Total Budget'], 
+        pdf_melted = pdf_rev_bud.melt(id_vars='year', value_vars=['Total Revenue', 'Total Budget'],
                                                      var_name='Type', value_name='Amount')
-                
+
         # Renaissance mapping for legend to match Pandas "Revenue" and "Budget"
         pdf_melted['Type'] = pdf_melted['Type'].replace({'Total Revenue': 'Revenue', 'Total Budget': 'Budget'})
+        return pdf_melted
+
+    def _data_key(self, name):
+        # Scatter data also depends on the large-data settings
+        if name in ('revenue_vs_budget', 'popularity_vs_rating'):
+            return f"{name}:{self.scatter_mode}:{self.scatter_threshold}:{self.scatter_sample}:{self.density_bins}"
+        return name
+
+    def prepare(self, name):
+        """The small frame plot `name` draws from: cached, or built here from the shared results."""
+        key = self._data_key(name)
+        if key not in self._plot_data:
+            if self.df is None:
+                raise ValueError(f"No cached plot data for '{name}' and no dataset to prepare it from")
+            with section(f"prepare_{name}"):
+                self._plot_data[key] = getattr(self, f"_prepare_{name}")()
+            self._plot_data_changed = True
+        return self._plot_data[key]
 
-        plt.figure(figsize=(12, 6))
-        ax = sns.barplot(data=pdf_melted, x='year', y='Amount', hue='Type', palette=['#eb5d19', 'darkgray'])
+    # --- plot data cache ------------------------------------------------------
 
-        for container in ax.containers:
-            ax.bar_label(container, fmt='%.1f', padding=3, rotation=0, fontsize=9)
-            
-        plt.title('Revenue vs Budget Over Years', fontsize=30, pad=20)
-        plt.xlabel('Year')
-        plt.ylabel('Amount (Million USD)')
-        plt.legend(title='Type')
-        plt.tight_layout()
-        return self.save_plot("Revenue_vs_Budget_Yearly.png")
+    def _cache_path(self):
+        if self.cache_dir is None or self.dataset_key is None:
+            return None
+        # Keyed by the code too: data prepared by an older _prepare_* must not be drawn
+        return os.path.join(self.cache_dir, f"plot_data-{self.dataset_key[:16]}-{plot_data_version()[:16]}.pkl")
+
+    def _load_plot_data(self):
+        path = self._cache_path()
+        if path is None or not os.path.exists(path):
+            return {}
+        try:
+            with open(path, 'rb') as f:
+                plot_data = pickle.load(f)
+        # Besides truncated files, pickles from another pandas version or an older module fail
+        # to resolve their classes (AttributeError, ImportError) or to rebuild them (TypeError, ValueError)
+        except (OSError, pickle.UnpicklingError, EOFError, AttributeError, ImportError, TypeError, ValueError) as e:
+            logger.warning(f"Ignoring unreadable plot data cache {path}, rebuilding it: {e!r}")
+            return {}
+        if not isinstance(plot_data, dict):
+            logger.warning(f"Ignoring plot data cache {path}: unexpected {type(plot_data).__name__}, rebuilding it")
+            return {}
+        return plot_data
+
+    def is_cached(self):
+        return all(self._data_key(name) in self._plot_data for name in PLOTS)
+
+    def prepare_all(self):
+        """Build every plot's data and save it to the cache, if one is configured."""
+        for name in PLOTS:
+            self.prepare(name)
+        self.save_plot_data()
+
+    def save_plot_data(self):
+        path = self._cache_path()
+        if path is None or not self._plot_data_changed:
+            return
+        os.makedirs(self.cache_dir, exist_ok=True)
+        # Only the current dataset's plot data is kept
+        for old in glob.glob(os.path.join(self.cache_dir, 'plot_data-*.pkl')):
+            if old != path:
+                os.remove(old)
+        with open(f"{path}.tmp", 'wb') as f:
+            pickle.dump(self._plot_data, f, protocol=pickle.HIGHEST_PROTOCOL)
+        os.replace(f"{path}.tmp", path)
+        self._plot_data_changed = False
+        logger.info(f"Saved plot data to {path}")
+
+    # --- rendering ------------------------------------------------------------
+
+    def _task(self, name):
+        options = self.plot_options.get(name, {})
+        fmt = options.get('format', self.fmt)
+        path = os.path.join(self.output_dir, f"{os.path.splitext(PLOTS[name])[0]}.{fmt}")
+        return name, self.prepare(name), path, options.get('dpi', self.dpi), fmt
+
+    def render(self, name):
+        path, seconds = render_plot(*self._task(name))
+        logger.info(f"Saved plot: {path} ({seconds:.2f}s)")
+        return path
+
+    def plot_revenue_vs_budget(self):
+        return self.render('revenue_vs_budget')
+
+    def plot_roi_distribution(self):
+        return self.render('roi_distribution')
+
+    def plot_popularity_vs_rating(self):
+        return self.render('popularity_vs_rating')
+
+    def plot_yearly_trends(self):
+        return self.render('yearly_trends')
+
+    def plot_franchise_comparison(self):
+        return self.render('franchise_comparison')
+
+    def plot_roi_by_genre(self):
+        return self.render('roi_by_genre')
+
+    def plot_revenue_vs_budget_yearly(self):
+        return self.render('revenue_vs_budget_yearly')
 
-    def run(self):
+    def run(self, workers=None):
+        """
+        Render every plot, on a process pool of `workers` processes when
+        given. Plot data is prepared (or read from the cache) here first;
+        workers only draw and save. Returns {plot name: render seconds}.
+        """
         logger.info("\n--- Generating Visualizations ---")
-        self.plot_revenue_vs_budget()
-        self.plot_roi_distribution()
-        self.plot_popularity_vs_rating()
-        self.plot_yearly_trends()
-        self.plot_franchise_comparison()
-        self.plot_roi_by_genre()
-        self.plot_revenue_vs_budget_yearly()
+        start = time.perf_counter()
+        self.prepare_all()
+        logger.info(f"Plot data ready in {time.perf_counter() - start:.2f}s")
+        start = time.perf_counter()
+        timings = {}
+        if workers and workers > 1:
+            with ProcessPoolExecutor(max_workers=workers) as executor:
+                futures = {executor.submit(render_plot, *self._task(name)): name for name in PLOTS}
+                for future in as_completed(futures):
+                    path, timings[futures[future]] = future.result()
+                    logger.info(f"Saved plot: {path} ({timings[futures[future]]:.2f}s)")
+            for name, seconds in timings.items():
+                # Drawn in a worker: only its wall time is known here
+                record(f"render_{name}", calls=1, wall_seconds=seconds)
+        else:
+            for name in PLOTS:
+                with section(f"render_{name}"):
+                    path, timings[name] = render_plot(*self._task(name))
+                logger.info(f"Saved plot: {path} ({timings[name]:.2f}s)")
+        logger.info(f"Rendered {len(timings)} plots in {time.perf_counter() - start:.2f}s "
+                    f"(render time {sum(timings.values()):.2f}s)")
+        return timings
@@ -0,0 +1,102 @@
+"""KPIAggregates folded batch by batch, saved and reloaded, against a full recompute.
+
+Run with: python -m pytest tests
+"""
+import os
+import sys
+
+import numpy as np
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'benchmarks'))
+
+from models.aggregates import FRANCHISE_COLUMNS, KPIAggregates
+from models.analysis import MovieAnalyzer
+from models.kpi import RANKED_KPIS, TopKEngine
+from synthetic import generate_cleaned_movies
+
+RTOL = 1e-9
+
+
+def assert_matches_recompute(state, df):
+    """The state's report parts equal a full recompute over df; ROI medians within the sketch's accuracy."""
+    analyzer = MovieAnalyzer(df.drop_duplicates(subset='id').reset_index(drop=True))
+
+    full_ranked = TopKEngine(analyzer.df).compute(RANKED_KPIS, k=state.k)
+    for (title, expected), (_, actual) in zip(full_ranked, state.ranked_kpis()):
+        metric = expected.columns[2]
+        assert expected['id'].tolist() == actual['id'].tolist(), title
+        assert expected['rank'].tolist() == actual['rank'].tolist(), title
+        np.testing.assert_allclose(actual[metric].astype('float64'), expected[metric].astype('float64'), rtol=RTOL)
+
+    full_searches = analyzer.get_custom_search_results()
+    for name, actual in state.search_results().items():
+        assert full_searches[name]['id'].tolist() == actual['id'].tolist(), name
+
+    expected = analyzer.analyze_franchise_vs_standalone()[FRANCHISE_COLUMNS]
+    actual = state.franchise_comparison()
+    assert expected.index.tolist() == actual.index.tolist()
+    for name in actual.index:
+        sketch = state.groups[name]['roi']
+        for col in FRANCHISE_COLUMNS:
+            rtol = sketch.relative_accuracy if col == 'roi' and not sketch.exact else RTOL
+            np.testing.assert_allclose(actual.at[name, col], expected.at[name, col], rtol=rtol, err_msg=f"{name} {col}")
+
+    expected = analyzer.get_top_directors()
+    actual = state.top_directors()
+    assert expected.index.tolist() == actual.index.tolist()
+    np.testing.assert_allclose(actual.to_numpy(dtype='float64'), expected.to_numpy(dtype='float64'), rtol=RTOL)
+
+
+@pytest.fixture(scope='module')
+def movies():
+    # Over 10k franchise movies, so that group's ROI median is bucketed rather than exact
+    return generate_cleaned_movies(30000)
+
+
+def test_batches_match_recompute(movies):
+    state = KPIAggregates()
+    for start in range(0, len(movies), 3000):
+        state.fold(movies.iloc[start:start + 3000])
+    assert state.rows == len(movies)
+    assert_matches_recompute(state, movies)
+
+
+def test_save_load_and_refold(movies, tmp_path):
+    path = str(tmp_path / 'kpi_state.json')
+    state = KPIAggregates()
+    state.fold(movies.iloc[:20000])
+    state.save(path)
+
+    state = KPIAggregates.load(path)
+    assert isinstance(state.ids, np.memmap)
+    # Folded movies are skipped, whether from the saved ids or from this session's runs
+    assert state.fold(movies.iloc[19000:25000]) == 5000
+    assert state.fold(movies.iloc[:25000]) == 0
+    state.save(path)
+    state = KPIAggregates.load(path)
+    assert state.fold(movies.iloc[25000:]) == 5000
+    state.save(path)
+
+    assert sorted(os.listdir(tmp_path)) == ['kpi_state.json', f"kpi_state_ids.{len(movies)}.bin"]
+    state = KPIAggregates.load(path)
+    assert np.array_equal(state.ids, np.sort(movies['id'].to_numpy(dtype='int64')))
+    assert state.fold(movies) == 0
+    assert_matches_recompute(state, movies)
+
+
+def test_interrupted_save_keeps_previous_state(movies, tmp_path):
+    path = str(tmp_path / 'kpi_state.json')
+    state = KPIAggregates()
+    state.fold(movies.iloc[:1000])
+    state.save(path)
+    # The id file of a save that never got to write its JSON
+    np.sort(movies['id'].to_numpy(dtype='int64')[:2000]).astype('<i8').tofile(KPIAggregates.ids_path(path, 2000))
+
+    state = KPIAggregates.load(path)
+    assert state.rows == 1000
+    assert state.fold(movies.iloc[:2000]) == 1000
+    state.save(path)
+    assert sorted(os.listdir(tmp_path)) == ['kpi_state.json', 'kpi_state_ids.2000.bin']
+    assert_matches_recompute(KPIAggregates.load(path), movies.iloc[:2000])